@@ -1,15 +1,19 @@
-import openai
 import os
 from dotenv import load_dotenv
 
 # Load .env file from project root
 from pathlib import Path
+
+from logic import llm_router
+from eventlog import get_logger
+from metrics import LLM_LATENCY
+
+log = get_logger("agent")
+
 env_path = Path(__file__).resolve().parents[2] / ".env"
 load_dotenv(dotenv_path=env_path)
 
-# Set API key
-openai.api_key = os.getenv("OPENAI_API_KEY")
-print("Loaded API Key:", openai.api_key[:5] + "..." if openai.api_key else "None")
+log.info("openai_key_loaded", present=bool(os.getenv("OPENAI_API_KEY")))
 
 class SimpleAgent:
     def __init__(self, name, role, tools=None):
@@ -18,32 +22,29 @@ class SimpleAgent:
         self.tools = tools or []
         self.messages = [{"role": "system", "content": role}]
 
-    async def run(self, input_text: str):
+    async def run(self, input_text: str, room=None):
         self.messages.append({"role": "user", "content": input_text})
 
-        response = await openai.ChatCompletion.acreate(
-            model="gpt-4o",
-            messages=self.messages,
-            tools=self.tools,
-            tool_choice="auto" if self.tools else None
-        )
-
-        reply = response.choices[0].message
+        with LLM_LATENCY.time(call="agent"):
+            reply = await llm_router.complete(
+                "agent",
+                self.messages,
+                room=room,
+                tools=self.tools or None,
+                tool_choice="auto" if self.tools else None
+            )
         self.messages.append(reply)
 
-        # 🔍 Debug full reply object
-        print(f"\n🔁 FULL REPLY OBJECT FROM {self.name}:\n{reply}\n")
+        # full reply object only at LOG_LEVEL=DEBUG
+        log.debug("agent_reply", agent=self.name, reply=reply)
 
-        # Extract content safely (works for both dicts and OpenAI objects)
-        content = getattr(reply, "content", None) if hasattr(reply, "content") else reply.get("content")
+        content = reply.get("content")
 
         if content:
             return content.strip()
 
         # Handle tool_call fallback (if needed later)
-        if hasattr(reply, "tool_calls"):
-            return f"[Tool call used: {reply.tool_calls[0].function.name}]"
-        if "tool_calls" in reply:
+        if reply.get("tool_calls"):
             return f"[Tool call used: {reply['tool_calls'][0]['function']['name']}]"
 
         return "[No reply from agent]"
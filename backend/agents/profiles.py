@@ -1,11 +1,13 @@
 from logic.memory import Memory
 
 class Character:
-    def __init__(self, name, role, system_prompt):
+    def __init__(self, name, role, system_prompt, vary_answers=False):
         self.name = name
         self.role = role
         self.system_prompt = system_prompt
         self.memory = Memory()
+        # True keeps this character out of the answer cache so repeated questions get fresh replies
+        self.vary_answers = vary_answers
 
 
 def create_perpetrator():
@@ -17,7 +19,7 @@ def create_perpetrator():
         "If asked directly, you dodge. If pressed, you get defensive. Your goal is to avoid being caught — but tiny cracks in your story might emerge."
         "Answer only as Dr. Adrian Blackwood. Do not include the detective’s dialogue."
     )
-    return Character("Dr. Adrian Blackwood", "Surgeon", prompt)
+    return Character("Dr. Adrian Blackwood", "Surgeon", prompt, vary_answers=True)
 
 
 def create_innocent_bystander(name):
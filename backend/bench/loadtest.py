@@ -0,0 +1,393 @@
+#!/usr/bin/env python3
+"""
+End-to-end Socket.IO load test.
+
+Boots `main:socket_app` in a child process with
+  - a fake OpenAI backend: the shared httpx client in logic.llm gets a mock
+    transport that waits --llm-latency-ms before the first token and then
+    streams --answer-tokens tokens at --tokens-per-second,
+  - an in-memory Supabase client, so every db.py function (and the
+    write-behind queue) runs its real code against in-process tables, with
+    --db-latency-ms of blocking time per request like the real sync client.
+Then drives --pairs detective/murderer client pairs through create_room,
+join_role, set_human_character, ask and murderer_answer, and prints a JSON
+report (throughput, p50/p95/p99 ask latency overall and per path, errors,
+and the server's /metrics and /debug/rooms snapshots).
+
+Run from backend/ (the client needs aiohttp, python-socketio's client extra):
+
+    python bench/loadtest.py --pairs 50 --questions 6 --out results.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+AI_CHARACTERS = ["Mrs. Bellamy", "Tommy the Janitor"]
+HUMAN_CHARACTER = "Mr. Holloway"
+QUESTIONS = [
+    "Where were you at nine o'clock last night?",
+    "Did you hear anything unusual?",
+    "How well did you know the victim?",
+    "Who else was in the house?",
+    "Why were your boots muddy?",
+]
+
+
+# ============================
+#   Server side: fakes
+# ============================
+
+class FakeOpenAI:
+    """Async handler for httpx.MockTransport speaking the /chat/completions shape."""
+
+    def __init__(self, latency: float, tokens_per_second: float, answer_tokens: int):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.answer_tokens = answer_tokens
+
+    def _reply(self, prompt: str) -> str:
+        if "Extract all potential clues" in prompt:
+            return json.dumps([
+                {"text": f"Heard a door slam at {random.randint(8, 11)}pm", "type": "important"},
+                {"text": "Was making tea", "type": "background"},
+            ])
+        if "case notes" in prompt:
+            return "The detective asked about alibis; everyone claims to have been elsewhere."
+        match = re.search(r"reply ONLY as (.+?) to this question", prompt)
+        name = match.group(1) if match else "Witness"
+        words = " ".join(random.choice(("I", "was", "in", "the", "kitchen", "all", "evening", "detective")) for _ in range(self.answer_tokens))
+        if '{"answer":' in prompt:
+            # structured answers (STRUCTURED_ANSWERS=1)
+            return json.dumps({"answer": f"{words}.", "clues": [{"text": "Was in the kitchen", "type": "background"}]})
+        return f"{name}: {words}."
+
+    async def __call__(self, request):
+        import httpx
+
+        body = json.loads(request.content)
+        reply = self._reply(body["messages"][-1]["content"])
+        per_token = 1.0 / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+        if not body.get("stream"):
+            await asyncio.sleep(self.latency + per_token * self.answer_tokens)
+            return httpx.Response(200, json={"choices": [{"message": {"role": "assistant", "content": reply}}]})
+
+        async def events():
+            await asyncio.sleep(self.latency)
+            for token in re.findall(r"\S+\s*", reply):
+                chunk = {"choices": [{"delta": {"content": token}}]}
+                yield f"data: {json.dumps(chunk)}\n\n".encode()
+                if per_token:
+                    await asyncio.sleep(per_token)
+            yield b"data: [DONE]\n\n"
+
+        return httpx.Response(200, content=events(), headers={"content-type": "text/event-stream"})
+
+
+class _Result:
+    def __init__(self, data):
+        self.data = data
+
+
+class _Query:
+    def __init__(self, db: "InMemorySupabase", table: str):
+        self.db = db
+        self.table = table
+        self.op = "select"
+        self.payload: Any = None
+        self.filters: List[Any] = []
+        self.order_by: Optional[tuple] = None
+        self.max_rows: Optional[int] = None
+
+    def select(self, columns: str = "*"):
+        self.op = "select"
+        return self
+
+    def insert(self, rows):
+        self.op, self.payload = "insert", rows if isinstance(rows, list) else [rows]
+        return self
+
+    def update(self, fields):
+        self.op, self.payload = "update", fields
+        return self
+
+    def eq(self, col, value):
+        self.filters.append(lambda row: row.get(col) == value)
+        return self
+
+    def lt(self, col, value):
+        self.filters.append(lambda row: (row.get(col) or "") < value)
+        return self
+
+    def gt(self, col, value):
+        self.filters.append(lambda row: (row.get(col) or "") > value)
+        return self
+
+    def ilike(self, col, value):
+        self.filters.append(lambda row: (row.get(col) or "").lower() == value.lower())
+        return self
+
+    def order(self, col, desc=False):
+        self.order_by = (col, desc)
+        return self
+
+    def limit(self, n):
+        self.max_rows = n
+        return self
+
+    def execute(self):
+        if self.db.latency:
+            time.sleep(self.db.latency)  # the real client blocks too
+        with self.db.lock:
+            rows = self.db.tables.setdefault(self.table, [])
+            if self.op == "insert":
+                for row in self.payload:
+                    self.db.clock += timedelta(microseconds=1)
+                    rows.append({"created_at": self.db.clock.isoformat(), **row})
+                return _Result(self.payload)
+            matched = [row for row in rows if all(f(row) for f in self.filters)]
+            if self.op == "update":
+                for row in matched:
+                    row.update(self.payload)
+                return _Result(matched)
+            if self.order_by:
+                col, desc = self.order_by
+                matched.sort(key=lambda row: row.get(col) or "", reverse=desc)
+            if self.max_rows is not None:
+                matched = matched[: self.max_rows]
+            return _Result([dict(row) for row in matched])
+
+
+class InMemorySupabase:
+    """Just enough of supabase-py's query builder for db.py."""
+
+    def __init__(self, latency: float = 0.0):
+        import threading
+
+        self.latency = latency
+        self.tables: Dict[str, List[Dict[str, Any]]] = {}
+        self.lock = threading.Lock()
+        # strictly increasing created_at, like the DB default would give
+        self.clock = datetime.now(timezone.utc)
+
+    def table(self, name: str) -> _Query:
+        return _Query(self, name)
+
+
+def serve(args) -> None:
+    sys.path.insert(0, BACKEND_DIR)
+    os.chdir(BACKEND_DIR)
+    import httpx
+    import uvicorn
+
+    import db
+    from logic import llm
+
+    db.supabase = InMemorySupabase(args.db_latency_ms / 1000)
+    llm._client = httpx.AsyncClient(
+        base_url="http://fake-openai",
+        transport=httpx.MockTransport(
+            FakeOpenAI(args.llm_latency_ms / 1000, args.tokens_per_second, args.answer_tokens)
+        ),
+    )
+    import main
+
+    uvicorn.run(main.socket_app, host="127.0.0.1", port=args.port, log_level="warning", access_log=False)
+
+
+# ============================
+#   Client side: driver
+# ============================
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return round(ordered[index] * 1000, 2)
+
+
+def summarize(latencies: List[float]) -> Dict[str, Any]:
+    return {
+        "count": len(latencies),
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+        "max_ms": round(max(latencies) * 1000, 2) if latencies else None,
+    }
+
+
+class Pair:
+    def __init__(self, url: str, args, results: Dict[str, Any]):
+        import socketio
+
+        self.url = url
+        self.args = args
+        self.results = results
+        self.det = socketio.AsyncClient(reconnection=False)
+        self.mur = socketio.AsyncClient(reconnection=False)
+        self.events: "asyncio.Queue[tuple]" = asyncio.Queue()
+        self.det.on("*", self._on_det)
+        self.mur.on("question_for_murderer", self._on_question)
+
+    async def _on_det(self, event, data):
+        await self.events.put((event, data))
+
+    async def _on_question(self, data):
+        await asyncio.sleep(self.args.murderer_think_ms / 1000)
+        await self.mur.emit("murderer_answer", {"correlation_id": data["correlation_id"], "answer": "I was pruning the hydrangeas."})
+
+    async def _wait_for(self, name: str, timeout: float):
+        deadline = time.perf_counter() + timeout
+        while True:
+            event, data = await asyncio.wait_for(self.events.get(), timeout=max(0.0, deadline - time.perf_counter()))
+            if event == "error":
+                raise RuntimeError(data.get("msg") if isinstance(data, dict) else data)
+            if event == name:
+                return data
+
+    async def run(self) -> None:
+        await self.det.connect(self.url, transports=["websocket"])
+        await self.mur.connect(self.url, transports=["websocket"])
+        try:
+            await self.det.emit("create_room", {})
+            room = (await self._wait_for("room_created", 10))["room"]
+            await self.det.emit("join_role", {"role": "detective", "room": room})
+            await self.mur.emit("join_role", {"role": "murderer", "room": room})
+            await asyncio.sleep(0.05)
+            await self.mur.emit("set_human_character", {"character": HUMAN_CHARACTER})
+            await asyncio.sleep(0.05)
+            for i in range(self.args.questions):
+                human = self.args.human_every and (i + 1) % self.args.human_every == 0
+                character = HUMAN_CHARACTER if human else AI_CHARACTERS[i % len(AI_CHARACTERS)]
+                started = time.perf_counter()
+                first_chunk = None
+                await self.det.emit("ask", {"character": character, "question": QUESTIONS[i % len(QUESTIONS)]})
+                deadline = started + self.args.ask_timeout
+                while True:
+                    event, data = await asyncio.wait_for(self.events.get(), timeout=max(0.0, deadline - time.perf_counter()))
+                    if event == "answer_chunk" and first_chunk is None:
+                        first_chunk = time.perf_counter() - started
+                    elif event == "error":
+                        raise RuntimeError(data.get("msg") if isinstance(data, dict) else data)
+                    elif event == "answer":
+                        break
+                elapsed = time.perf_counter() - started
+                path = "human" if human else "ai"
+                self.results["ask"][path].append(elapsed)
+                if first_chunk is not None:
+                    self.results["first_chunk"].append(first_chunk)
+                await asyncio.sleep(self.args.think_ms / 1000)
+        finally:
+            await self.det.disconnect()
+            await self.mur.disconnect()
+
+
+async def drive(args, url: str) -> Dict[str, Any]:
+    import httpx
+
+    results: Dict[str, Any] = {"ask": {"ai": [], "human": []}, "first_chunk": [], "errors": []}
+    pairs = [Pair(url, args, results) for _ in range(args.pairs)]
+
+    async def run_pair(pair: Pair, delay: float):
+        await asyncio.sleep(delay)
+        try:
+            await pair.run()
+        except Exception as e:
+            results["errors"].append(f"{type(e).__name__}: {e}")
+
+    started = time.perf_counter()
+    await asyncio.gather(*(run_pair(p, i * args.ramp_ms / 1000) for i, p in enumerate(pairs)))
+    wall = time.perf_counter() - started
+
+    async with httpx.AsyncClient(base_url=url) as http:
+        rooms = (await http.get("/debug/rooms")).json()
+        metrics_text = (await http.get("/metrics")).text
+
+    every = results["ask"]["ai"] + results["ask"]["human"]
+    return {
+        "config": {k: v for k, v in vars(args).items() if k not in ("serve", "out")},
+        "wall_seconds": round(wall, 3),
+        "asks": len(every),
+        "asks_per_second": round(len(every) / wall, 2) if wall else None,
+        "ask_latency": summarize(every),
+        "ask_latency_by_path": {path: summarize(values) for path, values in results["ask"].items()},
+        "first_chunk_latency": summarize(results["first_chunk"]),
+        "errors": len(results["errors"]),
+        "error_samples": results["errors"][:10],
+        "server": {"rooms": rooms, "metrics": metrics_text},
+    }
+
+
+async def wait_until_up(url: str, timeout: float = 30) -> None:
+    import httpx
+
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=url) as http:
+        while time.monotonic() < deadline:
+            try:
+                if (await http.get("/characters")).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"server at {url} did not come up")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pairs", type=int, default=20, help="detective/murderer client pairs")
+    parser.add_argument("--questions", type=int, default=6, help="questions per detective")
+    parser.add_argument("--human-every", type=int, default=3, help="every Nth question goes to the human murderer (0: never)")
+    parser.add_argument("--llm-latency-ms", type=float, default=300, help="fake LLM time to first token")
+    parser.add_argument("--tokens-per-second", type=float, default=60, help="fake LLM token rate (0: instant)")
+    parser.add_argument("--answer-tokens", type=int, default=30, help="tokens per fake answer")
+    parser.add_argument("--db-latency-ms", type=float, default=20, help="blocking time per in-memory Supabase request")
+    parser.add_argument("--murderer-think-ms", type=float, default=500, help="human murderer reply delay")
+    parser.add_argument("--think-ms", type=float, default=100, help="detective pause between questions")
+    parser.add_argument("--ramp-ms", type=float, default=10, help="delay between starting pairs")
+    parser.add_argument("--ask-timeout", type=float, default=60)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--out", help="write the JSON report here as well as stdout")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args)
+        return
+
+    env = {**os.environ, "SIO_DEBUG": "0", "LOG_LEVEL": os.getenv("LOG_LEVEL", "WARNING"), "OPENAI_API_KEY": "sk-fake"}
+    server = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), "--serve", *sys.argv[1:]],
+        env=env,
+        stdout=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{args.port}"
+    try:
+        asyncio.run(wait_until_up(url))
+        report = asyncio.run(drive(args, url))
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text)
+
+
+if __name__ == "__main__":
+    main()
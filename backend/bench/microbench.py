@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks for prompt building and Memory at growing transcript sizes.
+
+For each size N (turns in the room) a synthetic transcript is built and these
+are measured, each as time per call (best of --repeat) and peak allocation
+during one call (tracemalloc):
+
+  memory_add          Memory.add, per turn, while building the N-turn room
+  memory_add_clue     Memory.add_clue, per clue (one clue per 3 turns)
+  get_clues           Memory.get_clues
+  clue_delta          Memory.get_clues_since for the last few clues, as the ask
+                      handler does after each extraction
+  build_prompt_room   qa.build_prompt with the whole room as context
+  build_prompt_thread qa.build_prompt with one character's thread as context
+  *_compacted         the same two after Memory.compact has folded old turns
+                      into the summary, which is the steady state in production
+
+The "exponent" column fits time ~ N^k between the smallest and largest size.
+Per-call costs that should be flat sit near 0, linear ones near 1; anything over
+--max-exponent (default 1.5) is reported as a regression and the script exits 1.
+
+Run from backend/:
+
+    python bench/microbench.py --sizes 100,500,1000,2000 --json results.json
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agents.profiles import create_bellamy  # noqa: E402
+from logic.memory import Memory  # noqa: E402
+from logic.qa import build_prompt  # noqa: E402
+
+CHARACTERS = ["Mrs. Bellamy", "Mr. Holloway", "Tommy the Janitor"]
+
+
+def synthetic_turns(n: int) -> List[Dict[str, str]]:
+    turns = []
+    for i in range(n):
+        character = CHARACTERS[(i // 2) % len(CHARACTERS)]
+        if i % 2 == 0:
+            turns.append({"speaker": "Detective", "content": f"Question {i}: where were you at {i % 12 + 1} o'clock?", "to": character})
+        else:
+            turns.append({"speaker": character, "content": f"Answer {i}: I was in the garden with the roses, then the kitchen.", "to": "Detective"})
+    return turns
+
+
+def build_memory(n: int) -> Memory:
+    memory = Memory()
+    for i, turn in enumerate(synthetic_turns(n)):
+        memory.add(turn["speaker"], turn["content"], to=turn["to"])
+        if i % 3 == 2:
+            memory.add_clue(f"Clue {i}: heard a door at {i % 12 + 1}pm", clue_type="IMPORTANT", source=turn["speaker"])
+    return memory
+
+
+async def _summarize(previous: str, entries) -> str:
+    return (previous + f" {len(entries)} more turns about alibis.").strip()
+
+
+def compacted(memory: Memory) -> Memory:
+    async def run():
+        for scope in [None, *CHARACTERS]:
+            for _ in range(len(memory.entries)):
+                if not memory.needs_compaction(scope):
+                    break
+                await memory.compact(_summarize, scope=scope)
+    asyncio.run(run())
+    return memory
+
+
+def timed(fn: Callable[[], Any], repeat: int, number: int) -> float:
+    """Best-of-`repeat` seconds per call."""
+    best = math.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best
+
+
+def peak_bytes(fn: Callable[[], Any]) -> int:
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    base = tracemalloc.get_traced_memory()[0]
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return max(0, peak - base)
+
+
+def bench_size(n: int, repeat: int, number: int) -> Dict[str, Dict[str, float]]:
+    agent = create_bellamy()
+    turns = synthetic_turns(n)
+    results: Dict[str, Dict[str, float]] = {}
+
+    def add_all():
+        memory = Memory()
+        for turn in turns:
+            memory.add(turn["speaker"], turn["content"], to=turn["to"])
+        return memory
+
+    def add_clues():
+        memory = Memory()
+        for i in range(n // 3):
+            memory.add_clue(f"Clue {i}", clue_type="IMPORTANT", source="Mrs. Bellamy")
+
+    clue_count = max(1, n // 3)
+    results["memory_add"] = {
+        "seconds": timed(add_all, repeat, 1) / n,
+        "peak_bytes": peak_bytes(add_all) / n,
+    }
+    results["memory_add_clue"] = {
+        "seconds": timed(add_clues, repeat, 1) / clue_count,
+        "peak_bytes": peak_bytes(add_clues) / clue_count,
+    }
+
+    memory = build_memory(n)
+    since = max(0, memory.clue_seq - 3)
+    cases = {
+        "get_clues": lambda: memory.get_clues(),
+        "clue_delta": lambda: memory.get_clues_since(since),
+        "build_prompt_room": lambda: build_prompt(agent, "Where were you?", memory, None),
+        "build_prompt_thread": lambda: build_prompt(agent, "Where were you?", memory, agent.name),
+    }
+    for name, fn in cases.items():
+        results[name] = {"seconds": timed(fn, repeat, number), "peak_bytes": peak_bytes(fn)}
+
+    memory = compacted(build_memory(n))
+    cases = {
+        "build_prompt_room_compacted": lambda: build_prompt(agent, "Where were you?", memory, None),
+        "build_prompt_thread_compacted": lambda: build_prompt(agent, "Where were you?", memory, agent.name),
+    }
+    for name, fn in cases.items():
+        results[name] = {"seconds": timed(fn, repeat, number), "peak_bytes": peak_bytes(fn)}
+    return results
+
+
+def exponent(sizes: List[int], values: List[float]) -> float:
+    lo, hi = values[0], values[-1]
+    if lo <= 0 or hi <= 0 or sizes[-1] == sizes[0]:
+        return 0.0
+    return math.log(hi / lo) / math.log(sizes[-1] / sizes[0])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="50,100,250,500,1000,2000", help="comma-separated transcript sizes (turns)")
+    parser.add_argument("--repeat", type=int, default=5, help="timing repeats; the best is kept")
+    parser.add_argument("--number", type=int, default=200, help="calls per timing repeat")
+    parser.add_argument("--max-exponent", type=float, default=1.5, help="flag growth steeper than N^k")
+    parser.add_argument("--json", dest="json_out", help="write results as JSON to this file")
+    args = parser.parse_args()
+
+    sizes = sorted(int(s) for s in args.sizes.split(",") if s.strip())
+    by_size = {n: bench_size(n, args.repeat, args.number) for n in sizes}
+    names = list(by_size[sizes[0]])
+
+    report: Dict[str, Any] = {"sizes": sizes, "benchmarks": {}, "regressions": []}
+    header = f"{'benchmark':32}" + "".join(f"{n:>12}" for n in sizes) + f"{'exponent':>10}{'peak@max':>12}"
+    print(header)
+    print("-" * len(header))
+    for name in names:
+        seconds = [by_size[n][name]["seconds"] for n in sizes]
+        peaks = [by_size[n][name]["peak_bytes"] for n in sizes]
+        k = exponent(sizes, seconds)
+        report["benchmarks"][name] = {
+            "us_per_call": [round(s * 1e6, 3) for s in seconds],
+            "peak_bytes": [int(p) for p in peaks],
+            "exponent": round(k, 2),
+        }
+        if k > args.max_exponent:
+            report["regressions"].append(name)
+        row = f"{name:32}" + "".join(f"{s * 1e6:>10.2f}us" for s in seconds)
+        print(row + f"{k:>10.2f}{int(peaks[-1]):>11}B")
+
+    if report["regressions"]:
+        print(f"\nGrowth steeper than N^{args.max_exponent}: {', '.join(report['regressions'])}")
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump(report, f, indent=2)
+    sys.exit(1 if report["regressions"] else 0)
+
+
+if __name__ == "__main__":
+    main()
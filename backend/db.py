@@ -1,5 +1,12 @@
+import asyncio
 import os
-from typing import Optional, Tuple, Dict, Any, List
+import time
+from datetime import datetime, timezone
+import uuid
+from typing import Optional, Tuple, Dict, Any, List, Callable
+
+from metrics import SUPABASE_LATENCY
+from eventlog import get_logger
 
 try:
     from supabase import create_client, Client
@@ -7,6 +14,8 @@ except Exception:  # pragma: no cover
     create_client = None
     Client = None  # type: ignore
 
+log = get_logger("db")
+
 
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY") or os.getenv("SUPABASE_ANON_KEY")
@@ -16,26 +25,32 @@ supabase: Optional["Client"] = None
 if SUPABASE_URL and SUPABASE_KEY and create_client is not None:
     try:
         supabase = create_client(SUPABASE_URL, SUPABASE_KEY)  # type: ignore
-        print("Supabase client initialized", SUPABASE_URL)
+        log.info("supabase_initialized", url=SUPABASE_URL)
     except Exception as e:  # pragma: no cover
-        print("Failed to init Supabase:", e)
+        log.warning("supabase_init_failed", error=str(e))
         supabase = None
 else:
-    print("Supabase not configured (set SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY)")
+    log.info("supabase_not_configured", hint="set SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY")
+
+
+def _execute(table: str, query: Any) -> Any:
+    """Run a Supabase query builder, recording its latency under `table`."""
+    with SUPABASE_LATENCY.time(table=table):
+        return query.execute()
 
 
 def create_room(code: str) -> Tuple[bool, Optional[str]]:
     if not supabase:
         return False, "supabase_not_configured"
     try:
-        res = supabase.table("rooms").insert({
+        res = _execute("rooms", supabase.table("rooms").insert({
             "code": code,
             "status": "open",
-        }).execute()
+        }))
         data = getattr(res, "data", None)
         return True, f"inserted:{len(data) if data is not None else 'unknown'}"
     except Exception as e:
-        print("DB create_room warning:", e)
+        log.warning("db_error", op="create_room", error=str(e))
         return False, str(e)
 
 
@@ -43,10 +58,10 @@ def update_room_status(code: str, status: str) -> Tuple[bool, Optional[str]]:
     if not supabase:
         return False, "supabase_not_configured"
     try:
-        res = supabase.table("rooms").update({"status": status}).eq("code", code).execute()
+        res = _execute("rooms", supabase.table("rooms").update({"status": status}).eq("code", code))
         return True, None
     except Exception as e:
-        print("DB update_room_status warning:", e)
+        log.warning("db_error", op="update_room_status", error=str(e))
         return False, str(e)
 
 
@@ -54,15 +69,15 @@ def add_room_member(code: str, role: str, user_id: Optional[str] = None) -> Tupl
     if not supabase:
         return False, "supabase_not_configured"
     try:
-        res = supabase.table("room_members").insert({
+        res = _execute("room_members", supabase.table("room_members").insert({
             "room_code": code,
             "role": role,
             "user_id": user_id,
-        }).execute()
+        }))
         data = getattr(res, "data", None)
         return True, f"inserted:{len(data) if data is not None else 'unknown'}"
     except Exception as e:
-        print("DB add_room_member warning:", e)
+        log.warning("db_error", op="add_room_member", error=str(e))
         return False, str(e)
 
 
@@ -70,11 +85,11 @@ def room_exists(code: str) -> bool:
     if not supabase:
         return False
     try:
-        res = supabase.table("rooms").select("code").eq("code", code).limit(1).execute()
+        res = _execute("rooms", supabase.table("rooms").select("code").eq("code", code).limit(1))
         items = getattr(res, "data", None) or getattr(res, "json", {}).get("data") or []
         return bool(items)
     except Exception as e:
-        print("DB room_exists warning:", e)
+        log.warning("db_error", op="room_exists", error=str(e))
         return False
 
 
@@ -83,16 +98,18 @@ def debug_status() -> Dict[str, Any]:
     can_read = False
     try:
         if supabase:
-            res = supabase.table("rooms").select("code").limit(1).execute()
+            res = _execute("rooms", supabase.table("rooms").select("code").limit(1))
             items = getattr(res, "data", [])
             can_read = True if items is not None else False
     except Exception as e:
-        print("DB debug_status warning:", e)
+        log.warning("db_error", op="debug_status", error=str(e))
         can_read = False
     return {
         "configured": conf,
         "url": SUPABASE_URL,
         "can_read": can_read,
+        "write_behind": write_behind.stats(),
+        "clue_cache": clue_cache.stats(),
     }
 
 
@@ -114,9 +131,9 @@ def add_transcript_entry(
     if not supabase:
         return False, "supabase_not_configured"
     try:
-        res = (
-            supabase.table("transcript")
-            .insert(
+        res = _execute(
+            "transcript",
+            supabase.table("transcript").insert(
                 {
                     "room_code": room_code,
                     "speaker": speaker,
@@ -124,13 +141,12 @@ def add_transcript_entry(
                     "content": content,
                     "correlation_id": correlation_id,
                 }
-            )
-            .execute()
+            ),
         )
         data = getattr(res, "data", None)
         return True, f"inserted:{len(data) if data is not None else 'unknown'}"
     except Exception as e:
-        print("DB add_transcript_entry warning:", e)
+        log.warning("db_error", op="add_transcript_entry", error=str(e))
         return False, str(e)
 
 
@@ -155,33 +171,384 @@ def add_clue(
         }
         if timestamp:
             payload["timestamp"] = timestamp
-        res = supabase.table("clues").insert(payload).execute()
+        res = _execute("clues", supabase.table("clues").insert(payload))
         data = getattr(res, "data", None)
         return True, f"inserted:{len(data) if data is not None else 'unknown'}"
     except Exception as e:
-        print("DB add_clue warning:", e)
+        log.warning("db_error", op="add_clue", error=str(e))
         return False, str(e)
 
 
+# ==============================
+# Write-behind batching for transcript and clue rows
+# ==============================
+
+DB_WRITE_BATCH_SIZE = int(os.getenv("DB_WRITE_BATCH_SIZE", "100"))
+DB_WRITE_FLUSH_SECONDS = float(os.getenv("DB_WRITE_FLUSH_SECONDS", "0.5"))
+DB_WRITE_MAX_QUEUE = int(os.getenv("DB_WRITE_MAX_QUEUE", "10000"))
+DB_WRITE_MAX_RETRIES = int(os.getenv("DB_WRITE_MAX_RETRIES", "4"))
+
+
+def _bulk_insert(table: str, rows: List[Dict[str, Any]]) -> None:
+    _execute(table, supabase.table(table).insert(rows))  # type: ignore[union-attr]
+
+
+class WriteBehindQueue:
+    """Collects rows per table and bulk-inserts them from a background task.
+
+    A flush happens when a table reaches DB_WRITE_BATCH_SIZE rows or every
+    DB_WRITE_FLUSH_SECONDS, whichever comes first. Failed batches are retried
+    with exponential backoff and dropped (with a warning) after DB_WRITE_MAX_RETRIES.
+    """
+
+    def __init__(self):
+        self._rows: Dict[str, List[Dict[str, Any]]] = {}
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        # batches taken off _rows that are being inserted
+        self._sending: List[Tuple[str, List[Dict[str, Any]]]] = []
+        self.flushed_rows = 0
+        self.dropped_rows = 0
+        self.failed_batches = 0
+        self.flushes = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        # callables(table, rows) run after each successful batch insert
+        self.flush_listeners: List[Callable[[str, List[Dict[str, Any]]], None]] = []
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def depth(self) -> int:
+        return sum(len(rows) for rows in self._rows.values())
+
+    def pending(self, table: str, room_code: str) -> bool:
+        """Whether rows for `room_code` are queued or being inserted into `table`."""
+        batches = [self._rows.get(table, [])] + [rows for t, rows in self._sending if t == table]
+        return any(row.get("room_code") == room_code for rows in batches for row in rows)
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self._wake = asyncio.Event()
+        self._stopping = False
+        self._task = asyncio.create_task(self._run())
+
+    def enqueue(self, table: str, row: Dict[str, Any]) -> bool:
+        if self.depth() >= DB_WRITE_MAX_QUEUE:
+            self.dropped_rows += 1
+            log.warning("db_write_behind_full", table=table)
+            return False
+        rows = self._rows.setdefault(table, [])
+        rows.append(row)
+        if len(rows) >= DB_WRITE_BATCH_SIZE and self._wake is not None:
+            self._wake.set()
+        return True
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=DB_WRITE_FLUSH_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+
+    async def flush(self) -> None:
+        for table in list(self._rows):
+            while self._rows.get(table):
+                batch = self._rows[table][:DB_WRITE_BATCH_SIZE]
+                del self._rows[table][:DB_WRITE_BATCH_SIZE]
+                entry = (table, batch)
+                self._sending.append(entry)
+                try:
+                    await self._insert_with_retry(table, batch)
+                finally:
+                    self._sending.remove(entry)
+
+    async def _insert_with_retry(self, table: str, batch: List[Dict[str, Any]]) -> None:
+        delay = 0.2
+        for attempt in range(DB_WRITE_MAX_RETRIES + 1):
+            started = time.perf_counter()
+            try:
+                await asyncio.to_thread(_bulk_insert, table, batch)
+            except Exception as e:
+                self.failed_batches += 1
+                if attempt == DB_WRITE_MAX_RETRIES:
+                    self.dropped_rows += len(batch)
+                    log.error("db_write_behind_gave_up", table=table, rows=len(batch), error=str(e))
+                    return
+                log.warning("db_write_behind_retry", table=table, attempt=attempt + 1, error=str(e))
+                try:
+                    await asyncio.sleep(delay)
+                except asyncio.CancelledError:
+                    # not inserted yet: put it back so the next flush still sends it
+                    self._rows.setdefault(table, [])[:0] = batch
+                    raise
+                delay = min(delay * 2, 5.0)
+                continue
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            self.flushes += 1
+            self.flushed_rows += len(batch)
+            self.last_flush_ms = elapsed_ms
+            self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+            for listener in self.flush_listeners:
+                try:
+                    result = listener(table, batch)
+                    if asyncio.iscoroutine(result):
+                        await result
+                except Exception as e:
+                    log.warning("db_flush_listener_failed", error=str(e))
+            return
+
+    async def stop(self) -> None:
+        """Stop the background task and flush whatever is still queued.
+
+        The task finishes the flush it is in (including retries) rather than
+        being cancelled, so no batch is lost between it and the final flush.
+        """
+        if self._task is not None:
+            self._stopping = True
+            self._wake.set()
+            await self._task
+            self._task = None
+        await self.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "queue_depth": self.depth(),
+            "flushes": self.flushes,
+            "flushed_rows": self.flushed_rows,
+            "dropped_rows": self.dropped_rows,
+            "failed_batches": self.failed_batches,
+            "last_flush_ms": round(self.last_flush_ms, 2),
+            "max_flush_ms": round(self.max_flush_ms, 2),
+        }
+
+
+write_behind = WriteBehindQueue()
+
+
+def start_write_behind() -> None:
+    if supabase:
+        write_behind.start()
+
+
+async def stop_write_behind() -> None:
+    await write_behind.stop()
+
+
+def enqueue_transcript_entry(
+    room_code: str,
+    speaker: str,
+    content: str,
+    character: Optional[str] = None,
+    correlation_id: Optional[str] = None,
+) -> Tuple[bool, Optional[str]]:
+    """Queue a transcript row for the next bulk insert (same row as add_transcript_entry)."""
+    if not supabase:
+        return False, "supabase_not_configured"
+    if not write_behind.running:
+        return add_transcript_entry(room_code, speaker, content, character=character, correlation_id=correlation_id)
+    ok = write_behind.enqueue(
+        "transcript",
+        {
+            "room_code": room_code,
+            "speaker": speaker,
+            "character": character,
+            "content": content,
+            "correlation_id": correlation_id,
+            # a bulk insert shares one now(); keep turns ordered for hydration paging
+            "created_at": datetime.now(timezone.utc).isoformat(),
+        },
+    )
+    return ok, "queued" if ok else "queue_full"
+
+
+def enqueue_clue(
+    room_code: str,
+    text: str,
+    clue_type: str,
+    source: Optional[str] = None,
+    timestamp: Optional[str] = None,
+) -> Tuple[bool, Optional[str]]:
+    """Queue a clue row for the next bulk insert (same row as add_clue)."""
+    if not supabase:
+        return False, "supabase_not_configured"
+    if not write_behind.running:
+        return add_clue(room_code, text=text, clue_type=clue_type, source=source, timestamp=timestamp)
+    # bulk inserts need every row to carry the same columns
+    ok = write_behind.enqueue(
+        "clues",
+        {
+            "room_code": room_code,
+            "text": text,
+            "type": clue_type,
+            "source": source,
+            "timestamp": timestamp or datetime.now().isoformat(),
+            # a bulk insert shares one now(); keep clues ordered for hydration
+            "created_at": datetime.now(timezone.utc).isoformat(),
+        },
+    )
+    return ok, "queued" if ok else "queue_full"
+
+
+def get_transcript_page(
+    room_code: str,
+    limit: int = 50,
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    newest_first: bool = False,
+) -> Tuple[bool, List[Dict[str, Any]]]:
+    """Fetch one page of a room's transcript ordered by created_at; returns (ok, list).
+    `before` / `after` are exclusive created_at bounds used as paging cursors.
+    """
+    if not supabase:
+        return False, []
+    try:
+        query = (
+            supabase.table("transcript")
+            .select("speaker,character,content,correlation_id,created_at")
+            .eq("room_code", room_code)
+        )
+        if before:
+            query = query.lt("created_at", before)
+        if after:
+            query = query.gt("created_at", after)
+        res = _execute("transcript", query.order("created_at", desc=newest_first).limit(limit))
+        data = getattr(res, "data", []) or []
+        return True, data  # type: ignore
+    except Exception as e:
+        log.warning("db_error", op="get_transcript_page", error=str(e))
+        return False, []
+
+
 def get_clues_for_room(room_code: str) -> Tuple[bool, List[Dict[str, Any]]]:
     """Fetch clues for a room; returns (ok, list)."""
     if not supabase:
         return False, []
     try:
-        res = (
+        res = _execute(
+            "clues",
             supabase.table("clues")
             .select("text,type,source,timestamp,created_at")
             .eq("room_code", room_code)
-            .order("created_at", desc=False)
-            .execute()
+            .order("created_at", desc=False),
         )
         data = getattr(res, "data", []) or []
         return True, data  # type: ignore
     except Exception as e:
-        print("DB get_clues_for_room warning:", e)
+        log.warning("db_error", op="get_clues_for_room", error=str(e))
         return False, []
 
 
+class LocalClueVersions:
+    """Clue list versions kept in this process; fine for a single process.
+
+    Anything with the same three coroutines and `clue_version_epoch` can stand
+    in, e.g. the shared state backend, so every process agrees on versions.
+    """
+
+    def __init__(self):
+        self._versions: Dict[str, int] = {}
+        # distinguishes ETags issued before and after a restart
+        self.clue_version_epoch = uuid.uuid4().hex[:8]
+
+    async def clue_version(self, code: str) -> int:
+        return self._versions.get(code, 0)
+
+    async def bump_clue_version(self, code: str) -> int:
+        self._versions[code] = self._versions.get(code, 0) + 1
+        return self._versions[code]
+
+    async def forget_clue_version(self, code: str) -> None:
+        self._versions.pop(code, None)
+
+
+class RoomClueCache:
+    """Read-through, per-room cache over get_clues_for_room.
+
+    Each room has a version that is bumped whenever its clues change; the version
+    doubles as the HTTP ETag, so clients that already hold the latest list get a
+    304 without touching the DB, and concurrent misses share a single read.
+    Versions live in `versions` (LocalClueVersions unless the app plugs in its
+    shared state backend), so an invalidation on one process is seen by all.
+    """
+
+    def __init__(self, versions=None):
+        self.versions = versions or LocalClueVersions()
+        self._items: Dict[str, Tuple[int, List[Dict[str, Any]]]] = {}
+        self._loading: Dict[str, "asyncio.Future[Tuple[bool, List[Dict[str, Any]]]]"] = {}
+        self.hits = 0
+        self.misses = 0
+
+    async def version(self, code: str) -> int:
+        return await self.versions.clue_version(code)
+
+    def etag(self, version: int) -> str:
+        return f'W/"{self.versions.clue_version_epoch}-{version}"'
+
+    async def invalidate(self, code: str) -> None:
+        self._items.pop(code, None)
+        await self.versions.bump_clue_version(code)
+
+    async def forget(self, code: str, shared: bool = True) -> None:
+        """Drop the cached list; with `shared`, also the room's version (room closed for good)."""
+        self._items.pop(code, None)
+        if shared:
+            await self.versions.forget_clue_version(code)
+
+    async def get(self, code: str) -> Tuple[bool, int, List[Dict[str, Any]]]:
+        """Return (ok, version, clues) for a room, reading the DB at most once per version."""
+        version = await self.version(code)
+        if not supabase:
+            return False, version, []
+        cached = self._items.get(code)
+        if cached and cached[0] == version:
+            self.hits += 1
+            return True, version, cached[1]
+        self.misses += 1
+        fut = self._loading.get(code)
+        if fut is None:
+            fut = asyncio.get_running_loop().create_future()
+            self._loading[code] = fut
+            try:
+                result = await asyncio.to_thread(get_clues_for_room, code)
+                fut.set_result(result)
+            except Exception as e:
+                fut.set_exception(e)
+            finally:
+                self._loading.pop(code, None)
+                if not fut.done():
+                    fut.cancel()
+        ok, items = await asyncio.shield(fut)
+        # only cache if nothing was added while we were reading, and the DB
+        # already has every clue queued for the room (write-behind)
+        if ok and await self.version(code) == version and not write_behind.pending("clues", code):
+            self._items[code] = (version, items)
+        return ok, version, items
+
+    def stats(self) -> Dict[str, int]:
+        return {"rooms": len(self._items), "hits": self.hits, "misses": self.misses}
+
+
+clue_cache = RoomClueCache()
+
+
+async def _invalidate_flushed_clues(table: str, rows: List[Dict[str, Any]]) -> None:
+    # the DB only reflects queued clues once they are flushed
+    if table == "clues":
+        for code in {row.get("room_code") for row in rows}:
+            if code:
+                await clue_cache.invalidate(code)
+
+
+write_behind.flush_listeners.append(_invalidate_flushed_clues)
+
+
 def get_character_profile(name: str) -> Tuple[bool, Optional[Dict[str, Any]]]:
     """Fetch a character's police profile from Supabase.
     Expected table: character_profiles(name text pk, dob text, address text, image_url text, record text)
@@ -189,18 +556,88 @@ def get_character_profile(name: str) -> Tuple[bool, Optional[Dict[str, Any]]]:
     if not supabase:
         return False, None
     try:
-        res = (
+        res = _execute(
+            "character_profiles",
             supabase.table("character_profiles")
             .select("name,dob,address,image_url,record")
             .ilike("name", name)
-            .limit(1)
-            .execute()
+            .limit(1),
         )
         data = getattr(res, "data", []) or []
         if not data:
             return True, None
         return True, data[0]
     except Exception as e:
-        print("DB get_character_profile warning:", e)
+        log.warning("db_error", op="get_character_profile", error=str(e))
         return False, None
 
+
+
+def get_all_character_profiles() -> Tuple[bool, List[Dict[str, Any]]]:
+    """Fetch every character profile in one query; returns (ok, list)."""
+    if not supabase:
+        return False, []
+    try:
+        res = _execute("character_profiles", supabase.table("character_profiles").select("name,dob,address,image_url,record"))
+        data = getattr(res, "data", []) or []
+        return True, data  # type: ignore
+    except Exception as e:
+        log.warning("db_error", op="get_all_character_profiles", error=str(e))
+        return False, []
+
+
+PROFILE_CACHE_TTL_SECONDS = float(os.getenv("PROFILE_CACHE_TTL_SECONDS", "600"))
+
+
+class ProfileCache:
+    """In-process copy of character_profiles, keyed by lower-cased name.
+
+    Loaded in bulk once, then refreshed in the background when older than the
+    TTL. If a refresh fails the previous copy keeps being served.
+    """
+
+    def __init__(self, ttl_seconds: float = PROFILE_CACHE_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._profiles: Dict[str, Dict[str, Any]] = {}
+        self.loaded = False
+        self.loaded_at = 0.0
+        self._refreshing: Optional[asyncio.Task] = None
+
+    def _load(self) -> bool:
+        ok, rows = get_all_character_profiles()
+        if ok:
+            self._profiles = {(row.get("name") or "").lower(): row for row in rows}
+            self.loaded = True
+            self.loaded_at = time.monotonic()
+        return ok
+
+    async def refresh(self) -> bool:
+        """Reload from Supabase; concurrent callers share one query."""
+        if self._refreshing is None or self._refreshing.done():
+            self._refreshing = asyncio.create_task(asyncio.to_thread(self._load))
+        return await asyncio.shield(self._refreshing)
+
+    def is_stale(self) -> bool:
+        return time.monotonic() - self.loaded_at > self.ttl_seconds
+
+    async def get(self, name: str) -> Tuple[bool, Optional[Dict[str, Any]]]:
+        if not supabase:
+            return False, None
+        if not self.loaded:
+            await self.refresh()
+            if not self.loaded:
+                return False, None
+        elif self.is_stale() and (self._refreshing is None or self._refreshing.done()):
+            # serve what we have now, refresh for the next caller
+            self._refreshing = asyncio.create_task(asyncio.to_thread(self._load))
+        return True, self._profiles.get((name or "").strip().lower())
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "loaded": self.loaded,
+            "profiles": len(self._profiles),
+            "age_seconds": round(time.monotonic() - self.loaded_at, 1) if self.loaded else None,
+        }
+
+
+profile_cache = ProfileCache()
@@ -1,22 +1,212 @@
+"""
+Single-player game state: character memory and the clue list.
+
+Writes go to append-only JSONL logs (state/memory.jsonl, state/clues.jsonl)
+instead of rewriting the whole JSON file, so each write costs the same however
+long the session runs. The state is kept in memory and rebuilt from the log on
+first use; a log that does not exist yet is seeded from state/memory.json /
+state/clues.json. Once the log holds more records than the last snapshot had
+items (and at least GAME_STATE_COMPACT_EVERY), it is rewritten as a single
+snapshot record (atomically, via a temp file) and the JSON file is refreshed,
+which also happens at exit; compaction cost is thus amortised to a constant
+per write. Records are flushed on every write and fsynced in batches
+(GAME_STATE_FSYNC_EVERY records or GAME_STATE_FSYNC_INTERVAL_SECONDS,
+whichever comes first).
+"""
+import atexit
 import json
+import os
+import threading
+import time
 from pathlib import Path
 
 MEMORY_FILE = Path("backend/state/memory.json")
 CLUES_FILE = Path("backend/state/clues.json")
+MEMORY_LOG = MEMORY_FILE.with_suffix(".jsonl")
+CLUES_LOG = CLUES_FILE.with_suffix(".jsonl")
+
+GAME_STATE_COMPACT_EVERY = int(os.getenv("GAME_STATE_COMPACT_EVERY", "1000"))
+GAME_STATE_FSYNC_EVERY = int(os.getenv("GAME_STATE_FSYNC_EVERY", "64"))
+GAME_STATE_FSYNC_INTERVAL_SECONDS = float(os.getenv("GAME_STATE_FSYNC_INTERVAL_SECONDS", "1"))
+
+
+def _write_atomic(path, text):
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class _LogStore:
+    """In-memory state backed by an append-only JSONL log of the changes to it."""
+
+    def __init__(self, log_path, json_path, empty):
+        self.log_path = log_path
+        self.json_path = json_path
+        self.empty = empty
+        self.state = None
+        self.records = 0
+        # items in the snapshot the log was last rewritten with
+        self.compacted_size = 0
+        self._file = None
+        self._unsynced = 0
+        self._synced_at = 0.0
+        self._lock = threading.RLock()
+
+    # --- subclasses ---
+    def apply(self, record):
+        raise NotImplementedError
+
+    def size(self):
+        return len(self.state)
+
+    def reset(self, state):
+        self.state = state
+
+    def snapshot(self):
+        return {"op": "snapshot", "state": self.state}
+
+    # --- log ---
+    def _open(self):
+        if self.state is not None:
+            return
+        self.log_path.parent.mkdir(parents=True, exist_ok=True)
+        if self.log_path.exists():
+            self.reset(self.empty())
+            torn = False
+            with open(self.log_path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        torn = True  # partial last line after a crash
+                        continue
+                    self.apply(record)
+                    self.records += 1
+            self.compacted_size = self.size()
+            if torn:
+                # appending after a partial line would corrupt the next record
+                self._rewrite()
+        else:
+            try:
+                self.reset(json.loads(self.json_path.read_text()))
+            except (OSError, ValueError):
+                self.reset(self.empty())
+            self._rewrite()
+        self._file = open(self.log_path, "a", encoding="utf-8")
+        self._synced_at = time.monotonic()
+
+    def _rewrite(self):
+        _write_atomic(self.log_path, json.dumps(self.snapshot()) + "\n")
+        self.records = 1
+        self.compacted_size = self.size()
+
+    def append(self, record):
+        self.apply(record)
+        self._file.write(json.dumps(record) + "\n")
+        self._file.flush()
+        self.records += 1
+        self._unsynced += 1
+        if (
+            self._unsynced >= GAME_STATE_FSYNC_EVERY
+            or time.monotonic() - self._synced_at >= GAME_STATE_FSYNC_INTERVAL_SECONDS
+        ):
+            self.sync()
+        if self.records > max(GAME_STATE_COMPACT_EVERY, self.compacted_size):
+            self.compact()
+
+    def sync(self):
+        if self._file is not None and self._unsynced:
+            os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._synced_at = time.monotonic()
+
+    def compact(self):
+        """Rewrite the log as one snapshot record and refresh the JSON file."""
+        with self._lock:
+            if self._file is None:
+                return
+            self.sync()
+            self._file.close()
+            self._rewrite()
+            self._file = open(self.log_path, "a", encoding="utf-8")
+            _write_atomic(self.json_path, json.dumps(self.state, indent=2))
+
+    def close(self):
+        with self._lock:
+            if self._file is None:
+                return
+            self.compact()
+            self._file.close()
+            self._file = None
+            self.state = None
+
+
+class _MemoryStore(_LogStore):
+    def size(self):
+        return sum(len(entries) for entries in self.state.values())
+
+    def apply(self, record):
+        if record.get("op") == "snapshot":
+            self.reset(record["state"])
+        else:
+            self.state.setdefault(record["character"], []).append(record["entry"])
+
+
+class _ClueStore(_LogStore):
+    def reset(self, state):
+        self.state = state
+        self._keys = {self.key(clue) for clue in state}
+
+    @staticmethod
+    def key(clue):
+        return json.dumps(clue, sort_keys=True)
+
+    def apply(self, record):
+        if record.get("op") == "snapshot":
+            self.reset(record["state"])
+            return
+        key = self.key(record["clue"])
+        if key not in self._keys:
+            self._keys.add(key)
+            self.state.append(record["clue"])
+
+
+_memory = _MemoryStore(MEMORY_LOG, MEMORY_FILE, dict)
+_clues = _ClueStore(CLUES_LOG, CLUES_FILE, list)
+
 
 def load_memory():
-    return json.loads(MEMORY_FILE.read_text())
+    with _memory._lock:
+        _memory._open()
+        return {character: list(entries) for character, entries in _memory.state.items()}
+
 
 def update_memory(character, entry):
-    memory = load_memory()
-    memory.setdefault(character, []).append(entry)
-    MEMORY_FILE.write_text(json.dumps(memory, indent=2))
+    with _memory._lock:
+        _memory._open()
+        _memory.append({"op": "append", "character": character, "entry": entry})
+
 
 def get_clues():
-    return json.loads(CLUES_FILE.read_text())
+    with _clues._lock:
+        _clues._open()
+        return list(_clues.state)
+
 
 def add_clue(clue):
-    clues = get_clues()
-    if clue not in clues:
-        clues.append(clue)
-        CLUES_FILE.write_text(json.dumps(clues, indent=2))
+    with _clues._lock:
+        _clues._open()
+        if _clues.key(clue) not in _clues._keys:
+            _clues.append({"op": "add", "clue": clue})
+
+
+def close():
+    """Compact both logs, refresh the JSON files and close them."""
+    _memory.close()
+    _clues.close()
+
+
+atexit.register(close)
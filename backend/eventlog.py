@@ -0,0 +1,148 @@
+"""
+Structured, sampled, queue-backed logging.
+
+    log = get_logger("main")
+    bind(room=code, sid=sid)                    # attached to every event in this task
+    log.info("ask_received", character=name)    # -> one JSON line
+
+Events are plain dicts: {"ts", "level", "logger", "event", **context, **fields}.
+Handlers only enqueue the record; a background thread formats JSON and writes
+it, so socket handlers never block on stdout. Disabled levels return before
+building anything, and LOG_SAMPLE_RATES keeps a fraction of chatty events
+(warnings and errors are never sampled out), e.g.
+
+    LOG_LEVEL=INFO
+    LOG_SAMPLE_RATES=socket_connected=0.1,ask_received=0.25
+"""
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+from typing import Any, Dict, Optional
+
+LOG_LEVEL = logging.getLevelName(os.getenv("LOG_LEVEL", "INFO").upper())
+if not isinstance(LOG_LEVEL, int):
+    LOG_LEVEL = logging.INFO
+LOG_QUEUE_MAX = int(os.getenv("LOG_QUEUE_MAX", "10000"))
+
+
+def _parse_rates(spec: str) -> Dict[str, float]:
+    rates = {}
+    for item in spec.split(","):
+        name, _, rate = item.partition("=")
+        try:
+            rates[name.strip()] = max(0.0, min(1.0, float(rate)))
+        except ValueError:
+            continue
+    return rates
+
+
+SAMPLE_RATES = _parse_rates(os.getenv("LOG_SAMPLE_RATES", ""))
+
+_context: contextvars.ContextVar[Dict[str, Any]] = contextvars.ContextVar("log_context", default={})
+
+
+def bind(**fields: Any) -> None:
+    """Attach fields (room, sid, correlation_id, ...) to later events in the current task."""
+    _context.set({**_context.get(), **{k: v for k, v in fields.items() if v is not None}})
+
+
+class _JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        event = {
+            "ts": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "event": record.msg,
+            **getattr(record, "fields", {}),
+        }
+        if record.exc_info:
+            event["exc"] = self.formatException(record.exc_info)
+        return json.dumps(event, default=str, ensure_ascii=False)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """Enqueue records untouched; formatting happens on the listener thread."""
+
+    dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _QueueHandler.dropped += 1
+
+
+_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(LOG_QUEUE_MAX)
+_stream = logging.StreamHandler(sys.stdout)
+_stream.setFormatter(_JsonFormatter())
+_listener = logging.handlers.QueueListener(_queue, _stream, respect_handler_level=False)
+_root = logging.getLogger("detective")
+_root.setLevel(LOG_LEVEL)
+_root.propagate = False
+_root.addHandler(_QueueHandler(_queue))
+_listener.start()
+
+
+def shutdown() -> None:
+    """Flush queued events; safe to call more than once."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(shutdown)
+
+
+class EventLogger:
+    def __init__(self, name: str):
+        self._logger = _root.getChild(name)
+
+    def enabled(self, level: int) -> bool:
+        return self._logger.isEnabledFor(level)
+
+    def log(self, level: int, event: str, exc_info: Any = None, **fields: Any) -> None:
+        if not self._logger.isEnabledFor(level):
+            return
+        if level < logging.WARNING:
+            rate = SAMPLE_RATES.get(event)
+            if rate is not None and random.random() >= rate:
+                return
+        context = _context.get()
+        record = self._logger.makeRecord(
+            self._logger.name, level, "", 0, event, (), exc_info,
+            extra={"fields": {**context, **fields} if context else fields},
+        )
+        self._logger.handle(record)
+
+    def debug(self, event: str, **fields: Any) -> None:
+        self.log(logging.DEBUG, event, **fields)
+
+    def info(self, event: str, **fields: Any) -> None:
+        self.log(logging.INFO, event, **fields)
+
+    def warning(self, event: str, **fields: Any) -> None:
+        self.log(logging.WARNING, event, **fields)
+
+    def error(self, event: str, **fields: Any) -> None:
+        self.log(logging.ERROR, event, **fields)
+
+    def exception(self, event: str, **fields: Any) -> None:
+        self.log(logging.ERROR, event, exc_info=sys.exc_info(), **fields)
+
+
+def get_logger(name: str) -> EventLogger:
+    return EventLogger(name)
+
+
+def stats() -> Dict[str, Optional[int]]:
+    return {"queued": _queue.qsize(), "dropped": _QueueHandler.dropped}
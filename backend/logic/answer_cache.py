@@ -0,0 +1,68 @@
+"""
+Opt-in cache of character answers.
+
+Detectives open every room with the same handful of questions, so an answer is
+keyed on (character, normalised question, hash of the prompt context). A hit
+skips the completion entirely. Entries expire after a TTL and the cache is
+LRU-bounded. Characters with `vary_answers = True` are never cached.
+"""
+import hashlib
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "0") == "1"
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "2048"))
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600"))
+
+Key = Tuple[str, str, str]
+
+
+def normalize_question(question: str) -> str:
+    text = re.sub(r"[^\w\s]", " ", (question or "").lower())
+    return " ".join(text.split())
+
+
+class AnswerCache:
+    def __init__(self, max_entries: int = ANSWER_CACHE_SIZE, ttl_seconds: float = ANSWER_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._items: "OrderedDict[Key, Tuple[float, str]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(character: str, question: str, context: str) -> Key:
+        digest = hashlib.sha1(context.encode("utf-8")).hexdigest()
+        return (character, normalize_question(question), digest)
+
+    def get(self, key: Key) -> Optional[str]:
+        item = self._items.get(key)
+        if item is None:
+            self.misses += 1
+            return None
+        expires_at, answer = item
+        if expires_at < time.monotonic():
+            del self._items[key]
+            self.misses += 1
+            return None
+        self._items.move_to_end(key)
+        self.hits += 1
+        return answer
+
+    def put(self, key: Key, answer: str) -> None:
+        self._items[key] = (time.monotonic() + self.ttl_seconds, answer)
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_entries:
+            self._items.popitem(last=False)
+
+    def clear(self) -> None:
+        self._items.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {"size": len(self._items), "hits": self.hits, "misses": self.misses}
+
+
+answer_cache = AnswerCache()
@@ -0,0 +1,114 @@
+"""
+Background pipeline for clue extraction.
+
+Extraction is a second LLM round-trip that the detective does not need to wait
+for, so the ask handler hands it to this pool once the answer has been sent.
+Jobs are queued per room and a room is only ever worked on by one worker at a
+time, which keeps clues (and the clues_updated events) in question order.
+Queue depth is capped globally and per room; jobs over the cap are dropped.
+Each job runs in a copy of the submitter's contextvars, so its log events carry
+that question's room / sid / correlation_id rather than whatever the worker
+task happened to inherit.
+"""
+import asyncio
+import contextvars
+import os
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+from eventlog import get_logger
+
+log = get_logger("clue_pipeline")
+
+CLUE_WORKERS = int(os.getenv("CLUE_WORKERS", "4"))
+CLUE_QUEUE_MAX = int(os.getenv("CLUE_QUEUE_MAX", "256"))
+CLUE_QUEUE_MAX_PER_ROOM = int(os.getenv("CLUE_QUEUE_MAX_PER_ROOM", "8"))
+
+Job = Callable[[], Awaitable[Any]]
+
+
+class CluePipeline:
+    def __init__(
+        self,
+        workers: int = CLUE_WORKERS,
+        max_pending: int = CLUE_QUEUE_MAX,
+        max_pending_per_room: int = CLUE_QUEUE_MAX_PER_ROOM,
+    ):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.max_pending_per_room = max_pending_per_room
+        self._rooms: Dict[str, Deque[Tuple[Job, contextvars.Context]]] = {}
+        self._ready: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._pending = 0
+        self.processed = 0
+        self.failed = 0
+        self.dropped = 0
+
+    def start(self) -> None:
+        if self._tasks:
+            return
+        self._ready = asyncio.Queue()
+        # workers must not inherit a request's log context; jobs bring their own
+        clean = contextvars.Context()
+        self._tasks = [clean.run(asyncio.ensure_future, self._worker()) for _ in range(self.workers)]
+
+    def submit(self, room: str, job: Job) -> bool:
+        """Queue `job` behind any earlier jobs for `room`. Returns False if dropped."""
+        self.start()
+        queue = self._rooms.get(room)
+        if self._pending >= self.max_pending or (queue and len(queue) >= self.max_pending_per_room):
+            self.dropped += 1
+            log.warning("clue_job_dropped", room=room)
+            return False
+        self._pending += 1
+        item = (job, contextvars.copy_context())
+        if queue is None:
+            # room was idle: it needs a worker
+            self._rooms[room] = deque([item])
+            self._ready.put_nowait(room)
+        else:
+            queue.append(item)
+        return True
+
+    async def _worker(self) -> None:
+        while True:
+            room = await self._ready.get()
+            queue = self._rooms[room]
+            job, context = queue.popleft()
+            try:
+                # a task created inside context.run() runs in a copy of that context
+                await context.run(asyncio.ensure_future, job())
+                self.processed += 1
+            except Exception as e:
+                self.failed += 1
+                log.warning("clue_job_failed", room=room, error=str(e))
+            finally:
+                self._pending -= 1
+            if queue:
+                self._ready.put_nowait(room)
+            else:
+                del self._rooms[room]
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """Let queued jobs finish (up to `timeout` seconds), then stop the workers."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while self._pending and loop.time() < deadline:
+            await asyncio.sleep(0.05)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "pending": self._pending,
+            "rooms": len(self._rooms),
+            "processed": self.processed,
+            "failed": self.failed,
+            "dropped": self.dropped,
+        }
+
+
+pipeline = CluePipeline()
@@ -0,0 +1,208 @@
+"""
+Shared async LLM client.
+
+Every completion in the backend goes through here so that:
+  - one pooled httpx.AsyncClient is reused for all requests (no per-call TLS handshakes),
+  - a global semaphore caps how many completions are in flight per worker,
+  - a per-room semaphore stops one busy room from starving the others,
+  - every call has a hard timeout instead of hanging a socket handler forever.
+"""
+import asyncio
+import json
+import os
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import httpx
+
+OPENAI_API_BASE = os.getenv("OPENAI_API_BASE", "https://api.openai.com/v1").rstrip("/")
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "30"))
+LLM_CONNECT_TIMEOUT_SECONDS = float(os.getenv("LLM_CONNECT_TIMEOUT_SECONDS", "5"))
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "64"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "48"))
+LLM_ROOM_CONCURRENCY = int(os.getenv("LLM_ROOM_CONCURRENCY", "2"))
+
+
+class LLMError(Exception):
+    """Raised when a completion fails, times out or returns something unusable."""
+
+
+_client: Optional[httpx.AsyncClient] = None
+# clients for endpoints other than OPENAI_API_BASE, keyed by base URL
+_clients: Dict[str, httpx.AsyncClient] = {}
+_global_sem: Optional[asyncio.Semaphore] = None
+_room_sems: Dict[str, asyncio.Semaphore] = {}
+
+
+def _new_client(base_url: str) -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        base_url=base_url,
+        timeout=httpx.Timeout(LLM_TIMEOUT_SECONDS, connect=LLM_CONNECT_TIMEOUT_SECONDS),
+        limits=httpx.Limits(
+            max_connections=LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=LLM_MAX_CONNECTIONS,
+        ),
+    )
+
+
+def _get_client(api_base: Optional[str] = None) -> httpx.AsyncClient:
+    global _client
+    api_base = (api_base or "").rstrip("/")
+    if api_base and api_base != OPENAI_API_BASE:
+        client = _clients.get(api_base)
+        if client is None or client.is_closed:
+            client = _clients[api_base] = _new_client(api_base)
+        return client
+    if _client is None or _client.is_closed:
+        _client = _new_client(OPENAI_API_BASE)
+    return _client
+
+
+def _get_global_sem() -> asyncio.Semaphore:
+    global _global_sem
+    if _global_sem is None:
+        _global_sem = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+    return _global_sem
+
+
+def _get_room_sem(room: Optional[str]) -> Optional[asyncio.Semaphore]:
+    if not room:
+        return None
+    sem = _room_sems.get(room)
+    if sem is None:
+        sem = asyncio.Semaphore(LLM_ROOM_CONCURRENCY)
+        _room_sems[room] = sem
+    return sem
+
+
+def forget_room(room: str) -> None:
+    """Drop the per-room limiter once a room is gone."""
+    _room_sems.pop(room, None)
+
+
+def _headers(api_key: Optional[str] = None) -> Dict[str, str]:
+    return {"Authorization": f"Bearer {api_key or os.getenv('OPENAI_API_KEY', '')}"}
+
+
+async def _post_chat(
+    payload: Dict[str, Any], api_base: Optional[str] = None, api_key: Optional[str] = None
+) -> Dict[str, Any]:
+    try:
+        res = await _get_client(api_base).post("/chat/completions", json=payload, headers=_headers(api_key))
+    except httpx.TimeoutException as e:
+        raise LLMError(f"completion timed out: {e}") from e
+    except httpx.HTTPError as e:
+        raise LLMError(f"completion request failed: {e}") from e
+    if res.status_code >= 400:
+        raise LLMError(f"completion failed ({res.status_code}): {res.text[:200]}")
+    try:
+        return res.json()["choices"][0]["message"]
+    except Exception as e:
+        raise LLMError(f"unexpected completion payload: {e}") from e
+
+
+async def chat_completion(
+    messages: List[Dict[str, Any]],
+    model: str = "gpt-3.5-turbo",
+    temperature: Optional[float] = None,
+    room: Optional[str] = None,
+    timeout: Optional[float] = None,
+    api_base: Optional[str] = None,
+    api_key: Optional[str] = None,
+    **params: Any,
+) -> Dict[str, Any]:
+    """Run one chat completion and return the assistant message as a dict.
+
+    `room` scopes the per-room concurrency limit; `timeout` bounds the whole call,
+    including time spent waiting for a free slot. `api_base` / `api_key` target an
+    OpenAI-compatible endpoint other than OPENAI_API_BASE.
+    """
+    payload: Dict[str, Any] = {"model": model, "messages": messages}
+    if temperature is not None:
+        payload["temperature"] = temperature
+    payload.update({k: v for k, v in params.items() if v is not None})
+
+    async def _run() -> Dict[str, Any]:
+        room_sem = _get_room_sem(room)
+        if room_sem is None:
+            async with _get_global_sem():
+                return await _post_chat(payload, api_base, api_key)
+        async with room_sem:
+            async with _get_global_sem():
+                return await _post_chat(payload, api_base, api_key)
+
+    try:
+        return await asyncio.wait_for(_run(), timeout=timeout or LLM_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError as e:
+        raise LLMError("completion timed out") from e
+
+
+async def stream_chat_completion(
+    messages: List[Dict[str, Any]],
+    model: str = "gpt-3.5-turbo",
+    temperature: Optional[float] = None,
+    room: Optional[str] = None,
+    timeout: Optional[float] = None,
+    api_base: Optional[str] = None,
+    api_key: Optional[str] = None,
+    **params: Any,
+) -> AsyncIterator[str]:
+    """Stream one chat completion, yielding content deltas as they arrive.
+
+    Concurrency slots are held until the stream is exhausted or closed; `timeout`
+    bounds the whole stream, including time spent waiting for a free slot.
+    """
+    payload: Dict[str, Any] = {"model": model, "messages": messages, "stream": True}
+    if temperature is not None:
+        payload["temperature"] = temperature
+    payload.update({k: v for k, v in params.items() if v is not None})
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + (timeout or LLM_TIMEOUT_SECONDS)
+    held: List[asyncio.Semaphore] = []
+    try:
+        for sem in (_get_room_sem(room), _get_global_sem()):
+            if sem is None:
+                continue
+            try:
+                await asyncio.wait_for(sem.acquire(), timeout=max(0.0, deadline - loop.time()))
+            except asyncio.TimeoutError as e:
+                raise LLMError("completion timed out") from e
+            held.append(sem)
+        async with _get_client(api_base).stream(
+            "POST", "/chat/completions", json=payload, headers=_headers(api_key)
+        ) as res:
+            if res.status_code >= 400:
+                body = (await res.aread()).decode(errors="replace")
+                raise LLMError(f"completion failed ({res.status_code}): {body[:200]}")
+            async for line in res.aiter_lines():
+                if loop.time() > deadline:
+                    raise LLMError("completion timed out")
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                try:
+                    delta = json.loads(data)["choices"][0].get("delta", {}).get("content")
+                except Exception as e:
+                    raise LLMError(f"unexpected stream payload: {e}") from e
+                if delta:
+                    yield delta
+    except httpx.TimeoutException as e:
+        raise LLMError(f"completion timed out: {e}") from e
+    except httpx.HTTPError as e:
+        raise LLMError(f"completion request failed: {e}") from e
+    finally:
+        for sem in held:
+            sem.release()
+
+
+async def aclose() -> None:
+    """Close the pooled HTTP client (call on app shutdown)."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+    for client in _clients.values():
+        await client.aclose()
+    _clients.clear()
@@ -0,0 +1,465 @@
+"""
+Per-task model routing on top of logic.llm.
+
+Each task has a route: a primary target (model + OpenAI-compatible endpoint),
+an optional secondary target, and a timeout for every attempt. Every target
+has a circuit breaker: after LLM_BREAKER_FAILURES consecutive failures it
+opens and calls skip straight to the secondary for LLM_BREAKER_COOLDOWN_SECONDS,
+then one probe is let through to see whether it recovered. When no target is
+usable the route's deflection is returned instead (for character answers, a
+canned in-character stall), so an upstream slowdown costs at most the route
+timeouts rather than hanging every room.
+
+Tasks: "answer" (character replies), "clues" (clue extraction), "summary"
+(memory compaction) and "agent" (SimpleAgent tool calls). Configure with
+
+    LLM_ROUTE_<TASK>_MODEL / _BASE / _API_KEY / _TIMEOUT / _HEDGE
+    LLM_ROUTE_<TASK>_FALLBACK_MODEL / _FALLBACK_BASE / _FALLBACK_API_KEY
+
+A base of "fake" (or LLM_PROVIDER=fake for every route) uses the local fake
+provider, which answers instantly (plus LLM_FAKE_LATENCY_MS) without network.
+"""
+import asyncio
+import json
+import os
+import random
+import re
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Callable, Deque, Dict, Iterator, List, Optional, Tuple
+
+from eventlog import get_logger
+from logic import llm
+from logic.llm import LLMError
+
+log = get_logger("llm_router")
+
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "openai")
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_COOLDOWN_SECONDS = float(os.getenv("LLM_BREAKER_COOLDOWN_SECONDS", "30"))
+LLM_FAKE_LATENCY_MS = float(os.getenv("LLM_FAKE_LATENCY_MS", "0"))
+# Hedging: once a request has run longer than the LLM_HEDGE_PERCENTILE of recent
+# latencies, a duplicate is sent and whichever answers first wins.
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+LLM_HEDGE_MIN_DELAY_SECONDS = float(os.getenv("LLM_HEDGE_MIN_DELAY_SECONDS", "0.5"))
+# used until LLM_HEDGE_MIN_SAMPLES latencies have been seen; 0 disables hedging until then
+LLM_HEDGE_INITIAL_DELAY_SECONDS = float(os.getenv("LLM_HEDGE_INITIAL_DELAY_SECONDS", "0"))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+LLM_HEDGE_WINDOW = int(os.getenv("LLM_HEDGE_WINDOW", "200"))
+
+FAKE_BASE = "fake"
+
+DEFLECTIONS = [
+    "I'm sorry, detective, give me a moment. I need to collect my thoughts.",
+    "That's... a difficult question. Could you ask me again in a little while?",
+    "I don't want to say something I'm not sure of. Let me think about that.",
+]
+
+
+class CircuitBreaker:
+    def __init__(self, failures: int = LLM_BREAKER_FAILURES, cooldown: float = LLM_BREAKER_COOLDOWN_SECONDS):
+        self.max_failures = failures
+        self.cooldown = cooldown
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+
+    def allow(self) -> bool:
+        """Whether a call would be let through now; does not claim anything."""
+        if self.state == "closed":
+            return True
+        if self.state == "open" and time.monotonic() - self.opened_at < self.cooldown:
+            return False
+        return not self._probing
+
+    def acquire(self) -> bool:
+        """Claim a call. Once the cooldown is over only one probe at a time gets
+        through; every successful acquire() must be paired with release()."""
+        if not self.allow():
+            return False
+        if self.state != "closed":
+            self.state = "half_open"
+            self._probing = True
+        return True
+
+    def release(self, probe: bool) -> None:
+        """End a call claimed with acquire(); frees the probe slot if the probe was
+        cancelled or abandoned before recording a result."""
+        if probe:
+            self._probing = False
+
+    def record_success(self) -> None:
+        self.state = "closed"
+        self.failures = 0
+        self._probing = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._probing = False
+        if self.state == "half_open" or self.failures >= self.max_failures:
+            if self.state != "open":
+                log.warning("llm_breaker_open", failures=self.failures)
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+
+class Target:
+    """One model on one endpoint."""
+
+    def __init__(self, model: str, api_base: Optional[str] = None, api_key: Optional[str] = None):
+        self.model = model
+        self.api_base = api_base or None
+        self.api_key = api_key or None
+        self.breaker = CircuitBreaker()
+        self.calls = 0
+        self.failures = 0
+
+    @property
+    def fake(self) -> bool:
+        return self.api_base == FAKE_BASE
+
+    @property
+    def label(self) -> str:
+        return f"{self.model}@{self.api_base or 'default'}"
+
+    async def complete(self, task: str, messages, room, timeout, **params) -> Dict[str, Any]:
+        if self.fake:
+            await asyncio.sleep(LLM_FAKE_LATENCY_MS / 1000)
+            return {"role": "assistant", "content": fake_reply(task, messages)}
+        return await llm.chat_completion(
+            messages, model=self.model, room=room, timeout=timeout,
+            api_base=self.api_base, api_key=self.api_key, **params,
+        )
+
+    async def stream(self, task: str, messages, room, timeout, **params) -> AsyncIterator[str]:
+        if self.fake:
+            await asyncio.sleep(LLM_FAKE_LATENCY_MS / 1000)
+            for piece in re.findall(r"\S+\s*", fake_reply(task, messages)):
+                yield piece
+            return
+        async for delta in llm.stream_chat_completion(
+            messages, model=self.model, room=room, timeout=timeout,
+            api_base=self.api_base, api_key=self.api_key, **params,
+        ):
+            yield delta
+
+
+def fake_reply(task: str, messages: List[Dict[str, Any]]) -> str:
+    """Deterministic stand-in output for the local fake provider."""
+    prompt = str(messages[-1].get("content") or "") if messages else ""
+    if task == "clues":
+        reply = prompt.rsplit("Reply:", 1)[-1].strip()
+        first = re.split(r"(?<=[.!?])\s", reply, maxsplit=1)[0]
+        return json.dumps([{"text": first, "type": "background"}] if first else [])
+    if task == "summary":
+        return "The detective has been asking the suspects where they were."
+    match = re.search(r"reply ONLY as (.+?) to this question", prompt)
+    name = match.group(1) if match else "I"
+    answer = "I was at home all evening, detective. I didn't see anything unusual."
+    if '{"answer":' in prompt:
+        return json.dumps({"answer": answer, "clues": [{"text": "Was at home all evening", "type": "background"}]})
+    return f"{name}: {answer}"
+
+
+class LatencyWindow:
+    """Recent latencies of one kind, for percentile-based hedge thresholds."""
+
+    def __init__(self, size: int = LLM_HEDGE_WINDOW):
+        self.samples: Deque[float] = deque(maxlen=size)
+
+    def observe(self, seconds: float) -> None:
+        self.samples.append(seconds)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        if len(self.samples) < LLM_HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))]
+
+
+async def _first_delta(stream: AsyncIterator[str]) -> Optional[str]:
+    try:
+        return await stream.__anext__()
+    except StopAsyncIteration:
+        return None
+
+
+class Route:
+    def __init__(
+        self,
+        task: str,
+        primary: Target,
+        fallback: Optional[Target] = None,
+        timeout: Optional[float] = None,
+        deflect: Optional[Callable[[], str]] = None,
+        hedge: bool = False,
+    ):
+        self.task = task
+        self.primary = primary
+        self.fallback = fallback
+        self.timeout = timeout
+        self.deflect = deflect
+        self.hedge = hedge
+        self.calls = 0
+        self.fallbacks = 0
+        self.deflections = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        # whole completions, and time to first token for streams
+        self.latency = {"complete": LatencyWindow(), "first_token": LatencyWindow()}
+
+    def targets(self) -> List[Target]:
+        return [t for t in (self.primary, self.fallback) if t is not None]
+
+    def _attempts(self) -> Iterator[Tuple[Target, bool]]:
+        """(target, is_probe) in order, each claimed only once the previous one failed.
+
+        The caller must release each claimed target's breaker when done with it.
+        """
+        for target in self.targets():
+            probe = target.breaker.state != "closed"
+            if not target.breaker.acquire():
+                continue
+            if target is not self.primary:
+                self.fallbacks += 1
+            yield target, probe
+
+    def _attempt_timeout(self, deadline: Optional[float]) -> Optional[float]:
+        if deadline is None:
+            return self.timeout
+        remaining = deadline - time.monotonic()
+        return remaining if self.timeout is None else min(self.timeout, remaining)
+
+    def hedge_delay(self, kind: str) -> Optional[float]:
+        """Seconds to wait on the first request before duplicating it, or None for no hedge."""
+        if not self.hedge:
+            return None
+        threshold = self.latency[kind].percentile(LLM_HEDGE_PERCENTILE)
+        if threshold is None:
+            return LLM_HEDGE_INITIAL_DELAY_SECONDS or None
+        return max(threshold, LLM_HEDGE_MIN_DELAY_SECONDS)
+
+    async def _race(self, first: asyncio.Task, hedge: asyncio.Task) -> asyncio.Task:
+        """The first of the two to succeed; the other is cancelled."""
+        pending = {first, hedge}
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self.hedge_wins += 1
+                        return task
+                    error = error or task.exception()
+            raise error  # type: ignore[misc]
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _complete_hedged(self, target: Target, messages, room, timeout, **params) -> Dict[str, Any]:
+        delay = self.hedge_delay("complete")
+        if delay is None or (timeout is not None and delay >= timeout):
+            return await target.complete(self.task, messages, room, timeout, **params)
+        first = asyncio.create_task(target.complete(self.task, messages, room, timeout, **params))
+        try:
+            done, _ = await asyncio.wait({first}, timeout=delay)
+        except BaseException:
+            # cancelled while waiting (outer timeout, discarded draft): don't orphan the request
+            first.cancel()
+            await asyncio.gather(first, return_exceptions=True)
+            raise
+        if done:
+            return first.result()
+        self.hedges += 1
+        hedge_timeout = None if timeout is None else timeout - delay
+        hedge = asyncio.create_task(target.complete(self.task, messages, room, hedge_timeout, **params))
+        return (await self._race(first, hedge)).result()
+
+    async def _open_stream_hedged(self, target: Target, messages, room, timeout, **params):
+        """Start streaming; returns (stream, first delta) from whichever request produced a token first."""
+        delay = self.hedge_delay("first_token")
+        first_stream = target.stream(self.task, messages, room, timeout, **params)
+        if delay is None or (timeout is not None and delay >= timeout):
+            return first_stream, await _first_delta(first_stream)
+        first = asyncio.create_task(_first_delta(first_stream))
+        try:
+            done, _ = await asyncio.wait({first}, timeout=delay)
+        except BaseException:
+            first.cancel()
+            await asyncio.gather(first, return_exceptions=True)
+            await first_stream.aclose()
+            raise
+        if done:
+            return first_stream, first.result()
+        self.hedges += 1
+        hedge_stream = target.stream(self.task, messages, room, None if timeout is None else timeout - delay, **params)
+        hedge = asyncio.create_task(_first_delta(hedge_stream))
+        winner = None
+        try:
+            winner = await self._race(first, hedge)
+        finally:
+            for task, stream in ((first, first_stream), (hedge, hedge_stream)):
+                if task is not winner:
+                    task.cancel()
+                    await asyncio.gather(task, return_exceptions=True)
+                    await stream.aclose()
+        return (first_stream if winner is first else hedge_stream), winner.result()
+
+    def _failed(self, target: Target, error: LLMError) -> None:
+        target.failures += 1
+        target.breaker.record_failure()
+        log.warning("llm_route_failed", task=self.task, target=target.label, error=str(error))
+
+    async def complete(self, messages, room=None, deadline: Optional[float] = None, **params) -> Dict[str, Any]:
+        """One completion; `deadline` (time.monotonic()) bounds every attempt, hedges and fallback included."""
+        last_error: Optional[Exception] = None
+        for target, probe in self._attempts():
+            try:
+                timeout = self._attempt_timeout(deadline)
+                if timeout is not None and timeout <= 0:
+                    last_error = LLMError(f"{self.task} deadline exhausted")
+                    break
+                self.calls += 1
+                target.calls += 1
+                started = time.monotonic()
+                try:
+                    message = await asyncio.wait_for(
+                        self._complete_hedged(target, messages, room, timeout, **params), timeout
+                    )
+                except asyncio.TimeoutError:
+                    e = LLMError(f"{self.task} timed out after {timeout:.1f}s")
+                    self._failed(target, e)
+                    last_error = e
+                    continue
+                except LLMError as e:
+                    self._failed(target, e)
+                    last_error = e
+                    continue
+                target.breaker.record_success()
+                self.latency["complete"].observe(time.monotonic() - started)
+                return message
+            finally:
+                # covers cancellation too, which records neither success nor failure
+                target.breaker.release(probe)
+        return {"role": "assistant", "content": self._deflect(last_error)}
+
+    async def stream(self, messages, room=None, deadline: Optional[float] = None, **params) -> AsyncIterator[str]:
+        """Stream from the first usable target; fails over only if nothing was yielded yet."""
+        last_error: Optional[Exception] = None
+        for target, probe in self._attempts():
+            try:
+                timeout = self._attempt_timeout(deadline)
+                if timeout is not None and timeout <= 0:
+                    last_error = LLMError(f"{self.task} deadline exhausted")
+                    break
+                self.calls += 1
+                target.calls += 1
+                started = False
+                opened = time.monotonic()
+                try:
+                    try:
+                        deltas, first = await asyncio.wait_for(
+                            self._open_stream_hedged(target, messages, room, timeout, **params), timeout
+                        )
+                    except asyncio.TimeoutError:
+                        raise LLMError(f"{self.task} timed out after {timeout:.1f}s") from None
+                    if first is not None:
+                        self.latency["first_token"].observe(time.monotonic() - opened)
+                        started = True
+                        yield first
+                        async for delta in deltas:
+                            yield delta
+                except LLMError as e:
+                    self._failed(target, e)
+                    last_error = e
+                    if started:
+                        raise
+                    continue
+                target.breaker.record_success()
+                return
+            finally:
+                # covers cancellation and GeneratorExit from an abandoned stream
+                target.breaker.release(probe)
+        yield self._deflect(last_error)
+
+    def _deflect(self, error: Optional[Exception]) -> str:
+        if self.deflect is None:
+            raise error or LLMError(f"no usable model for {self.task}")
+        self.deflections += 1
+        log.warning("llm_route_deflected", task=self.task)
+        return self.deflect()
+
+    def stats(self) -> Dict[str, Any]:
+        threshold = self.hedge_delay("first_token")
+        return {
+            "timeout": self.timeout,
+            "calls": self.calls,
+            "fallbacks": self.fallbacks,
+            "deflections": self.deflections,
+            "hedging": self.hedge,
+            "hedge_after_seconds": round(threshold, 3) if threshold else None,
+            "hedges": self.hedges,
+            "hedge_rate": round(self.hedges / self.calls, 4) if self.calls else 0.0,
+            "hedge_wins": self.hedge_wins,
+            "hedge_win_rate": round(self.hedge_wins / self.hedges, 4) if self.hedges else 0.0,
+            "targets": [
+                {
+                    "target": t.label,
+                    "breaker": t.breaker.state,
+                    "calls": t.calls,
+                    "failures": t.failures,
+                }
+                for t in self.targets()
+            ],
+        }
+
+
+def _target_from_env(prefix: str, default_model: Optional[str]) -> Optional[Target]:
+    model = os.getenv(f"{prefix}MODEL", default_model or "")
+    if not model:
+        return None
+    base = os.getenv(f"{prefix}BASE") or (FAKE_BASE if LLM_PROVIDER == "fake" else None)
+    return Target(model, base, os.getenv(f"{prefix}API_KEY"))
+
+
+def route_from_env(
+    task: str, model: str, timeout: float, deflect: Optional[Callable[[], str]] = None, hedge: bool = False
+) -> Route:
+    prefix = f"LLM_ROUTE_{task.upper()}_"
+    return Route(
+        task,
+        primary=_target_from_env(prefix, model),
+        fallback=_target_from_env(f"{prefix}FALLBACK_", None),
+        timeout=float(os.getenv(f"{prefix}TIMEOUT", str(timeout))),
+        deflect=deflect,
+        hedge=os.getenv(f"{prefix}HEDGE", "1" if hedge else "0") == "1",
+    )
+
+
+ROUTES: Dict[str, Route] = {
+    "answer": route_from_env(
+        "answer", "gpt-3.5-turbo", 20, deflect=lambda: random.choice(DEFLECTIONS), hedge=True
+    ),
+    "clues": route_from_env("clues", "gpt-3.5-turbo", 20, deflect=lambda: "[]"),
+    "summary": route_from_env("summary", "gpt-3.5-turbo", 30),
+    "agent": route_from_env("agent", "gpt-4o", 30),
+}
+
+
+async def complete(task: str, messages, room=None, **params) -> Dict[str, Any]:
+    return await ROUTES[task].complete(messages, room=room, **params)
+
+
+def stream(task: str, messages, room=None, **params) -> AsyncIterator[str]:
+    return ROUTES[task].stream(messages, room=room, **params)
+
+
+def deflect(task: str, error: Optional[Exception] = None) -> str:
+    """The task's deflection (counted as one); raises `error` if the task has none."""
+    return ROUTES[task]._deflect(error)
+
+
+def stats() -> Dict[str, Any]:
+    return {task: route.stats() for task, route in ROUTES.items()}
@@ -1,25 +1,313 @@
+import bisect
+import difflib
+import os
+import re
 from datetime import datetime
 
-class Memory:
+from eventlog import get_logger
+
+log = get_logger("memory")
+
+# Prompt context is a rolling summary plus the most recent turns. Once the
+# recent window grows past either limit, the oldest turns are folded into the
+# summary (down to half the window, so this happens every few turns, not every turn).
+MEMORY_TOKEN_BUDGET = int(os.getenv("MEMORY_TOKEN_BUDGET", "1500"))
+MEMORY_WINDOW_TURNS = int(os.getenv("MEMORY_WINDOW_TURNS", "16"))
+MEMORY_SUMMARY_MAX_CHARS = int(os.getenv("MEMORY_SUMMARY_MAX_CHARS", "1600"))
+
+# Clues repeating an earlier one (same normalised text, or similar enough and
+# not differing in numbers or negation) are merged into it instead of added.
+# Fuzzy matching only compares against clues sharing the new clue's rarest
+# words, at most CLUE_DEDUP_MAX_CANDIDATES of them, so inserts stay cheap as
+# the board grows.
+CLUE_DEDUP = os.getenv("CLUE_DEDUP", "1") == "1"
+CLUE_DEDUP_SIMILARITY = float(os.getenv("CLUE_DEDUP_SIMILARITY", "0.85"))
+CLUE_DEDUP_MAX_CANDIDATES = int(os.getenv("CLUE_DEDUP_MAX_CANDIDATES", "32"))
+# a merged clue keeps the most significant type it was given
+CLUE_TYPE_RANK = {"GOSSIP": 0, "BACKGROUND": 1, "FACT": 2, "IMPORTANT": 3}
+
+_WORD = re.compile(r"[a-z0-9']+")
+_STOPWORDS = frozenset(
+    "a an the and or of to in on at for with by from as is was were be been it its "
+    "he she they him her them his their i you we my me this that there".split()
+)
+_NEGATIONS = frozenset("not no never nothing nobody none neither nor".split())
+
+# per-item dict/list/index overhead used for approx_bytes
+ENTRY_OVERHEAD_BYTES = 400
+CLUE_OVERHEAD_BYTES = 600
+
+
+def estimate_tokens(text):
+    # ~4 characters per token for English; close enough for budgeting
+    return len(text) // 4 + 1
+
+
+def entry_tokens(entry):
+    return estimate_tokens(f"{entry['speaker']}: {entry['content']}")
+
+
+def format_entries(entries):
+    return "\n".join(f"{entry['speaker']}: {entry['content']}" for entry in entries)
+
+
+def normalize_clue(text):
+    return " ".join(_WORD.findall((text or "").lower().replace("\u2019", "'")))
+
+
+def _clue_guard(words):
+    """Numbers and negations in a clue; clues only merge if these agree."""
+    return frozenset(
+        w for w in words if any(c.isdigit() for c in w) or w in _NEGATIONS or w.endswith("n't")
+    )
+
+
+class _Window:
+    """Summary state for one context scope (the whole room, or one character's thread)."""
+
     def __init__(self):
+        self.summary = ""
+        # the first `summarized_upto` turns of the scope are folded into `summary`
+        self.summarized_upto = 0
+        self.tokens = 0
+        self.compacting = False
+
+
+class Memory:
+    def __init__(self, token_budget=MEMORY_TOKEN_BUDGET, window_turns=MEMORY_WINDOW_TURNS):
         self.entries = []
         self.clues = []
+        # bumped for every clue added; each clue carries the seq it was added at
+        self.clue_seq = 0
+        self.token_budget = token_budget
+        self.window_turns = window_turns
+        # entry positions per speaker, and per participant (speaker or addressee)
+        self._by_speaker = {}
+        self._by_party = {}
+        # scope None is the whole room; any other key is a character's thread
+        self._windows = {None: _Window()}
+        # rough resident size, so the room lifecycle can enforce a memory budget
+        self.approx_bytes = 0
+        # clue dedup index: normalised text -> clue, word -> positions in self.clues,
+        # and (normalised text, guard words) per position
+        self._clue_by_norm = {}
+        self._clue_keys = []
+        self._clue_postings = {}
+        self.clues_merged = 0
 
-    def add(self, speaker, content):
-        self.entries.append({"speaker": speaker, "content": content})
+    def add(self, speaker, content, to=None):
+        """Record a turn. `to` is who it was addressed to, so both sides land in that thread."""
+        entry = {"speaker": speaker, "content": content}
+        if to:
+            entry["to"] = to
+        pos = len(self.entries)
+        self.entries.append(entry)
+        self.approx_bytes += ENTRY_OVERHEAD_BYTES + len(speaker) + len(content)
+        self._by_speaker.setdefault(speaker, []).append(pos)
+        cost = entry_tokens(entry)
+        self._windows[None].tokens += cost
+        for party in {speaker, to} - {None}:
+            self._by_party.setdefault(party, []).append(pos)
+            self._windows.setdefault(party, _Window()).tokens += cost
 
     def get(self):
         return self.entries
 
+    def load_history(self, entries, clues):
+        """Bulk-load persisted turns and clues (oldest first), e.g. when rehydrating a room."""
+        for entry in entries:
+            self.add(entry["speaker"], entry["content"], to=entry.get("to"))
+        for clue in clues:
+            self.add_clue(
+                clue.get("text", ""),
+                clue_type=clue.get("type") or "FACT",
+                source=clue.get("source") or "Unknown",
+                timestamp=clue.get("timestamp"),
+            )
+
+    async def backfill_summary(self, pages, summarize):
+        """Fold turns older than anything in `entries` into the room summary.
+
+        `pages` is an async iterator of entry lists, oldest first. Compaction of the
+        room scope is held off until the backfill is done so the summary stays in order.
+        """
+        window = self._windows[None]
+        if window.compacting:
+            return
+        window.compacting = True
+        try:
+            async for page in pages:
+                if not page:
+                    continue
+                try:
+                    summary = (await summarize(window.summary, page)).strip()
+                except Exception as e:
+                    log.warning("memory_summary_failed", stage="backfill", error=str(e))
+                    summary = f"{window.summary}\n{format_entries(page)}".strip()
+                window.summary = summary[-MEMORY_SUMMARY_MAX_CHARS:]
+        finally:
+            window.compacting = False
+
+    def get_by_speaker(self, speaker):
+        return [self.entries[i] for i in self._by_speaker.get(speaker, ())]
+
+    def get_thread(self, name):
+        """Every turn `name` spoke or was addressed in, in order. O(k) in those turns."""
+        return [self.entries[i] for i in self._by_party.get(name, ())]
+
+    def _scope_len(self, scope):
+        if scope is None:
+            return len(self.entries)
+        return len(self._by_party.get(scope, ()))
+
+    def _scope_slice(self, scope, start, end=None):
+        if scope is None:
+            return self.entries[start:end]
+        return [self.entries[i] for i in self._by_party.get(scope, [])[start:end]]
+
+    def needs_compaction(self, scope=None):
+        window = self._windows.get(scope)
+        if window is None:
+            return False
+        turns = self._scope_len(scope) - window.summarized_upto
+        return turns > self.window_turns or window.tokens > self.token_budget
+
+    async def compact(self, summarize, scope=None):
+        """Fold the oldest recent turns of `scope` into its rolling summary if the window overflowed.
+
+        `summarize(previous_summary, entries)` is an async callable returning the new
+        summary text. Falls back to a truncated transcript if it fails.
+        """
+        window = self._windows.get(scope)
+        if window is None or window.compacting or not self.needs_compaction(scope):
+            return
+        window.compacting = True
+        try:
+            end = self._scope_len(scope)
+            keep_turns = max(1, self.window_turns // 2)
+            keep_tokens = self.token_budget // 2
+            cut = end
+            tokens = 0
+            recent = self._scope_slice(scope, window.summarized_upto, end)
+            while cut > window.summarized_upto and end - cut < keep_turns:
+                cost = entry_tokens(recent[cut - 1 - window.summarized_upto])
+                if tokens + cost > keep_tokens and end - cut > 0:
+                    break
+                tokens += cost
+                cut -= 1
+            folded = recent[:cut - window.summarized_upto]
+            if not folded:
+                return
+            try:
+                summary = (await summarize(window.summary, folded)).strip()
+            except Exception as e:
+                log.warning("memory_summary_failed", stage="compact", scope=scope, error=str(e))
+                summary = f"{window.summary}\n{format_entries(folded)}".strip()
+            window.summary = summary[-MEMORY_SUMMARY_MAX_CHARS:]
+            window.summarized_upto = cut
+            window.tokens = sum(entry_tokens(e) for e in self._scope_slice(scope, cut))
+        finally:
+            window.compacting = False
+
+    def context_text(self, scope=None):
+        """Prompt context for `scope`: rolling summary of older turns plus the recent window."""
+        window = self._windows.get(scope) or _Window()
+        recent = format_entries(self._scope_slice(scope, window.summarized_upto))
+        if not window.summary:
+            return recent
+        return f"Summary of earlier conversation:\n{window.summary}\n\nRecent conversation:\n{recent}"
+
+    def public_facts(self, limit=10):
+        """Most recent important clues on the board, shared by every character's prompt."""
+        facts = []
+        for clue in reversed(self.clues):
+            if clue.get("type") == "IMPORTANT":
+                facts.append(clue["text"])
+                if len(facts) >= limit:
+                    break
+        facts.reverse()
+        return facts
+
     def add_clue(self, text, clue_type="FACT", source="Unknown", timestamp=None):
+        """Add a clue, or merge it into an existing one that states the same fact.
+
+        Returns the clue dict. A merged clue keeps its seq (so it is not in the
+        next get_clues_since delta and gets no new DB row); its `sources` and
+        `count` grow, and its type is raised if this one is more significant.
+        """
+        norm = normalize_clue(text)
+        words = norm.split()
+        if CLUE_DEDUP and norm:
+            existing = self._clue_by_norm.get(norm) or self._similar_clue(norm, words)
+            if existing is not None:
+                self._merge_clue(existing, clue_type, source)
+                return existing
+
         if not timestamp:
             timestamp = datetime.now().isoformat()
-        self.clues.append({
+        self.clue_seq += 1
+        clue = {
             "text": text,
             "type": clue_type,
             "source": source,
-            "timestamp": timestamp
-        })
+            "sources": [source],
+            "count": 1,
+            "timestamp": timestamp,
+            "seq": self.clue_seq,
+        }
+        pos = len(self.clues)
+        self.clues.append(clue)
+        self.approx_bytes += CLUE_OVERHEAD_BYTES + len(text)
+        self._clue_keys.append((norm, _clue_guard(words)))
+        if CLUE_DEDUP and norm:
+            self._clue_by_norm[norm] = clue
+            for word in set(words) - _STOPWORDS:
+                self._clue_postings.setdefault(word, []).append(pos)
+        return clue
+
+    def _similar_clue(self, norm, words):
+        """Most similar indexed clue at or above CLUE_DEDUP_SIMILARITY, if any."""
+        keys = set(words) - _STOPWORDS
+        postings = sorted(
+            (self._clue_postings[w] for w in keys if w in self._clue_postings), key=len
+        )
+        candidates = []
+        seen = set()
+        for posting in postings[:3]:
+            # newest first: repeats are usually of recent clues
+            for pos in reversed(posting[-CLUE_DEDUP_MAX_CANDIDATES:]):
+                if pos not in seen:
+                    seen.add(pos)
+                    candidates.append(pos)
+            if len(candidates) >= CLUE_DEDUP_MAX_CANDIDATES:
+                break
+        guard = _clue_guard(words)
+        best, best_ratio = None, CLUE_DEDUP_SIMILARITY
+        for pos in candidates[:CLUE_DEDUP_MAX_CANDIDATES]:
+            other, other_guard = self._clue_keys[pos]
+            if other_guard != guard:
+                continue
+            matcher = difflib.SequenceMatcher(None, norm, other)
+            if matcher.real_quick_ratio() < best_ratio or matcher.quick_ratio() < best_ratio:
+                continue
+            ratio = matcher.ratio()
+            if ratio >= best_ratio:
+                best, best_ratio = self.clues[pos], ratio
+        return best
+
+    def _merge_clue(self, clue, clue_type, source):
+        clue["count"] = clue.get("count", 1) + 1
+        sources = clue.setdefault("sources", [clue.get("source")])
+        if source not in sources:
+            sources.append(source)
+        if CLUE_TYPE_RANK.get(clue_type, 0) > CLUE_TYPE_RANK.get(clue.get("type"), 0):
+            clue["type"] = clue_type
+        self.clues_merged += 1
 
     def get_clues(self):
         return self.clues
+
+    def get_clues_since(self, seq):
+        """Clues added after sequence number `seq` (0 returns everything)."""
+        start = bisect.bisect_right(self.clues, seq or 0, key=lambda clue: clue["seq"])
+        return self.clues[start:]
@@ -1,32 +1,42 @@
-import openai
-import json
+import asyncio
+import os
 import re
+import time
 
-async def ask_character(agent, question: str, memory):
-    # === Build prompt with system prompt and memory ===
-    system_prompt = agent.system_prompt
-    memory_text = "\n".join(
-        f"{entry['speaker']}: {entry['content']}" for entry in memory.get()
-    )
-    prompt = f"{system_prompt}\n\nPrevious conversation:\n{memory_text}\n\nNow reply ONLY as {agent.name} to this question: \"{question}\"\n\nDo not include any detective dialogue or questions in your response."
+from logic.answer_cache import ANSWER_CACHE_ENABLED, answer_cache
+from logic import llm_router
+from logic.llm import LLMError
+from logic.memory import format_entries
+from logic.structured_output import (
+    STRUCTURED_INSTRUCTIONS,
+    AnswerFieldStreamer,
+    extract_json,
+    parse_structured_answer,
+    validate_clues,
+)
+from eventlog import get_logger
+from metrics import LLM_LATENCY
 
-    # === Get character's response ===
-    response = openai.ChatCompletion.create(
-        model="gpt-3.5-turbo",
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0.7,
-    )
-    answer = response.choices[0].message.content.strip()
+log = get_logger("qa")
 
-    # === Save to memory ===
-    memory.add("Detective", question)
+# "room": prompts see the whole room's conversation; "character": only the
+# addressed character's own thread plus the public clue board
+PROMPT_SCOPE = os.getenv("PROMPT_SCOPE", "room")
+# total time an answer may take, hedged requests and fallback model included;
+# past it the character deflects
+ASK_DEADLINE_SECONDS = float(os.getenv("ASK_DEADLINE_SECONDS", "25"))
+# one completion returns the reply and its clues as JSON, instead of a second
+# clue-extraction call per answer
+STRUCTURED_ANSWERS = os.getenv("STRUCTURED_ANSWERS", "0") == "1"
+# also send response_format=json_object (for models with JSON mode)
+STRUCTURED_JSON_MODE = os.getenv("STRUCTURED_JSON_MODE", "1") == "1"
+
+# keeps fire-and-forget tasks referenced until they finish
+_background = set()
 
-    pattern = rf"^{agent.name}:\s*"
-    answer = re.sub(pattern, "", answer, flags=re.IGNORECASE)
-    memory.add(agent.name, answer)
 
-    # === Ask GPT to extract structured clues ===
-    clue_prompt = f"""Extract all potential clues from the following reply. 
+def _clue_prompt(reply: str) -> str:
+    return f"""Extract all potential clues from the following reply.
 Label each clue as either "important", "background", or "gossip" depending on how relevant and actionable it is to a murder investigation.
 Reply in JSON format as a list of objects like this:
 [
@@ -35,61 +45,285 @@ Reply in JSON format as a list of objects like this:
   {{"text": "She thinks the victim was grumpy", "type": "gossip"}}
 ]
 
-Reply: {answer}
+Reply: {reply}
 """
 
-    try:
-        clue_response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=[{"role": "user", "content": clue_prompt}],
-            temperature=0.4,
+
+async def summarize_turns(previous_summary: str, entries, room=None) -> str:
+    """Fold `entries` into the running conversation summary used by Memory.compact."""
+    prompt = f"""You keep the case notes for a murder investigation interrogation.
+Update the summary below with the new conversation turns. Keep every alibi, time, name,
+contradiction and admission; drop small talk. Write at most 150 words of plain prose.
+
+Current summary:
+{previous_summary or "(none yet)"}
+
+New turns:
+{format_entries(entries)}
+"""
+    with LLM_LATENCY.time(call="summary"):
+        message = await llm_router.complete(
+            "summary",
+            [{"role": "user", "content": prompt}],
+            temperature=0.2,
+            room=room,
         )
+    return (message.get("content") or "").strip()
 
-        parsed = json.loads(clue_response.choices[0].message.content.strip())
 
-        for clue in parsed:
-            text = clue.get("text", "").strip()
-            clue_type = clue.get("type", "fact").upper()
-            if text:
-                memory.add_clue(text, clue_type=clue_type, source=agent.name)
+class _NamePrefixStripper:
+    """Holds back the first streamed characters until we know whether the model
+    opened with "<Name>:", which the final answer strips as well."""
 
-    except Exception as e:
-        print("Failed to extract or parse clues:", e)
+    def __init__(self, name: str):
+        self.prefix = f"{name}:".lower()
+        self.pending = ""
+        self.done = False
 
-    return answer
+    def feed(self, delta: str) -> str:
+        if self.done:
+            return delta
+        self.pending += delta
+        head = self.pending.lstrip()
+        if not head or self.prefix.startswith(head.lower()):
+            return ""
+        if head.lower().startswith(self.prefix):
+            head = head[len(self.prefix):].lstrip()
+            if not head:
+                return ""
+        self.done = True
+        self.pending = ""
+        return head
+
+
+def build_prompt(agent, question: str, memory, context_scope=None):
+    """Return (prompt, memory_text) for asking `agent`; `context_scope` None means the whole room."""
+    memory_text = memory.context_text(context_scope)
+    if context_scope:
+        facts = memory.public_facts()
+        if facts:
+            facts_text = "\n".join(f"- {fact}" for fact in facts)
+            memory_text = f"Facts already known to everyone in the investigation:\n{facts_text}\n\n{memory_text}"
+    prompt = f"{agent.system_prompt}\n\nPrevious conversation:\n{memory_text}\n\nNow reply ONLY as {agent.name} to this question: \"{question}\"\n\nDo not include any detective dialogue or questions in your response."
+    return prompt, memory_text
 
 
-async def extract_clues_from_reply(agent_name: str, reply: str, memory):
+async def ask_character(
+    agent, question: str, memory, room=None, on_token=None, extract_clues=True, scope=None, use_cache=None,
+    deadline=None, structured=None,
+):
+    """Answer `question` in character and record the exchange in `memory`.
+
+    If `on_token` is given the completion is streamed and `await on_token(chunk)`
+    is called for each piece of the answer as it arrives; the returned answer and
+    the memory entries are the same either way. A stream that breaks after the
+    first chunk is finished with a deflection rather than raising.
+    With `extract_clues=False` the caller is responsible for running
+    extract_clues_from_reply on the answer (e.g. in the background pipeline);
+    use ask_character_with_clues to keep the clues of a structured answer.
+    `scope` ("room" or "character", default PROMPT_SCOPE) picks which part of
+    the transcript the prompt is built from.
+    `use_cache` (default ANSWER_CACHE_ENABLED) serves repeated questions with the
+    same context from the answer cache, unless the character has vary_answers set.
+    `deadline` (a time.monotonic() value, default ASK_DEADLINE_SECONDS from now)
+    bounds the whole answer call.
+    `structured` (default STRUCTURED_ANSWERS) asks for the reply and its clues in
+    one JSON completion, so no second clue-extraction call is needed.
     """
-    Parse a character's reply to extract structured clues and add them to memory.
-    Mirrors the extraction logic used in ask_character.
+    answer, clues = await ask_character_with_clues(
+        agent, question, memory, room=room, on_token=on_token, scope=scope, use_cache=use_cache,
+        deadline=deadline, structured=structured,
+    )
+    if extract_clues:
+        await extract_clues_from_reply(agent.name, answer, memory, room=room, clues=clues)
+    return answer
+
+
+async def ask_character_with_clues(
+    agent, question: str, memory, room=None, on_token=None, scope=None, use_cache=None,
+    deadline=None, structured=None,
+):
+    """Like ask_character without clue extraction; returns (answer, clues).
+
+    `clues` are the ones a structured answer came with, or None when they still
+    have to be extracted. Pass them on as extract_clues_from_reply(..., clues=clues).
     """
-    import json
-    import openai
+    if deadline is None:
+        deadline = time.monotonic() + ASK_DEADLINE_SECONDS
+    # === Build prompt with system prompt and memory ===
+    context_scope = agent.name if (scope or PROMPT_SCOPE) == "character" else None
+    prompt, memory_text = build_prompt(agent, question, memory, context_scope)
 
-    clue_prompt = f"""Extract all potential clues from the following reply. 
-Label each clue as either "important", "background", or "gossip" depending on how relevant and actionable it is to a murder investigation.
-Reply in JSON format as a list of objects like this:
-[
-  {{"text": "She heard a loud thud around 9am", "type": "important"}},
-  {{"text": "She was watering plants", "type": "background"}},
-  {{"text": "She thinks the victim was grumpy", "type": "gossip"}}
-]
+    # === Get character's response ===
+    cache_key = None
+    if (ANSWER_CACHE_ENABLED if use_cache is None else use_cache) and not getattr(agent, "vary_answers", False):
+        cache_key = answer_cache.make_key(agent.name, question, memory_text)
+    cached = answer_cache.get(cache_key) if cache_key else None
+    messages = [{"role": "user", "content": prompt}]
+    clues = None
+    if cached is not None:
+        answer = cached
+        if on_token is not None:
+            await on_token(answer)
+    elif STRUCTURED_ANSWERS if structured is None else structured:
+        answer, clues = await _structured_answer(agent, prompt, room, deadline, on_token)
+    elif on_token is None:
+        with LLM_LATENCY.time(call="answer"):
+            message = await llm_router.complete(
+                "answer", messages, temperature=0.7, room=room, deadline=deadline
+            )
+        answer = (message.get("content") or "").strip()
+    else:
+        with LLM_LATENCY.time(call="answer"):
+            raw, sent = await _stream_answer(agent, messages, room, deadline, on_token)
+        answer = raw if sent is None else sent
 
-Reply: {reply}
-"""
+    answer = record_answer(agent, question, answer, memory, room=room, scope=scope)
+    # also skips answers whose stream broke and was finished with a deflection
+    if cache_key and cached is None and answer and not answer.endswith(tuple(llm_router.DEFLECTIONS)):
+        answer_cache.put(cache_key, answer)
+
+    return answer, clues
+
+
+async def _structured_answer(agent, prompt: str, room, deadline, on_token):
+    """(answer, clues) from one JSON completion; clues is None if they could not be parsed."""
+    messages = [{"role": "user", "content": f"{prompt}\n\n{STRUCTURED_INSTRUCTIONS}"}]
+    params = {"response_format": {"type": "json_object"}} if STRUCTURED_JSON_MODE else {}
+    streamer = AnswerFieldStreamer()
+    with LLM_LATENCY.time(call="answer_structured"):
+        if on_token is None:
+            message = await llm_router.complete(
+                "answer", messages, temperature=0.7, room=room, deadline=deadline, **params
+            )
+            raw = (message.get("content") or "").strip()
+        else:
+            raw, sent = await _stream_answer(
+                agent, messages, room, deadline, on_token, feed=streamer.feed, **params
+            )
+            if sent is not None:
+                # the stream broke: keep what the detective already saw, clues
+                # come from the separate extraction call
+                return sent, None
+
+    parsed = parse_structured_answer(raw)
+    if parsed is not None:
+        return parsed
+    if raw in llm_router.DEFLECTIONS:
+        answer, clues = raw, []
+    else:
+        # salvage the reply from broken JSON, or take plain prose as the reply;
+        # clues then come from the separate extraction call
+        log.warning("structured_answer_unparsed", character=agent.name, length=len(raw))
+        salvaged = AnswerFieldStreamer().feed(raw).strip()
+        answer, clues = salvaged or raw, None
+    if on_token is not None and not streamer.started:
+        await on_token(answer)
+    return answer, clues
+
+
+async def _stream_answer(agent, messages, room, deadline, on_token, feed=None, **params):
+    """Stream the answer route to `on_token`; returns (raw completion, None).
 
+    `feed` maps each delta to the text shown to the detective. If the stream
+    breaks after it started, the answer is finished with a deflection instead
+    of raising, so the caller still records and sends one final answer; the
+    result is then (None, the text that was sent).
+    """
+    parts = []
+    sent = []
+    stripper = _NamePrefixStripper(agent.name)
     try:
-        clue_response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=[{"role": "user", "content": clue_prompt}],
+        async for delta in llm_router.stream(
+            "answer", messages, temperature=0.7, room=room, deadline=deadline, **params
+        ):
+            parts.append(delta)
+            chunk = stripper.feed(feed(delta) if feed else delta)
+            if chunk:
+                sent.append(chunk)
+                await on_token(chunk)
+    except LLMError as e:
+        log.warning("answer_stream_broken", character=agent.name, error=str(e))
+        tail = llm_router.deflect("answer", e)
+        if sent and not sent[-1][-1:].isspace():
+            tail = f" {tail}"
+        await on_token(tail)
+        return None, ("".join(sent) + tail).strip()
+    return "".join(parts).strip(), None
+
+
+async def draft_answer(agent, question: str, memory, room=None, scope=None, deadline=None) -> str:
+    """Generate `agent`'s answer without recording anything in `memory`.
+
+    Used to prepare the AI fallback while a human plays the character; if the
+    draft ends up being used, pass it to record_answer.
+    """
+    if deadline is None:
+        deadline = time.monotonic() + ASK_DEADLINE_SECONDS
+    context_scope = agent.name if (scope or PROMPT_SCOPE) == "character" else None
+    prompt, _ = build_prompt(agent, question, memory, context_scope)
+    with LLM_LATENCY.time(call="answer_draft"):
+        message = await llm_router.complete(
+            "answer", [{"role": "user", "content": prompt}], temperature=0.7, room=room, deadline=deadline
+        )
+    return (message.get("content") or "").strip()
+
+
+def record_answer(agent, question: str, answer: str, memory, room=None, scope=None) -> str:
+    """Add the question and `agent`'s answer to `memory`; returns the answer as recorded."""
+    context_scope = agent.name if (scope or PROMPT_SCOPE) == "character" else None
+    memory.add("Detective", question, to=agent.name)
+
+    pattern = rf"^{re.escape(agent.name)}:\s*"
+    answer = re.sub(pattern, "", answer, flags=re.IGNORECASE)
+    memory.add(agent.name, answer, to="Detective")
+
+    # Fold older turns into the rolling summary off the critical path
+    if memory.needs_compaction(context_scope):
+        task = asyncio.create_task(
+            memory.compact(
+                lambda summary, entries: summarize_turns(summary, entries, room=room), scope=context_scope
+            )
+        )
+        _background.add(task)
+        task.add_done_callback(_background.discard)
+    return answer
+
+
+async def _extract_clues(agent_name: str, reply: str, memory, room=None):
+    with LLM_LATENCY.time(call="clue_extraction"):
+        clue_message = await llm_router.complete(
+            "clues",
+            [{"role": "user", "content": _clue_prompt(reply)}],
             temperature=0.4,
+            room=room,
         )
-        parsed = json.loads(clue_response.choices[0].message.content.strip())
-        for clue in parsed:
-            text = clue.get("text", "").strip()
-            clue_type = clue.get("type", "fact").upper()
-            if text:
-                memory.add_clue(text, clue_type=clue_type, source=agent_name)
+    content = clue_message.get("content") or ""
+    parsed = extract_json(content, list)
+    if parsed is None:
+        # JSON mode models return an object; accept {"clues": [...]}
+        parsed = (extract_json(content, dict) or {}).get("clues")
+    if parsed is None:
+        log.warning("clue_json_unparsed", character=agent_name, length=len(content))
+        return
+    _add_clues(agent_name, validate_clues(parsed), memory)
+
+
+def _add_clues(agent_name: str, clues, memory) -> None:
+    for clue in clues:
+        memory.add_clue(clue["text"], clue_type=clue["type"], source=agent_name)
+
+
+async def extract_clues_from_reply(agent_name: str, reply: str, memory, room=None, clues=None):
+    """
+    Parse a character's reply to extract structured clues and add them to memory.
+    `clues` that came with a structured answer are added as they are, without
+    an extraction call.
+    """
+    if clues is not None:
+        _add_clues(agent_name, clues, memory)
+        return
+    try:
+        await _extract_clues(agent_name, reply, memory, room=room)
     except Exception as e:  # pragma: no cover
-        print("Failed to extract or parse clues (standalone):", e)
+        log.warning("clue_extraction_failed", character=agent_name, error=str(e))
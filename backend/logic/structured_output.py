@@ -0,0 +1,136 @@
+"""
+Tolerant parsing for JSON the model was asked to produce.
+
+Models asked for JSON still wrap it in code fences or a sentence of prose,
+leave trailing commas, or use curly quotes. extract_json tries the text as-is,
+then the outermost {...} / [...] span, then that span with those mistakes
+repaired, and returns None if nothing parses.
+
+The structured answer schema (one call for the reply and its clues):
+
+    {"answer": "<in-character reply>",
+     "clues": [{"text": "<clue>", "type": "important" | "background" | "gossip"}]}
+"""
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+CLUE_TYPES = ("important", "background", "gossip")
+
+STRUCTURED_INSTRUCTIONS = """Respond with a single JSON object and nothing else, in exactly this shape:
+{"answer": "<your in-character reply>", "clues": [{"text": "<clue>", "type": "important"}]}
+"answer" is what you say out loud. "clues" lists every potential clue in your answer, each labelled
+"important", "background" or "gossip" depending on how relevant and actionable it is to a murder
+investigation; use [] if there are none."""
+
+_FENCE = re.compile(r"^```(?:json)?\s*|\s*```$", re.IGNORECASE)
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+_SMART_QUOTES = str.maketrans({"“": '"', "”": '"', "‘": "'", "’": "'"})
+
+
+def _outer_span(text: str, open_char: str, close_char: str) -> Optional[str]:
+    start, end = text.find(open_char), text.rfind(close_char)
+    return text[start:end + 1] if start != -1 and end > start else None
+
+
+def extract_json(text: str, expect: type = dict) -> Any:
+    """Parse `text` as JSON of type `expect` (dict or list), tolerating common model mistakes."""
+    text = _FENCE.sub("", (text or "").strip())
+    open_char, close_char = ("{", "}") if expect is dict else ("[", "]")
+    candidates = [text]
+    span = _outer_span(text, open_char, close_char)
+    if span is not None:
+        candidates.append(span)
+        candidates.append(_TRAILING_COMMA.sub(r"\1", span.translate(_SMART_QUOTES)))
+    for candidate in candidates:
+        try:
+            value = json.loads(candidate)
+        except ValueError:
+            continue
+        if isinstance(value, expect):
+            return value
+    return None
+
+
+def validate_clues(items: Any) -> List[Dict[str, str]]:
+    """Keep well-formed clues as {"text", "type"} with type upper-cased; drop the rest."""
+    clues = []
+    if not isinstance(items, list):
+        return clues
+    for item in items:
+        if isinstance(item, str):
+            item = {"text": item}
+        if not isinstance(item, dict):
+            continue
+        text = item.get("text")
+        if not isinstance(text, str) or not text.strip():
+            continue
+        clue_type = item.get("type")
+        clue_type = clue_type.strip().lower() if isinstance(clue_type, str) else ""
+        clues.append({"text": text.strip(), "type": clue_type.upper() if clue_type in CLUE_TYPES else "FACT"})
+    return clues
+
+
+def parse_structured_answer(text: str) -> Optional[Tuple[str, List[Dict[str, str]]]]:
+    """(answer, clues) from a structured reply, or None if it does not match the schema."""
+    data = extract_json(text, dict)
+    if data is None:
+        return None
+    answer = data.get("answer")
+    if not isinstance(answer, str) or not answer.strip():
+        return None
+    return answer.strip(), validate_clues(data.get("clues", []))
+
+
+class AnswerFieldStreamer:
+    """Turns streamed structured JSON into the text of its "answer" field as it arrives.
+
+    feed() returns the newly decoded part of the answer (possibly ""); once the
+    closing quote has been seen the rest of the object is ignored.
+    """
+
+    _START = re.compile(r'"answer"\s*:\s*"')
+    _ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+    def __init__(self):
+        self.buffer = ""
+        self.started = False
+        self.done = False
+
+    def feed(self, delta: str) -> str:
+        if self.done:
+            return ""
+        self.buffer += delta
+        if not self.started:
+            match = self._START.search(self.buffer)
+            if match is None:
+                return ""
+            self.started = True
+            self.buffer = self.buffer[match.end():]
+        out = []
+        i = 0
+        while i < len(self.buffer):
+            ch = self.buffer[i]
+            if ch == '"':
+                self.done = True
+                break
+            if ch != "\\":
+                out.append(ch)
+                i += 1
+                continue
+            if i + 1 >= len(self.buffer):
+                break  # escape split across deltas
+            code = self.buffer[i + 1]
+            if code == "u":
+                if i + 6 > len(self.buffer):
+                    break
+                try:
+                    out.append(chr(int(self.buffer[i + 2:i + 6], 16)))
+                except ValueError:
+                    pass
+                i += 6
+                continue
+            out.append(self._ESCAPES.get(code, code))
+            i += 2
+        self.buffer = "" if self.done else self.buffer[i:]
+        return "".join(out)
@@ -2,23 +2,40 @@
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, Response
 from agents.profiles import create_bellamy, create_holloway, create_tommy, create_perpetrator
 from logic.memory import Memory
-from logic.qa import ask_character, extract_clues_from_reply
+from logic.qa import (
+    ask_character,
+    ask_character_with_clues,
+    draft_answer,
+    extract_clues_from_reply,
+    record_answer,
+    summarize_turns,
+)
+from logic import llm, llm_router
+from logic.clue_pipeline import pipeline as clue_pipeline
+from logic.answer_cache import answer_cache
+from state_backend import create_client_manager, create_state_backend, new_room_state
+from room_lifecycle import ROOM_SWEEP_INTERVAL_SECONDS, RoomLifecycle
+from matchmaking import (
+    MATCH_BATCH_SIZE,
+    MATCH_SWEEP_INTERVAL_SECONDS,
+    MATCH_TIMEOUT_SECONDS,
+    WaitHistogram,
+)
 import os
 from dotenv import load_dotenv
-import logging
-import openai
 import json
 
 # === NEW: sockets bits ===
 import socketio
 import asyncio
 import uuid
-import random
+import secrets
 import string
-from typing import Dict, Any, Optional
+import time
+from typing import Dict, Any, Optional, Tuple
 import inspect
 # === Firebase Admin (optional) ===
 try:
@@ -34,24 +51,43 @@ except Exception:
     fb_auth = None  # type: ignore
     _fb_app = None
 
+from token_cache import IdTokenCache
+from reply_timeouts import HUMAN_REPLY_TIMEOUT_SECONDS, ReplyTimeouts
+import eventlog
+from eventlog import bind as log_bind, get_logger
+import metrics
+from metrics import ASK_LATENCY, HUMAN_REPLY_WAIT
+
+id_tokens = IdTokenCache(fb_auth.verify_id_token) if fb_auth else None
+
 try:
     # Support both package and local run
     from .db import (
         create_room as db_create_room,
+        update_room_status as db_update_room_status,
         add_room_member as db_add_room_member,
-        add_transcript_entry as db_add_transcript_entry,
-        add_clue as db_add_clue,
+        enqueue_transcript_entry as db_enqueue_transcript_entry,
+        enqueue_clue as db_enqueue_clue,
+        start_write_behind as db_start_write_behind,
+        stop_write_behind as db_stop_write_behind,
         get_clues_for_room as db_get_clues_for_room,
-        get_character_profile as db_get_character_profile,
+        get_transcript_page as db_get_transcript_page,
+        clue_cache as db_clue_cache,
+        profile_cache as db_profile_cache,
     )
 except Exception:
     from db import (
         create_room as db_create_room,
+        update_room_status as db_update_room_status,
         add_room_member as db_add_room_member,
-        add_transcript_entry as db_add_transcript_entry,
-        add_clue as db_add_clue,
+        enqueue_transcript_entry as db_enqueue_transcript_entry,
+        enqueue_clue as db_enqueue_clue,
+        start_write_behind as db_start_write_behind,
+        stop_write_behind as db_stop_write_behind,
         get_clues_for_room as db_get_clues_for_room,
-        get_character_profile as db_get_character_profile,
+        get_transcript_page as db_get_transcript_page,
+        clue_cache as db_clue_cache,
+        profile_cache as db_profile_cache,
     )
     try:
         from db import room_exists as db_room_exists
@@ -64,9 +100,8 @@ except Exception:
 
 # === Load environment and API Key ===
 load_dotenv()
-log = logging.getLogger("uvicorn.error")
-openai.api_key = os.getenv("OPENAI_API_KEY")
-print("Loaded API Key:", openai.api_key[:5] + "..." if openai.api_key else "None")
+log = get_logger("main")
+log.info("openai_key_loaded", present=bool(os.getenv("OPENAI_API_KEY")))
 
 # === FastAPI App (unchanged) ===
 app = FastAPI()
@@ -79,19 +114,39 @@ app.add_middleware(
 )
 
 """
-Room model (in-memory, persisted optionally to DB later):
+Room model (shared fields live in the state backend, Memory is per worker):
 ROOMS = {
   "ABCD12": {
-      "detective_sid": str | None,
-      "murderer_sid": str | None,
-      "human_character": str | None,
-      "memory": Memory(),
+      "detective_sid": str | None,      # shared
+      "murderer_sid": str | None,       # shared
+      "human_character": str | None,    # shared
+      "active_at": float | None,        # shared, last activity on any worker
+      "memory": Memory(),               # local to this worker
   },
 }
+Handlers call load_room() to refresh the shared fields before using a room.
 """
 
 memory = Memory()  # legacy single-player memory
 ROOMS: Dict[str, Dict[str, Any]] = {}
+STATE = create_state_backend()
+# clue ETag versions live in STATE so every process agrees on them
+db_clue_cache.versions = STATE
+LIFECYCLE = RoomLifecycle()
+_room_sweeper: Optional[asyncio.Task] = None
+_match_sweeper: Optional[asyncio.Task] = None
+# seconds spent in the matchmaking queue, by outcome
+MATCH_WAITS = {"matched": WaitHistogram(), "timed_out": WaitHistogram()}
+connected_sockets = 0
+
+metrics.gauge("active_rooms", "Rooms held in this worker's memory.", lambda: len(ROOMS))
+metrics.gauge("connected_sockets", "Socket.IO connections on this worker.", lambda: connected_sockets)
+metrics.gauge("pending_murderer_replies", "Questions waiting on a human murderer's reply.", lambda: STATE.pending_count())
+metrics.gauge("clue_queue_depth", "Clue extraction jobs queued.", lambda: clue_pipeline.stats()["pending"])
+metrics.gauge("answer_cache_hits", "Answers served from the answer cache.", lambda: answer_cache.hits)
+metrics.gauge("answer_cache_misses", "Answer cache lookups that went to the LLM.", lambda: answer_cache.misses)
+metrics.gauge("room_clue_cache_hits", "Room clue reads served from the cache.", lambda: db_clue_cache.hits)
+metrics.gauge("room_clue_cache_misses", "Room clue reads that went to the DB.", lambda: db_clue_cache.misses)
 
 # === Characters (unchanged) ===
 characters = []
@@ -99,50 +154,108 @@ characters = []
 @app.on_event("startup")
 async def startup_event():
     global characters
-    print("Initializing characters...")
+    log.info("characters_initializing")
     characters = [
         create_bellamy(),
         create_holloway(),
         create_tommy(),
         create_perpetrator(),
     ]
+    global _room_sweeper, _match_sweeper
+    await STATE.start()
+    db_start_write_behind()
+    clue_pipeline.start()
+    _room_sweeper = asyncio.create_task(sweep_rooms_forever())
+    _match_sweeper = asyncio.create_task(match_timeouts_forever())
+    # Load character profiles in bulk; requests arriving first wait on the same load
+    asyncio.create_task(db_profile_cache.refresh())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    for task in (_room_sweeper, _match_sweeper):
+        if task:
+            task.cancel()
+    await clue_pipeline.stop()
+    await db_stop_write_behind()
+    await STATE.stop()
+    await llm.aclose()
+    if id_tokens:
+        id_tokens.close()
 
 @app.get("/characters")
 async def get_characters():
     return [char.name for char in characters]
 
+PROFILE_CACHE_CONTROL = f"public, max-age={int(os.getenv('PROFILE_HTTP_MAX_AGE', '300'))}"
+
 @app.get("/characters/{name}/profile")
 async def get_character_profile_http(name: str):
     try:
-        if 'db_get_character_profile' in globals() and db_get_character_profile:
-            ok, profile = db_get_character_profile(name)
+        if 'db_profile_cache' in globals() and db_profile_cache:
+            ok, profile = await db_profile_cache.get(name)
             if not ok:
                 return {"error": "db_unavailable"}
             if not profile:
                 return {"error": "not_found"}
-            return profile
+            return JSONResponse(profile, headers={"Cache-Control": PROFILE_CACHE_CONTROL})
     except Exception as e:
         return {"error": str(e)}
     return {"error": "not_configured"}
 
+@app.post("/characters/profiles/refresh")
+async def refresh_character_profiles():
+    """Reload the profile cache now (e.g. after editing character_profiles)."""
+    ok = await db_profile_cache.refresh()
+    return {"ok": ok, **db_profile_cache.stats()}
+
+def clue_delta(mem: Memory, since: int) -> Dict[str, Any]:
+    # a seq ahead of ours means the client saw a previous incarnation of the room
+    if since > mem.clue_seq:
+        return {"seq": mem.clue_seq, "clues": mem.get_clues(), "reset": True}
+    return {"seq": mem.clue_seq, "clues": mem.get_clues_since(since)}
+
 @app.get("/clues")
-async def get_clues():
+async def get_clues(since: Optional[int] = None):
+    if since is not None:
+        return clue_delta(memory, since)
     return memory.get_clues()
 
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    return header.strip() == "*" or etag in [tag.strip() for tag in header.split(",")]
+
 @app.get("/rooms/{code}/clues")
-async def get_room_clues(code: str):
-    # Prefer DB if available, fall back to in-memory
+async def get_room_clues(code: str, request: Request, since: Optional[int] = None):
+    """Full clue list, or with ?since=<seq> only the clues added after that sequence number."""
+    if since is not None:
+        # hydrates the room if this worker does not hold it (other worker, eviction)
+        room = await load_room(code)
+        if not room:
+            return {"error": "Room not found"}
+        return clue_delta(room["memory"], since)
+    # Clients that already hold the current version get a 304 without a DB read
+    version = await db_clue_cache.version(code)
+    etag = db_clue_cache.etag(version)
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    # The worker holding the room has every clue, including ones still queued
+    # for the DB; elsewhere prefer the DB (read-through cache), then hydrate
+    room = ROOMS.get(code)
+    if room:
+        return JSONResponse(room["memory"].get_clues(), headers={"ETag": etag})
     try:
-        if 'db_get_clues_for_room' in globals() and db_get_clues_for_room:
-            ok, items = db_get_clues_for_room(code)
+        if 'db_clue_cache' in globals() and db_clue_cache:
+            ok, version, items = await db_clue_cache.get(code)
             if ok and items:
-                return items
+                return JSONResponse(items, headers={"ETag": db_clue_cache.etag(version)})
     except Exception as e:
-        print("/rooms/{code}/clues DB read failed:", e)
-    room = ROOMS.get(code)
+        log.warning("room_clues_db_read_failed", room=code, error=str(e))
+    room = await load_room(code)
     if not room:
         return {"error": "Room not found"}
-    return room["memory"].get_clues()
+    return JSONResponse(room["memory"].get_clues(), headers={"ETag": etag})
 
 @app.get("/debug/supabase")
 async def debug_supabase():
@@ -153,6 +266,38 @@ async def debug_supabase():
     except Exception as e:
         return {"error": str(e)}
 
+@app.get("/debug/rooms")
+async def debug_rooms():
+    return {
+        **LIFECYCLE.stats(ROOMS),
+        "pending": STATE.pending_count(),
+        "reply_timeouts": REPLY_TIMEOUTS.stats(),
+    }
+
+@app.get("/metrics")
+async def get_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/debug/llm")
+async def debug_llm():
+    return {**llm_router.stats(), "answer_cache": answer_cache.stats()}
+
+@app.get("/debug/logging")
+async def debug_logging():
+    return eventlog.stats()
+
+@app.get("/debug/auth")
+async def debug_auth():
+    return id_tokens.stats() if id_tokens else {"configured": False}
+
+@app.get("/debug/matchmaking")
+async def debug_matchmaking():
+    return {
+        "waiting": await STATE.waiting_counts(),
+        "timeout_seconds": MATCH_TIMEOUT_SECONDS,
+        "wait_seconds": {outcome: hist.snapshot() for outcome, hist in MATCH_WAITS.items()},
+    }
+
 @app.get("/murderer")
 async def get_murderer_page():
     """Serve the murderer console page"""
@@ -182,12 +327,15 @@ async def ask(request: Request):
 # ============================
 
 # Socket server mounted *around* FastAPI so both HTTP + WS work
-sio_debug = os.getenv("SIO_DEBUG", "1") == "1"
+# engine.io packet logging is expensive; opt in with SIO_DEBUG=1
+sio_debug = os.getenv("SIO_DEBUG", "0") == "1"
 sio = socketio.AsyncServer(
     async_mode="asgi",
     cors_allowed_origins="*",
     logger=sio_debug,
     engineio_logger=sio_debug,
+    # Redis pub/sub manager when REDIS_URL is set, so emits reach other workers
+    client_manager=create_client_manager(),
 )
 socket_app = socketio.ASGIApp(sio, other_asgi_app=app)
 
@@ -196,19 +344,167 @@ async def maybe_await(value):
         return await value
     return value
 
+ROOM_CODE_ALPHABET = string.ascii_uppercase + string.digits
+
 def generate_room_code(length: int = 6) -> str:
-    alphabet = string.ascii_uppercase + string.digits
-    return "".join(random.choice(alphabet) for _ in range(length))
+    # codes are the only secret guarding join_role, so they must be unpredictable;
+    # open_room() retries on the rare collision via STATE.create_room
+    return "".join(secrets.choice(ROOM_CODE_ALPHABET) for _ in range(length))
+
+REPLY_TIMEOUTS = ReplyTimeouts()
+# draft the AI answer while the murderer types, so a timeout or disconnect is answered at once
+SPECULATIVE_FALLBACK = os.getenv("SPECULATIVE_FALLBACK", "1") == "1"
+# how often a pending question checks that the murderer is still connected
+MURDERER_PRESENCE_CHECK_SECONDS = float(os.getenv("MURDERER_PRESENCE_CHECK_SECONDS", "2"))
+# stream AI answers as 'answer_chunk' events unless the client sends {"stream": false}
+STREAM_ANSWERS = os.getenv("STREAM_ANSWERS", "1") == "1"
+# rehydration: turns loaded eagerly, then older history is paged into the summary
+HYDRATE_RECENT_TURNS = int(os.getenv("HYDRATE_RECENT_TURNS", "32"))
+HYDRATE_PAGE_SIZE = int(os.getenv("HYDRATE_PAGE_SIZE", "100"))
+_hydrating: Dict[str, asyncio.Task] = {}
+_backfills: set = set()
+# rooms hydrated with older turns left out: code -> created_at of the oldest loaded turn
+_backfill_before: Dict[str, Optional[str]] = {}
+
+async def load_room(code: str) -> Optional[Dict[str, Any]]:
+    """Local room dict for `code` with its shared fields refreshed from STATE."""
+    shared = await STATE.get_room(code)
+    if shared is None:
+        return None
+    room = ROOMS.get(code)
+    if room is None:
+        # not on this worker (restart, eviction or another worker's room): rebuild it,
+        # sharing one load between concurrent callers
+        task = _hydrating.get(code)
+        if task is None:
+            task = asyncio.create_task(hydrate_room(code, shared))
+            _hydrating[code] = task
+            task.add_done_callback(lambda _: _hydrating.pop(code, None))
+        room = await asyncio.shield(task)
+    room.update(shared)
+    LIFECYCLE.touch(code)
+    return room
+
+def transcript_row_to_entry(row: Dict[str, Any]) -> Dict[str, Any]:
+    speaker = row.get("speaker") or "Unknown"
+    to = row.get("character") if speaker == "Detective" else "Detective"
+    return {"speaker": speaker, "content": row.get("content") or "", "to": to}
+
+async def hydrate_room(code: str, shared: Dict[str, Any]) -> Dict[str, Any]:
+    """Build the local room from persistence: recent turns and all clues now, older turns later."""
+    memory_ = Memory()
+    recent: list = []
+    try:
+        ok, recent = await asyncio.to_thread(
+            db_get_transcript_page, code, limit=HYDRATE_RECENT_TURNS, newest_first=True
+        )
+        recent.reverse()
+        ok, clues = await asyncio.to_thread(db_get_clues_for_room, code)
+        memory_.load_history([transcript_row_to_entry(r) for r in recent], clues if ok else [])
+        if recent:
+            log.info("room_hydrated", room=code, turns=len(recent), clues=len(memory_.get_clues()))
+    except Exception as e:
+        log.warning("room_hydration_failed", room=code, error=str(e))
+    room = ROOMS.setdefault(code, {**shared, "memory": memory_})
+    if len(recent) >= HYDRATE_RECENT_TURNS and room["memory"] is memory_:
+        # summarised on the first question (start_summary_backfill), so workers that
+        # only relay the murderer or serve polls never pay for it
+        _backfill_before[code] = recent[0].get("created_at")
+    return room
+
+def start_summary_backfill(code: str, room: Dict[str, Any]):
+    """Fold the turns hydrate_room left out into the summary, once, before prompts need it."""
+    if code not in _backfill_before:
+        return
+    task = asyncio.create_task(
+        backfill_room_summary(code, room["memory"], before=_backfill_before.pop(code))
+    )
+    _backfills.add(task)
+    task.add_done_callback(_backfills.discard)
+
+async def backfill_room_summary(code: str, memory_: Memory, before: Optional[str]):
+    """Page through turns older than the eagerly loaded ones, folding them into the summary."""
+    async def pages():
+        after = None
+        while True:
+            ok, rows = await asyncio.to_thread(
+                db_get_transcript_page, code, limit=HYDRATE_PAGE_SIZE, before=before, after=after
+            )
+            if not ok or not rows:
+                return
+            yield [transcript_row_to_entry(r) for r in rows]
+            if len(rows) < HYDRATE_PAGE_SIZE:
+                return
+            after = rows[-1].get("created_at")
+
+    await memory_.backfill_summary(
+        pages(), lambda summary, entries: summarize_turns(summary, entries, room=code)
+    )
 
-# correlation_id -> asyncio.Future for murderer replies
-PENDING: Dict[str, asyncio.Future] = {}
-HUMAN_REPLY_TIMEOUT_SECONDS = int(os.getenv("HUMAN_REPLY_TIMEOUT_SECONDS", "120"))
+async def update_room(code: str, **fields: Any):
+    await STATE.update_room(code, **fields)
+    if code in ROOMS:
+        ROOMS[code].update(fields)
 
-# very simple matchmaking queues
-WAITING: Dict[str, set[str]] = {
-    "detective": set(),
-    "murderer": set(),
-}
+async def open_room(code: Optional[str] = None) -> str:
+    """Register a new room under `code` (or a fresh code if taken / not given)."""
+    code = code or generate_room_code()
+    while not await STATE.create_room(code, new_room_state()):
+        code = generate_room_code()
+    ROOMS[code] = {**new_room_state(), "memory": Memory()}
+    LIFECYCLE.touch(code)
+    return code
+
+# evictions that only drop this worker's copy and leave the room open
+LOCAL_EVICTIONS = ("memory", "local")
+
+async def close_room(code: str, reason: str):
+    """Evict a room from this worker; empty / idle rooms are also closed in STATE and the DB."""
+    ROOMS.pop(code, None)
+    _backfill_before.pop(code, None)
+    LIFECYCLE.record_eviction(code, reason)
+    llm.forget_room(code)
+    REPLY_TIMEOUTS.forget(code)
+    # a local eviction leaves the room open, so its shared clue version stays
+    await db_clue_cache.forget(code, shared=reason not in LOCAL_EVICTIONS)
+    if reason in LOCAL_EVICTIONS:
+        return
+    await STATE.delete_room(code)
+    try:
+        await asyncio.to_thread(db_update_room_status, code, "closed")
+    except Exception as e:
+        log.warning("db_update_room_status_failed", room=code, error=str(e))
+    await sio.emit("system", {"msg": "Room closed after inactivity."}, room=code)
+    await maybe_await(sio.close_room(code))
+    log.info("room_closed", room=code, reason=reason)
+
+async def confirm_eviction(code: str, reason: str) -> str:
+    """Re-check an empty / idle verdict against the shared room, which other workers keep current."""
+    shared = await STATE.get_room(code)
+    if shared is None:
+        return "local"  # already closed elsewhere
+    room = ROOMS.get(code) or {}
+    active_at = max(float(shared.get("active_at") or 0), float(room.get("active_at") or 0))
+    return LIFECYCLE.verdict(shared, time.time() - active_at) or "local"
+
+async def sweep_rooms_forever():
+    swept_at = time.monotonic()
+    while True:
+        await asyncio.sleep(ROOM_SWEEP_INTERVAL_SECONDS)
+        try:
+            # one shared write per active room per sweep, so other workers see it
+            since, swept_at = swept_at, time.monotonic()
+            for code, active_at in LIFECYCLE.active_since(since):
+                await update_room(code, active_at=active_at)
+            for code, reason in LIFECYCLE.select_evictions(ROOMS):
+                if reason not in LOCAL_EVICTIONS:
+                    reason = await confirm_eviction(code, reason)
+                await close_room(code, reason)
+            swept = STATE.sweep_pending(max_age=HUMAN_REPLY_TIMEOUT_SECONDS * 2)
+            if swept:
+                log.info("pending_replies_swept", count=swept)
+        except Exception as e:
+            log.warning("room_sweep_failed", error=str(e))
 
 def find_character(name: str):
     return next((c for c in characters if c.name == name), None)
@@ -218,25 +514,26 @@ def normalize_name(name: str | None) -> str:
 
 @sio.event
 async def connect(sid, environ):
-    log.info(f"Socket connected: {sid}")
-    log.info(f"Connection from: {environ.get('HTTP_USER_AGENT', 'Unknown')}")
+    global connected_sockets
+    connected_sockets += 1
+    log.info("socket_connected", sid=sid, user_agent=environ.get("HTTP_USER_AGENT", "Unknown"))
 
 @sio.event
 async def disconnect(sid):
-    log.info(f"Socket disconnected: {sid}")
+    global connected_sockets
+    connected_sockets = max(0, connected_sockets - 1)
+    log.info("socket_disconnected", sid=sid)
     session = await maybe_await(sio.get_session(sid)) if hasattr(sio, "get_session") else {}
     room_code = (session or {}).get("room")
     role = (session or {}).get("role")
-    if room_code and room_code in ROOMS:
-        room = ROOMS[room_code]
+    room = await load_room(room_code) if room_code else None
+    if room:
         if role == "detective" and room.get("detective_sid") == sid:
-            room["detective_sid"] = None
+            await update_room(room_code, detective_sid=None)
         if role == "murderer" and room.get("murderer_sid") == sid:
-            room["murderer_sid"] = None
+            await update_room(room_code, murderer_sid=None)
     # remove from matchmaking queues
-    for r in ("detective", "murderer"):
-        if sid in WAITING[r]:
-            WAITING[r].discard(sid)
+    await STATE.remove_waiting(sid)
 
 @sio.event
 async def create_room(sid, data):
@@ -245,22 +542,14 @@ async def create_room(sid, data):
     data: {"preferred_code"?: str}
     """
     preferred = (data or {}).get("preferred_code")
-    code = preferred or generate_room_code()
-    while code in ROOMS:
-        code = generate_room_code()
-    ROOMS[code] = {
-        "detective_sid": None,
-        "murderer_sid": None,
-        "human_character": None,
-        "memory": Memory(),
-    }
+    code = await open_room(preferred)
     # Persist room creation (best-effort)
     try:
         ok, info = db_create_room(code)
-        log.info(f"DB create_room ok={ok} info={info}")
+        log.debug("db_create_room", room=code, ok=ok, info=info)
     except Exception as e:
-        log.info(f"DB create_room failed: {e}")
-    log.info(f"ROOM CREATED {code}")
+        log.warning("db_create_room_failed", room=code, error=str(e))
+    log.info("room_created", room=code, sid=sid)
     await sio.emit("room_created", {"room": code}, room=sid)
 
 @sio.event
@@ -271,91 +560,119 @@ async def join_role(sid, data):
     role = (data or {}).get("role")
     room_code = (data or {}).get("room")
     id_token = (data or {}).get("idToken") or (data or {}).get("token")
-    log.info(f"JOIN_ROLE: sid={sid} role={role} room={room_code}")
+    log_bind(sid=sid, room=room_code)
+    log.info("join_role", role=role)
     if not role or not room_code:
         return await sio.emit("error", {"msg": "Missing role or room."}, room=sid)
-    if room_code not in ROOMS:
+    room = await load_room(room_code)
+    if room is None:
         # Try to hydrate from DB (in case process restarted)
-        hydrated = False
         try:
-            if 'db_room_exists' in globals() and db_room_exists and db_room_exists(room_code):
-                ROOMS[room_code] = {
-                    "detective_sid": None,
-                    "murderer_sid": None,
-                    "human_character": None,
-                    "memory": Memory(),
-                }
-                hydrated = True
-                print(f"Hydrated room {room_code} from DB")
+            if 'db_room_exists' in globals() and db_room_exists and await asyncio.to_thread(db_room_exists, room_code):
+                # another worker may have registered it first; either way it exists now
+                await STATE.create_room(room_code, new_room_state())
+                room = await load_room(room_code)
         except Exception as e:
-            print("Room hydration failed:", e)
-        if not hydrated:
+            log.warning("room_hydration_failed", error=str(e))
+        if room is None:
             return await sio.emit("error", {"msg": "Room not found."}, room=sid)
 
     # Verify Firebase token if provided
     user_id: Optional[str] = None
-    if id_token and fb_auth:
+    if id_token and id_tokens:
         try:
-            decoded = fb_auth.verify_id_token(id_token)
+            decoded = await id_tokens.verify(id_token)
             user_id = decoded.get("uid")
         except Exception as e:
-            log.info(f"Firebase token verification failed: {e}")
+            log.warning("token_verification_failed", error=str(e))
 
-    room = ROOMS[room_code]
     await maybe_await(sio.save_session(sid, {"role": role, "room": room_code, "user_id": user_id}))
     await maybe_await(sio.enter_room(sid, room_code))
     if role == "detective":
-        room["detective_sid"] = sid
-        log.info(f"Detective connected: {sid}")
+        await update_room(room_code, detective_sid=sid)
         await sio.emit("system", {"msg": "Detective joined."}, room=sid)
         try:
             ok, info = db_add_room_member(room_code, "detective", user_id=user_id)
-            log.info(f"DB add_room_member(det) ok={ok} info={info}")
+            log.debug("db_add_room_member", role=role, ok=ok, info=info)
         except Exception as e:
-            log.info(f"DB add_room_member(det) failed: {e}")
+            log.warning("db_add_room_member_failed", role=role, error=str(e))
     elif role == "murderer":
-        room["murderer_sid"] = sid
-        log.info(f"Murderer connected: {sid}")
+        await update_room(room_code, murderer_sid=sid)
         await sio.emit("system", {"msg": "Murderer joined."}, room=sid)
         try:
             ok, info = db_add_room_member(room_code, "murderer", user_id=user_id)
-            log.info(f"DB add_room_member(mur) ok={ok} info={info}")
+            log.debug("db_add_room_member", role=role, ok=ok, info=info)
         except Exception as e:
-            log.info(f"DB add_room_member(mur) failed: {e}")
+            log.warning("db_add_room_member_failed", role=role, error=str(e))
     else:
-        log.info(f"Unknown role: {role}")
+        log.warning("unknown_role", role=role)
         await sio.emit("error", {"msg": "Unknown role"}, room=sid)
 
 @sio.event
 async def queue_for_role(sid, data):
     """
     data: {"role": "detective" | "murderer"}
-    On match, emit 'matched' {room}
+    On match, emit 'matched' {room}. A detective still waiting after
+    MATCH_TIMEOUT_SECONDS gets 'matched' {room, ai_murderer: true}; a murderer
+    gets 'match_timeout'.
     """
     role = (data or {}).get("role")
     if role not in ("detective", "murderer"):
         return await sio.emit("error", {"msg": "Invalid role for matchmaking."}, room=sid)
-    counterpart = "murderer" if role == "detective" else "detective"
-    # if someone is waiting on the other side, match immediately
-    if WAITING[counterpart]:
-        other_sid = next(iter(WAITING[counterpart]))
-        WAITING[counterpart].discard(other_sid)
-        code = generate_room_code()
-        ROOMS[code] = {
-            "detective_sid": None,
-            "murderer_sid": None,
-            "human_character": None,
-            "memory": Memory(),
-        }
+    await STATE.enqueue_waiting(role, sid)
+    await sio.emit("system", {"msg": f"Queued for {role} matchmaking."}, room=sid)
+    await pair_waiting()
+
+async def open_matched_room() -> str:
+    code = await open_room()
+    try:
+        await asyncio.to_thread(db_create_room, code)
+    except Exception:
+        pass
+    return code
+
+async def pair_waiting():
+    """Drain the queues in batches, so a burst of joins is paired in a few round-trips."""
+    while True:
+        pairs = await STATE.pop_pairs(MATCH_BATCH_SIZE)
+        if not pairs:
+            return
+        now = time.time()
+        codes = await asyncio.gather(*(open_matched_room() for _ in pairs))
+        for ((det_sid, det_at), (mur_sid, mur_at)), code in zip(pairs, codes):
+            MATCH_WAITS["matched"].observe(max(0.0, now - det_at))
+            MATCH_WAITS["matched"].observe(max(0.0, now - mur_at))
+            await sio.emit("matched", {"room": code}, room=det_sid)
+            await sio.emit("matched", {"room": code}, room=mur_sid)
+        if len(pairs) < MATCH_BATCH_SIZE:
+            return
+
+async def expire_waiting():
+    """Give up on players queued longer than MATCH_TIMEOUT_SECONDS.
+
+    Detectives get a room of their own where every character, the murderer
+    included, is played by the AI. Murderers can't play without a detective, so
+    they are told to try again.
+    """
+    now = time.time()
+    cutoff = now - MATCH_TIMEOUT_SECONDS
+    for sid, enqueued_at in await STATE.pop_expired("detective", cutoff):
+        MATCH_WAITS["timed_out"].observe(now - enqueued_at)
+        code = await open_matched_room()
+        await sio.emit("matched", {"room": code, "ai_murderer": True}, room=sid)
+    for sid, enqueued_at in await STATE.pop_expired("murderer", cutoff):
+        MATCH_WAITS["timed_out"].observe(now - enqueued_at)
+        await sio.emit("match_timeout", {"role": "murderer"}, room=sid)
+        await sio.emit("system", {"msg": "No detective found. Please try again later."}, room=sid)
+
+async def match_timeouts_forever():
+    while True:
+        await asyncio.sleep(MATCH_SWEEP_INTERVAL_SECONDS)
         try:
-            db_create_room(code)
-        except Exception:
-            pass
-        await sio.emit("matched", {"room": code}, room=sid)
-        await sio.emit("matched", {"room": code}, room=other_sid)
-    else:
-        WAITING[role].add(sid)
-        await sio.emit("system", {"msg": f"Queued for {role} matchmaking."}, room=sid)
+            await pair_waiting()
+            await expire_waiting()
+        except Exception as e:
+            log.warning("matchmaking_sweep_failed", error=str(e))
 
 @sio.event
 async def set_human_character(sid, data):
@@ -365,9 +682,9 @@ async def set_human_character(sid, data):
     """
     session = await maybe_await(sio.get_session(sid))
     room_code = session.get("room")
-    if not room_code or room_code not in ROOMS:
+    room = await load_room(room_code) if room_code else None
+    if not room:
         return await sio.emit("error", {"msg": "No room for session."}, room=sid)
-    room = ROOMS[room_code]
     if sid != room.get("murderer_sid"):
         return await sio.emit("error", {"msg": "Only murderer can set character."}, room=sid)
 
@@ -375,8 +692,8 @@ async def set_human_character(sid, data):
     if not find_character(name):
         return await sio.emit("error", {"msg": f"No character named {name}."}, room=sid)
 
-    log.info(f"SET_HUMAN_CHARACTER: room={room_code} sid={sid} name={name}")
-    room["human_character"] = name
+    log.info("set_human_character", room=room_code, sid=sid, character=name)
+    await update_room(room_code, human_character=name)
     # Confirm to murderer only
     await sio.emit("character_locked", {"character": name}, room=sid)
     # Optional broadcast (filtered client-side)
@@ -386,20 +703,19 @@ async def set_human_character(sid, data):
 async def ask(sid, data):
     """
     Detective asks a question (multiplayer path).
-    data: {"character": "Mrs. Bellamy", "question": "Where were you?"}
+    data: {"character": "Mrs. Bellamy", "question": "Where were you?", "stream"?: bool}
+    AI answers are streamed as 'answer_chunk' {correlation_id, character, chunk}
+    events, always followed by a final 'answer' with the same correlation_id.
     """
     session = await maybe_await(sio.get_session(sid))
     room_code = session.get("room")
-    if not room_code or room_code not in ROOMS:
+    room = await load_room(room_code) if room_code else None
+    if not room:
         return await sio.emit("error", {"msg": "No room for session."}, room=sid)
-    room = ROOMS[room_code]
-    log.info(f"ASK event from {sid} in room {room_code}")
-    log.info(f"Detective SID: {room.get('detective_sid')}")
-    log.info(f"Murderer SID: {room.get('murderer_sid')}")
-    log.info(f"Human character: {room.get('human_character')}")
-    
+    log_bind(room=room_code, sid=sid)
+
     if sid != room.get("detective_sid"):
-        print(f"ERROR: {sid} is not detective")
+        log.warning("ask_rejected", reason="not_detective")
         return await sio.emit("error", {"msg": "Only detective can ask."}, room=sid)
 
     character = (data or {}).get("character")
@@ -407,75 +723,165 @@ async def ask(sid, data):
     if not character or not question:
         return await sio.emit("error", {"msg": "Missing character or question."}, room=sid)
 
-    log.info(f"Question for {character}: {question}")
-    log.info(
-        {
-            "routing_check": {
-                "room_human": normalize_name(room.get("human_character")),
-                "incoming": normalize_name(character),
-                "match": normalize_name(room.get("human_character")) == normalize_name(character),
-                "has_murderer": bool(room.get("murderer_sid")),
-            }
-        }
+    asked_at = time.perf_counter()
+    start_summary_backfill(room_code, room)
+    stream = bool((data or {}).get("stream", STREAM_ANSWERS))
+    corr_id = uuid.uuid4().hex
+    log_bind(correlation_id=corr_id)
+
+    async def emit_chunk(chunk: str):
+        if room.get("detective_sid"):
+            await sio.emit(
+                "answer_chunk",
+                {"correlation_id": corr_id, "character": character, "chunk": chunk},
+                room=room["detective_sid"],
+            )
+
+    on_token = emit_chunk if stream else None
+
+    log.info("ask_received", character=character, question=question)
+    log.debug(
+        "ask_routing",
+        human_character=room.get("human_character"),
+        murderer_sid=room.get("murderer_sid"),
     )
 
-    # Record question in transcript (best-effort)
+    # Record question in transcript (best-effort, batched in the background)
     try:
-        if 'db_add_transcript_entry' in globals() and db_add_transcript_entry:
-            db_add_transcript_entry(room_code, "Detective", question, character=character)
+        if 'db_enqueue_transcript_entry' in globals() and db_enqueue_transcript_entry:
+            db_enqueue_transcript_entry(room_code, "Detective", question, character=character, correlation_id=corr_id)
     except Exception as e:
-        log.info(f"DB add_transcript_entry(question) failed: {e}")
-
-    # Track clues before answering to compute delta
-    before_len = len(room["memory"].get_clues())
+        log.warning("db_enqueue_transcript_failed", turn="question", error=str(e))
 
     # If human controls this character, forward to murderer and await reply
     if normalize_name(room.get("human_character")) == normalize_name(character) and room.get("murderer_sid"):
-        log.info(f"Forwarding to human murderer for {character}")
-        corr_id = uuid.uuid4().hex
-        fut = asyncio.get_event_loop().create_future()
-        PENDING[corr_id] = fut
+        log.debug("ask_forwarded_to_human", character=character)
+        murderer_sid = room["murderer_sid"]
+        agent = find_character(character)
+        fut = await STATE.create_pending(corr_id)
         await sio.emit(
             "question_for_murderer",
             {"correlation_id": corr_id, "character": character, "question": question},
-            room=room["murderer_sid"],
+            room=murderer_sid,
         )
+        forwarded_at = time.perf_counter()
+        draft = None
+        if SPECULATIVE_FALLBACK and agent is not None:
+            draft = asyncio.create_task(draft_answer(agent, question, room["memory"], room=room_code))
+        timeout = REPLY_TIMEOUTS.timeout_for(room_code)
+        path = "human"
+        clues = None
         try:
-            answer = await asyncio.wait_for(fut, timeout=HUMAN_REPLY_TIMEOUT_SECONDS)
-        except asyncio.TimeoutError:
-            # fallback to AI if murderer is silent
-            log.info("Timeout, falling back to AI")
-            agent = find_character(character)
-            answer = await ask_character(agent, question, room["memory"])
+            answer, outcome = await wait_for_murderer(fut, room_code, murderer_sid, timeout)
+            waited = time.perf_counter() - forwarded_at
+            HUMAN_REPLY_WAIT.observe(waited, outcome=outcome)
+            if outcome != "disconnected":
+                REPLY_TIMEOUTS.observe(room_code, waited)
+            if answer is None:
+                # fallback to AI if murderer is silent or gone
+                path = f"human_{outcome}"
+                log.info("human_reply_missing", character=character, outcome=outcome, timeout=timeout)
+                answer, clues = await answer_from_draft(draft, agent, question, room, room_code, on_token)
+            elif draft is not None:
+                log.debug("fallback_draft_discarded", character=character, ready=draft.done())
         finally:
-            PENDING.pop(corr_id, None)
-        # Extract clues from human reply and add to memory
-        if answer:
-            await extract_clues_from_reply(character, answer, room["memory"])  # best-effort
+            if draft is not None and not draft.done():
+                draft.cancel()
+            await STATE.discard_pending(corr_id)
     else:
         # AI handles it
-        log.info(f"Using AI for {character}")
+        path = "ai"
         agent = find_character(character)
-        answer = await ask_character(agent, question, room["memory"])
+        answer, clues = await ask_character_with_clues(
+            agent, question, room["memory"], room=room_code, on_token=on_token
+        )
 
     # Send answer back to detective
     if room.get("detective_sid"):
-        await sio.emit("answer", {"character": character, "answer": answer}, room=room["detective_sid"])
+        await sio.emit(
+            "answer",
+            {"correlation_id": corr_id, "character": character, "answer": answer},
+            room=room["detective_sid"],
+        )
+    elapsed = time.perf_counter() - asked_at
+    ASK_LATENCY.observe(elapsed, path=path)
+    log.info("ask_answered", character=character, path=path, seconds=round(elapsed, 3))
 
-    # Record answer in transcript (best-effort)
+    # Record answer in transcript (best-effort, batched in the background)
     try:
-        if 'db_add_transcript_entry' in globals() and db_add_transcript_entry:
-            db_add_transcript_entry(room_code, character, answer, character=character)
+        if 'db_enqueue_transcript_entry' in globals() and db_enqueue_transcript_entry:
+            db_enqueue_transcript_entry(room_code, character, answer, character=character, correlation_id=corr_id)
     except Exception as e:
-        log.info(f"DB add_transcript_entry(answer) failed: {e}")
+        log.warning("db_enqueue_transcript_failed", turn="answer", error=str(e))
 
-    # Persist any new clues to DB
+    # Clue extraction runs off the critical path; clues_updated fires when it lands
+    if answer:
+        clue_pipeline.submit(
+            room_code, lambda: extract_and_publish_clues(room_code, room, character, answer, clues=clues)
+        )
+
+async def wait_for_murderer(
+    fut: asyncio.Future, room_code: str, murderer_sid: str, timeout: float
+) -> Tuple[Optional[str], str]:
+    """The murderer's reply and "answered", or (None, "timeout" | "disconnected")."""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while True:
+        remaining = deadline - loop.time()
+        if remaining <= 0:
+            return None, "timeout"
+        try:
+            reply = await asyncio.wait_for(
+                asyncio.shield(fut), timeout=min(remaining, MURDERER_PRESENCE_CHECK_SECONDS)
+            )
+            return reply, "answered"
+        except asyncio.TimeoutError:
+            pass
+        # the disconnect may have been handled by another worker, so check the shared room
+        shared = await STATE.get_room(room_code)
+        if not shared or shared.get("murderer_sid") != murderer_sid:
+            return None, "disconnected"
+
+async def answer_from_draft(
+    draft, agent, question: str, room: Dict[str, Any], room_code: str, on_token
+) -> Tuple[str, Optional[list]]:
+    """Answer with the speculative draft (waiting for it if still running), or ask the AI now.
+
+    Returns (answer, clues) like ask_character_with_clues; a draft comes without clues.
+    """
+    answer = None
+    if draft is not None:
+        try:
+            answer = await draft
+        except Exception as e:
+            log.warning("fallback_draft_failed", error=str(e))
+    if not answer:
+        return await ask_character_with_clues(
+            agent, question, room["memory"], room=room_code, on_token=on_token
+        )
+    log.info("fallback_draft_used", character=agent.name)
+    answer = record_answer(agent, question, answer, room["memory"], room=room_code)
+    if on_token is not None:
+        await on_token(answer)
+    return answer, None
+
+async def extract_and_publish_clues(
+    room_code: str, room: Dict[str, Any], character: str, answer: str, clues: Optional[list] = None
+):
+    """Background job: extract clues from an answer, persist the new ones, notify the room.
+
+    `clues` that came with a structured answer are used instead of an extraction call.
+    """
+    # Track clue sequence before extracting to compute delta
+    before_seq = room["memory"].clue_seq
+    await extract_clues_from_reply(character, answer, room["memory"], room=room_code, clues=clues)
+    new_items = room["memory"].get_clues_since(before_seq)
+
+    # Persist any new clues to DB (batched in the background)
     try:
-        if 'db_add_clue' in globals() and db_add_clue:
-            after_clues = room["memory"].get_clues()
-            new_items = after_clues[before_len:]
+        if 'db_enqueue_clue' in globals() and db_enqueue_clue:
             for c in new_items:
-                db_add_clue(
+                db_enqueue_clue(
                     room_code,
                     text=c.get("text", ""),
                     clue_type=c.get("type", "FACT"),
@@ -483,10 +889,18 @@ async def ask(sid, data):
                     timestamp=c.get("timestamp"),
                 )
     except Exception as e:
-        log.info(f"DB add_clue batch failed: {e}")
+        log.warning("db_enqueue_clue_failed", room=room_code, error=str(e))
+
+    # New clues make any cached list / issued ETag stale
+    if new_items:
+        await db_clue_cache.invalidate(room_code)
 
-    # Tell clients to refresh clues (your GUI will still call GET /clues)
-    await sio.emit("clues_updated", {}, room=room_code)
+    # Send only the delta; clients that missed one catch up with ?since=<seq>
+    await sio.emit(
+        "clues_updated",
+        {"seq": room["memory"].clue_seq, "clues": new_items},
+        room=room_code,
+    )
 
 @sio.event
 async def murderer_answer(sid, data):
@@ -496,16 +910,15 @@ async def murderer_answer(sid, data):
     """
     session = await maybe_await(sio.get_session(sid))
     room_code = session.get("room")
-    if not room_code or room_code not in ROOMS:
+    room = await load_room(room_code) if room_code else None
+    if not room:
         return await sio.emit("error", {"msg": "No room for session."}, room=sid)
-    room = ROOMS[room_code]
     if sid != room.get("murderer_sid"):
         return await sio.emit("error", {"msg": "Only murderer can answer."}, room=sid)
     corr_id = (data or {}).get("correlation_id")
     ans = ((data or {}).get("answer") or "").strip()
-    fut = PENDING.get(corr_id)
-    if fut and not fut.done():
-        fut.set_result(ans)
+    if corr_id:
+        await STATE.resolve_pending(corr_id, ans)
 
 @sio.event
 async def murderer_ack(sid, data):
@@ -514,6 +927,6 @@ async def murderer_ack(sid, data):
     data: {"correlation_id": "..."}
     """
     corr_id = (data or {}).get("correlation_id")
-    log.info(f"MURDERER_ACK sid={sid} corr_id={corr_id}")
+    log.debug("murderer_ack", sid=sid, correlation_id=corr_id)
 
 # ci: trigger render deploy
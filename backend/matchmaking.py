@@ -0,0 +1,100 @@
+"""
+Matchmaking primitives.
+
+- Matchmaker: FIFO queues per role with O(1) enqueue, removal (on disconnect)
+  and pairing, plus expiry of players who waited too long.
+- WaitHistogram: distribution of how long players waited before being paired
+  or timing out.
+"""
+import math
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+MATCH_TIMEOUT_SECONDS = float(os.getenv("MATCH_TIMEOUT_SECONDS", "60"))
+MATCH_BATCH_SIZE = int(os.getenv("MATCH_BATCH_SIZE", "50"))
+MATCH_SWEEP_INTERVAL_SECONDS = float(os.getenv("MATCH_SWEEP_INTERVAL_SECONDS", "2"))
+
+ROLES = ("detective", "murderer")
+
+# (sid, enqueued_at epoch seconds)
+Waiter = Tuple[str, float]
+
+
+class Matchmaker:
+    def __init__(self):
+        # OrderedDict keeps FIFO order and gives O(1) removal by sid
+        self._queues: Dict[str, "OrderedDict[str, float]"] = {role: OrderedDict() for role in ROLES}
+        self._role_of: Dict[str, str] = {}
+
+    def enqueue(self, role: str, sid: str, now: Optional[float] = None) -> None:
+        """Queue `sid` for `role`. Re-queueing for the same role keeps the original place."""
+        current = self._role_of.get(sid)
+        if current == role:
+            return
+        if current is not None:
+            self.remove(sid)
+        self._queues[role][sid] = time.time() if now is None else now
+        self._role_of[sid] = role
+
+    def remove(self, sid: str) -> bool:
+        role = self._role_of.pop(sid, None)
+        if role is None:
+            return False
+        self._queues[role].pop(sid, None)
+        return True
+
+    def pop_pairs(self, max_pairs: int = MATCH_BATCH_SIZE) -> List[Tuple[Waiter, Waiter]]:
+        """Pair the longest-waiting detective with the longest-waiting murderer, repeatedly."""
+        detectives, murderers = self._queues["detective"], self._queues["murderer"]
+        pairs = []
+        while detectives and murderers and len(pairs) < max_pairs:
+            det = detectives.popitem(last=False)
+            mur = murderers.popitem(last=False)
+            self._role_of.pop(det[0], None)
+            self._role_of.pop(mur[0], None)
+            pairs.append((det, mur))
+        return pairs
+
+    def pop_expired(self, role: str, older_than: float) -> List[Waiter]:
+        """Remove and return everyone in `role` who was queued before `older_than`."""
+        queue = self._queues[role]
+        expired = []
+        while queue:
+            sid, enqueued_at = next(iter(queue.items()))
+            if enqueued_at > older_than:
+                break  # FIFO: everyone behind joined later
+            queue.popitem(last=False)
+            self._role_of.pop(sid, None)
+            expired.append((sid, enqueued_at))
+        return expired
+
+    def counts(self) -> Dict[str, int]:
+        return {role: len(queue) for role, queue in self._queues.items()}
+
+
+class WaitHistogram:
+    """Cumulative-friendly bucket counts of wait times in seconds."""
+
+    BUCKETS = (1, 2, 5, 10, 20, 30, 60, 120, 300, math.inf)
+
+    def __init__(self):
+        self.counts = [0] * len(self.BUCKETS)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, seconds: float) -> None:
+        for i, bound in enumerate(self.BUCKETS):
+            if seconds <= bound:
+                self.counts[i] += 1
+                break
+        self.total += 1
+        self.sum += seconds
+
+    def snapshot(self) -> Dict[str, object]:
+        return {
+            "count": self.total,
+            "avg_seconds": round(self.sum / self.total, 3) if self.total else None,
+            "buckets": {("+Inf" if b == math.inf else str(b)): c for b, c in zip(self.BUCKETS, self.counts)},
+        }
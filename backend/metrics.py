@@ -0,0 +1,115 @@
+"""
+Minimal Prometheus-style metrics, rendered by GET /metrics.
+
+Histograms are fixed-bucket counters keyed by label values; observing is a
+dict lookup and a short bucket scan, cheap enough for every request. Gauges
+are callbacks evaluated only when /metrics is scraped.
+"""
+import math
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Sequence, Tuple
+
+# seconds; covers Supabase round-trips through slow LLM answers and human replies
+DEFAULT_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+_registry: List["Histogram"] = []
+_gauges: List[Tuple[str, str, Callable[[], float]]] = []
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_bound(bound: float) -> str:
+    return "+Inf" if bound == math.inf else repr(float(bound))
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # label values -> [per-bucket counts..., sum]
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+        _registry.append(self)
+
+    def observe(self, seconds: float, **labels: str) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.labels)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = [0] * len(self.buckets) + [0.0]
+        for i, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                series[i] += 1
+                break
+        series[-1] += seconds
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, series in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                le = 'le="' + _format_bound(bound) + '"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, le)} {cumulative}")
+            labels = _format_labels(self.labels, key)
+            lines.append(f"{self.name}_sum{labels} {series[-1]}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+def gauge(name: str, help_text: str, read: Callable[[], float]) -> None:
+    """Register a gauge whose value is read from `read()` at scrape time."""
+    _gauges.append((name, help_text, read))
+
+
+def render() -> str:
+    lines: List[str] = []
+    for histogram in _registry:
+        lines.extend(histogram.render())
+    for name, help_text, read in _gauges:
+        try:
+            value = read()
+        except Exception:
+            continue
+        lines.extend([f"# HELP {name} {help_text}", f"# TYPE {name} gauge", f"{name} {value}"])
+    return "\n".join(lines) + "\n"
+
+
+LLM_LATENCY = Histogram(
+    "llm_request_seconds",
+    "Latency of LLM completions by call type.",
+    labels=("call",),
+)
+SUPABASE_LATENCY = Histogram(
+    "supabase_request_seconds",
+    "Latency of Supabase requests by table.",
+    labels=("table",),
+)
+HUMAN_REPLY_WAIT = Histogram(
+    "human_murderer_wait_seconds",
+    "Time from forwarding a question to the human murderer until their reply or the timeout.",
+    labels=("outcome",),
+)
+ASK_LATENCY = Histogram(
+    "ask_seconds",
+    "End-to-end latency of the socket 'ask' event, question received to answer emitted.",
+    labels=("path",),
+)
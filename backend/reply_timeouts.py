@@ -0,0 +1,61 @@
+"""
+Adaptive timeouts for human murderer replies.
+
+A room starts with HUMAN_REPLY_TIMEOUT_SECONDS. Once its murderer has answered
+REPLY_TIMEOUT_MIN_SAMPLES questions, the timeout becomes the
+REPLY_TIMEOUT_PERCENTILE of their recent reply times times
+REPLY_TIMEOUT_FACTOR, kept between REPLY_TIMEOUT_MIN_SECONDS and
+HUMAN_REPLY_TIMEOUT_SECONDS. A quick typist's silence is then noticed sooner,
+while a slow one keeps the full time. A timed-out question counts as a reply
+that took the whole timeout, so repeated timeouts widen the window again.
+"""
+import os
+from collections import deque
+from typing import Any, Deque, Dict
+
+HUMAN_REPLY_TIMEOUT_SECONDS = int(os.getenv("HUMAN_REPLY_TIMEOUT_SECONDS", "120"))
+REPLY_TIMEOUT_ADAPTIVE = os.getenv("REPLY_TIMEOUT_ADAPTIVE", "1") == "1"
+REPLY_TIMEOUT_MIN_SECONDS = float(os.getenv("REPLY_TIMEOUT_MIN_SECONDS", "30"))
+REPLY_TIMEOUT_PERCENTILE = float(os.getenv("REPLY_TIMEOUT_PERCENTILE", "90"))
+REPLY_TIMEOUT_FACTOR = float(os.getenv("REPLY_TIMEOUT_FACTOR", "2"))
+REPLY_TIMEOUT_MIN_SAMPLES = int(os.getenv("REPLY_TIMEOUT_MIN_SAMPLES", "3"))
+REPLY_TIMEOUT_WINDOW = int(os.getenv("REPLY_TIMEOUT_WINDOW", "20"))
+
+
+class ReplyTimeouts:
+    def __init__(
+        self,
+        ceiling: float = HUMAN_REPLY_TIMEOUT_SECONDS,
+        floor: float = REPLY_TIMEOUT_MIN_SECONDS,
+        adaptive: bool = REPLY_TIMEOUT_ADAPTIVE,
+    ):
+        self.ceiling = ceiling
+        self.floor = min(floor, ceiling)
+        self.adaptive = adaptive
+        self._samples: Dict[str, Deque[float]] = {}
+
+    def timeout_for(self, room: str) -> float:
+        samples = self._samples.get(room)
+        if not self.adaptive or not samples or len(samples) < REPLY_TIMEOUT_MIN_SAMPLES:
+            return self.ceiling
+        ordered = sorted(samples)
+        typical = ordered[min(len(ordered) - 1, int(REPLY_TIMEOUT_PERCENTILE / 100 * len(ordered)))]
+        return max(self.floor, min(self.ceiling, typical * REPLY_TIMEOUT_FACTOR))
+
+    def observe(self, room: str, seconds: float) -> None:
+        """Record how long the room's murderer took to reply (or the timeout they ran out)."""
+        samples = self._samples.get(room)
+        if samples is None:
+            samples = self._samples[room] = deque(maxlen=REPLY_TIMEOUT_WINDOW)
+        samples.append(seconds)
+
+    def forget(self, room: str) -> None:
+        self._samples.pop(room, None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "adaptive": self.adaptive,
+            "rooms": len(self._samples),
+            "ceiling_seconds": self.ceiling,
+            "floor_seconds": self.floor,
+        }
@@ -0,0 +1,114 @@
+"""
+Room lifecycle: decides when rooms held by this worker should be evicted.
+
+Every handler touches the room it works on. A periodic sweep then picks:
+  - "empty" rooms: nobody connected and no activity for ROOM_EMPTY_TTL_SECONDS,
+  - "idle" rooms: no activity for ROOM_IDLE_TTL_SECONDS even if sockets linger,
+  - "memory" rooms: least recently used rooms, while the total Memory size of
+    all rooms is over ROOM_MEMORY_BUDGET_MB.
+Empty and idle rooms are closed for good; memory evictions only drop this
+worker's copy, which can be rebuilt from the database on the next join.
+
+With several workers a room's copy here can be stale (the players may be
+connected to, and active on, another worker). Each sweep therefore publishes
+this worker's recent activity to the shared room state, and an empty / idle
+verdict is re-checked against the shared state before the room is closed;
+if the shared state disagrees, only the local copy is dropped ("local").
+"""
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+ROOM_IDLE_TTL_SECONDS = float(os.getenv("ROOM_IDLE_TTL_SECONDS", str(2 * 60 * 60)))
+ROOM_EMPTY_TTL_SECONDS = float(os.getenv("ROOM_EMPTY_TTL_SECONDS", str(15 * 60)))
+ROOM_MEMORY_BUDGET_MB = float(os.getenv("ROOM_MEMORY_BUDGET_MB", "256"))
+ROOM_SWEEP_INTERVAL_SECONDS = float(os.getenv("ROOM_SWEEP_INTERVAL_SECONDS", "60"))
+
+
+class RoomLifecycle:
+    def __init__(
+        self,
+        idle_ttl: float = ROOM_IDLE_TTL_SECONDS,
+        empty_ttl: float = ROOM_EMPTY_TTL_SECONDS,
+        memory_budget_bytes: int = int(ROOM_MEMORY_BUDGET_MB * 1024 * 1024),
+    ):
+        self.idle_ttl = idle_ttl
+        self.empty_ttl = empty_ttl
+        self.memory_budget_bytes = memory_budget_bytes
+        # least recently active first
+        self._last_seen: "OrderedDict[str, float]" = OrderedDict()
+        self.evicted: Dict[str, int] = {"empty": 0, "idle": 0, "memory": 0, "local": 0}
+
+    def touch(self, code: str) -> None:
+        self._last_seen[code] = time.monotonic()
+        self._last_seen.move_to_end(code)
+
+    def forget(self, code: str) -> None:
+        self._last_seen.pop(code, None)
+
+    def active_since(self, since: float) -> List[Tuple[str, float]]:
+        """(code, wall-clock time) of rooms touched at or after time.monotonic() `since`."""
+        offset = time.time() - time.monotonic()
+        active = []
+        for code, seen in reversed(self._last_seen.items()):
+            if seen < since:
+                break
+            active.append((code, seen + offset))
+        return active
+
+    def verdict(self, room: Dict[str, Any], age: float) -> Optional[str]:
+        """"empty", "idle" or None for a room whose last activity was `age` seconds ago."""
+        empty = not room.get("detective_sid") and not room.get("murderer_sid")
+        if empty and age >= self.empty_ttl:
+            return "empty"
+        if age >= self.idle_ttl:
+            return "idle"
+        return None
+
+    def select_evictions(self, rooms: Dict[str, Dict[str, Any]]) -> List[Tuple[str, str]]:
+        """Return (code, reason) pairs to evict from `rooms`, oldest first."""
+        now = time.monotonic()
+        chosen: List[Tuple[str, str]] = []
+        picked = set()
+        for code, seen in self._last_seen.items():
+            age = now - seen
+            if age < min(self.idle_ttl, self.empty_ttl):
+                break  # everything after this is more recent
+            room = rooms.get(code)
+            if room is None:
+                continue
+            reason = self.verdict(room, age)
+            if reason:
+                chosen.append((code, reason))
+                picked.add(code)
+
+        total = sum(self.room_bytes(room) for code, room in rooms.items() if code not in picked)
+        if total > self.memory_budget_bytes:
+            for code in self._last_seen:
+                if total <= self.memory_budget_bytes:
+                    break
+                if code in picked or code not in rooms:
+                    continue
+                chosen.append((code, "memory"))
+                picked.add(code)
+                total -= self.room_bytes(rooms[code])
+        return chosen
+
+    @staticmethod
+    def room_bytes(room: Dict[str, Any]) -> int:
+        memory = room.get("memory")
+        return getattr(memory, "approx_bytes", 0)
+
+    def record_eviction(self, code: str, reason: str) -> None:
+        self.forget(code)
+        self.evicted[reason] = self.evicted.get(reason, 0) + 1
+
+    def stats(self, rooms: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+        return {
+            "rooms": len(rooms),
+            "tracked": len(self._last_seen),
+            "approx_bytes": sum(self.room_bytes(room) for room in rooms.values()),
+            "memory_budget_bytes": self.memory_budget_bytes,
+            "evicted": dict(self.evicted),
+        }
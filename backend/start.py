@@ -5,17 +5,28 @@ Production startup script for Detective Game backend
 import uvicorn
 import os
 from dotenv import load_dotenv
+from eventlog import get_logger
 
 if __name__ == "__main__":
     load_dotenv()
     
     port = int(os.getenv("PORT", 8000))
     host = os.getenv("HOST", "0.0.0.0")
-    
+    # One process, one worker: Socket.IO long-polling needs every request of a
+    # session to reach the same process, and uvicorn's workers share a socket
+    # without sticky sessions. To scale out, run several of these (each with its
+    # own PORT) behind a load balancer with sticky sessions, plus REDIS_URL.
+    if int(os.getenv("WEB_CONCURRENCY", 1)) > 1:
+        get_logger("start").warning(
+            "web_concurrency_ignored",
+            reason="run one process per PORT behind a sticky-session load balancer instead",
+        )
+
     uvicorn.run(
         "main:socket_app",
         host=host,
         port=port,
         reload=False,
-        access_log=True
+        access_log=True,
+        workers=1,
     )
@@ -0,0 +1,440 @@
+"""
+Shared state for rooms, pending murderer replies and matchmaking queues.
+
+With a single process everything can live in process memory
+(InProcessStateBackend). To scale out, run several single-worker processes
+(start.py, each on its own PORT) behind a load balancer with sticky sessions -
+Socket.IO long-polling needs every request of a session to reach the same
+process, which uvicorn's in-process workers cannot guarantee - and set
+REDIS_URL so they share state in Redis (RedisStateBackend): room metadata in
+hashes, matchmaking queues in sorted sets (FIFO by enqueue time) and murderer
+replies delivered over pub/sub to whichever process is waiting on them. The
+pub/sub listener reconnects with backoff if its connection drops; replies are
+also stored for REDIS_REPLY_TTL_SECONDS so ones published during the gap are
+picked up on reconnect.
+
+Only room metadata (who is detective / murderer, which character is possessed)
+is shared. Each worker keeps its own Memory for the rooms its detectives ask in.
+
+REDIS_URL=fakeredis:// uses the in-process `fakeredis` stand-in (dev only, not in
+requirements.txt), which exercises the Redis code path without a server. Its
+data lives in one process, so it is rejected with WEB_CONCURRENCY > 1.
+"""
+import asyncio
+import json
+import os
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+from eventlog import get_logger
+from matchmaking import ROLES, Matchmaker, Waiter
+
+try:
+    import redis.asyncio as aioredis
+except Exception:  # pragma: no cover
+    aioredis = None  # type: ignore
+
+log = get_logger("state")
+
+REDIS_URL = os.getenv("REDIS_URL")
+REDIS_PREFIX = os.getenv("REDIS_PREFIX", "detective:")
+# clue versions outlive a room's idle TTL; a shared store means a shared epoch
+REDIS_CLUE_VERSION_TTL_SECONDS = int(os.getenv("REDIS_CLUE_VERSION_TTL_SECONDS", "86400"))
+REDIS_REPLY_TTL_SECONDS = int(os.getenv("REDIS_REPLY_TTL_SECONDS", "600"))
+REDIS_RECONNECT_MIN_SECONDS = float(os.getenv("REDIS_RECONNECT_MIN_SECONDS", "0.5"))
+REDIS_RECONNECT_MAX_SECONDS = float(os.getenv("REDIS_RECONNECT_MAX_SECONDS", "30"))
+
+# active_at: wall-clock time of the room's last activity on any worker (see room_lifecycle)
+ROOM_FIELDS = ("detective_sid", "murderer_sid", "human_character", "active_at")
+
+
+def new_room_state() -> Dict[str, Any]:
+    return {field: None for field in ROOM_FIELDS}
+
+
+class StateBackend:
+    """Interface shared by the in-process and Redis implementations.
+
+    Pending-reply futures always live in the worker that is waiting on them, so
+    that bookkeeping is shared here.
+    """
+
+    def __init__(self):
+        self.pending: Dict[str, asyncio.Future] = {}
+        self._pending_since: Dict[str, float] = {}
+
+    def _new_pending(self, corr_id: str) -> asyncio.Future:
+        fut = asyncio.get_running_loop().create_future()
+        self.pending[corr_id] = fut
+        self._pending_since[corr_id] = time.monotonic()
+        return fut
+
+    def pending_count(self) -> int:
+        return len(self.pending)
+
+    def sweep_pending(self, max_age: float) -> int:
+        """Drop futures that are resolved or older than `max_age` seconds (their waiter is gone)."""
+        now = time.monotonic()
+        stale = [
+            corr_id
+            for corr_id, fut in self.pending.items()
+            if fut.done() or now - self._pending_since.get(corr_id, now) > max_age
+        ]
+        for corr_id in stale:
+            fut = self.pending.pop(corr_id)
+            self._pending_since.pop(corr_id, None)
+            if not fut.done():
+                fut.cancel()
+        return len(stale)
+
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+    # --- rooms ---
+    async def create_room(self, code: str, fields: Dict[str, Any]) -> bool:
+        """Create a room; False if the code is already taken."""
+        raise NotImplementedError
+
+    async def get_room(self, code: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    async def update_room(self, code: str, **fields: Any) -> None:
+        raise NotImplementedError
+
+    async def delete_room(self, code: str) -> None:
+        raise NotImplementedError
+
+    # --- clue list versions (db.RoomClueCache ETags) ---
+    async def clue_version(self, code: str) -> int:
+        raise NotImplementedError
+
+    async def bump_clue_version(self, code: str) -> int:
+        raise NotImplementedError
+
+    async def forget_clue_version(self, code: str) -> None:
+        raise NotImplementedError
+
+    # --- pending murderer replies ---
+    async def create_pending(self, corr_id: str) -> asyncio.Future:
+        """Future resolved when any worker calls resolve_pending(corr_id, ...)."""
+        raise NotImplementedError
+
+    async def resolve_pending(self, corr_id: str, answer: str) -> bool:
+        raise NotImplementedError
+
+    async def discard_pending(self, corr_id: str) -> None:
+        self.pending.pop(corr_id, None)
+        self._pending_since.pop(corr_id, None)
+
+    # --- matchmaking ---
+    async def enqueue_waiting(self, role: str, sid: str) -> None:
+        raise NotImplementedError
+
+    async def pop_pairs(self, max_pairs: int) -> List[Tuple[Waiter, Waiter]]:
+        """Atomically pair up to `max_pairs` (detective, murderer) waiters, longest waiting first."""
+        raise NotImplementedError
+
+    async def pop_expired(self, role: str, older_than: float) -> List[Waiter]:
+        """Remove and return waiters of `role` queued before epoch time `older_than`."""
+        raise NotImplementedError
+
+    async def remove_waiting(self, sid: str) -> None:
+        raise NotImplementedError
+
+    async def waiting_counts(self) -> Dict[str, int]:
+        raise NotImplementedError
+
+
+class InProcessStateBackend(StateBackend):
+    def __init__(self):
+        super().__init__()
+        self.rooms: Dict[str, Dict[str, Any]] = {}
+        self.matchmaker = Matchmaker()
+        self.clue_versions: Dict[str, int] = {}
+        # versions restart with the process; keeps old ETags from matching
+        self.clue_version_epoch = uuid.uuid4().hex[:8]
+
+    async def create_room(self, code: str, fields: Dict[str, Any]) -> bool:
+        if code in self.rooms:
+            return False
+        self.rooms[code] = dict(fields)
+        return True
+
+    async def get_room(self, code: str) -> Optional[Dict[str, Any]]:
+        room = self.rooms.get(code)
+        return dict(room) if room is not None else None
+
+    async def update_room(self, code: str, **fields: Any) -> None:
+        if code in self.rooms:
+            self.rooms[code].update(fields)
+
+    async def delete_room(self, code: str) -> None:
+        self.rooms.pop(code, None)
+
+    async def clue_version(self, code: str) -> int:
+        return self.clue_versions.get(code, 0)
+
+    async def bump_clue_version(self, code: str) -> int:
+        self.clue_versions[code] = self.clue_versions.get(code, 0) + 1
+        return self.clue_versions[code]
+
+    async def forget_clue_version(self, code: str) -> None:
+        self.clue_versions.pop(code, None)
+
+    async def create_pending(self, corr_id: str) -> asyncio.Future:
+        return self._new_pending(corr_id)
+
+    async def resolve_pending(self, corr_id: str, answer: str) -> bool:
+        fut = self.pending.get(corr_id)
+        if fut and not fut.done():
+            fut.set_result(answer)
+            return True
+        return False
+
+    async def enqueue_waiting(self, role: str, sid: str) -> None:
+        self.matchmaker.enqueue(role, sid)
+
+    async def pop_pairs(self, max_pairs: int) -> List[Tuple[Waiter, Waiter]]:
+        return self.matchmaker.pop_pairs(max_pairs)
+
+    async def pop_expired(self, role: str, older_than: float) -> List[Waiter]:
+        return self.matchmaker.pop_expired(role, older_than)
+
+    async def remove_waiting(self, sid: str) -> None:
+        self.matchmaker.remove(sid)
+
+    async def waiting_counts(self) -> Dict[str, int]:
+        return self.matchmaker.counts()
+
+
+_fake_server = None
+
+# Pops up to ARGV[1] pairs from the two queues in one step, so concurrent
+# workers never pair the same sid twice or strand a half-popped pair.
+_POP_PAIRS_LUA = """
+local n = math.min(tonumber(ARGV[1]), redis.call('ZCARD', KEYS[1]), redis.call('ZCARD', KEYS[2]))
+if n <= 0 then return {} end
+local dets = redis.call('ZPOPMIN', KEYS[1], n)
+local murs = redis.call('ZPOPMIN', KEYS[2], n)
+local out = {}
+for i = 1, #dets do out[#out + 1] = dets[i] end
+for i = 1, #murs do out[#out + 1] = murs[i] end
+return out
+"""
+
+
+def _fake_redis():
+    """Client for the process-wide fakeredis server (dev-only stand-in)."""
+    global _fake_server
+    import fakeredis
+
+    if _fake_server is None:
+        _fake_server = fakeredis.FakeServer()
+    return fakeredis.aioredis.FakeRedis(server=_fake_server, decode_responses=True)
+
+
+class RedisStateBackend(StateBackend):
+    def __init__(self, url: str, prefix: str = REDIS_PREFIX):
+        super().__init__()
+        if url.startswith("fakeredis://"):
+            self.redis = _fake_redis()
+        else:
+            if aioredis is None:
+                raise RuntimeError("REDIS_URL is set but the 'redis' package is not installed")
+            self.redis = aioredis.from_url(url, decode_responses=True)
+        self.prefix = prefix
+        self._listener: Optional[asyncio.Task] = None
+        self.listener_reconnects = 0
+        self.clue_version_epoch = "shared"
+        self._pop_pairs = self.redis.register_script(_POP_PAIRS_LUA)
+
+    def _key(self, *parts: str) -> str:
+        return self.prefix + ":".join(parts)
+
+    async def start(self) -> None:
+        if self._listener is None:
+            self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+        await self.redis.aclose()
+
+    async def _listen(self) -> None:
+        """Deliver published murderer replies; resubscribes with backoff if the connection drops."""
+        delay = REDIS_RECONNECT_MIN_SECONDS
+        first = True
+        while True:
+            pubsub = self.redis.pubsub()
+            try:
+                await pubsub.subscribe(self._key("pending"))
+                if not first:
+                    self.listener_reconnects += 1
+                    log.info("state_pubsub_reconnected")
+                    await self._catch_up()
+                first = False
+                delay = REDIS_RECONNECT_MIN_SECONDS
+                async for message in pubsub.listen():
+                    if message.get("type") != "message":
+                        continue
+                    try:
+                        payload = json.loads(message["data"])
+                    except Exception:
+                        continue
+                    self._deliver(payload)
+                log.warning("state_pubsub_lost", error="subscription ended", retry_in=delay)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                first = False
+                log.warning("state_pubsub_lost", error=str(e), retry_in=delay)
+            finally:
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, REDIS_RECONNECT_MAX_SECONDS)
+
+    def _deliver(self, payload: Dict[str, Any]) -> None:
+        fut = self.pending.get(payload.get("correlation_id"))
+        if fut and not fut.done():
+            fut.set_result(payload.get("answer", ""))
+
+    async def _catch_up(self) -> None:
+        """Resolve waiting questions whose reply was published while unsubscribed."""
+        waiting = [corr_id for corr_id, fut in self.pending.items() if not fut.done()]
+        if not waiting:
+            return
+        stored = await self.redis.mget([self._key("reply", corr_id) for corr_id in waiting])
+        for raw in stored:
+            if raw:
+                try:
+                    self._deliver(json.loads(raw))
+                except Exception:
+                    continue
+
+    # --- rooms ---
+    @staticmethod
+    def _encode(fields: Dict[str, Any]) -> Dict[str, str]:
+        return {k: "" if v is None else str(v) for k, v in fields.items()}
+
+    async def create_room(self, code: str, fields: Dict[str, Any]) -> bool:
+        key = self._key("room", code)
+        if not await self.redis.hsetnx(key, "created_at", str(time.time())):
+            return False
+        if fields:
+            await self.redis.hset(key, mapping=self._encode(fields))
+        return True
+
+    async def get_room(self, code: str) -> Optional[Dict[str, Any]]:
+        raw = await self.redis.hgetall(self._key("room", code))
+        if not raw:
+            return None
+        return {field: raw.get(field) or None for field in ROOM_FIELDS}
+
+    async def update_room(self, code: str, **fields: Any) -> None:
+        key = self._key("room", code)
+        if fields and await self.redis.exists(key):
+            await self.redis.hset(key, mapping=self._encode(fields))
+
+    async def delete_room(self, code: str) -> None:
+        await self.redis.delete(self._key("room", code))
+
+    async def clue_version(self, code: str) -> int:
+        return int(await self.redis.get(self._key("clue_version", code)) or 0)
+
+    async def bump_clue_version(self, code: str) -> int:
+        key = self._key("clue_version", code)
+        pipe = self.redis.pipeline()
+        pipe.incr(key)
+        pipe.expire(key, REDIS_CLUE_VERSION_TTL_SECONDS)
+        version, _ = await pipe.execute()
+        return int(version)
+
+    async def forget_clue_version(self, code: str) -> None:
+        await self.redis.delete(self._key("clue_version", code))
+
+    # --- pending murderer replies ---
+    async def create_pending(self, corr_id: str) -> asyncio.Future:
+        await self.start()
+        return self._new_pending(corr_id)
+
+    async def resolve_pending(self, corr_id: str, answer: str) -> bool:
+        fut = self.pending.get(corr_id)
+        if fut is not None:
+            # the asking worker is this one; no round-trip needed
+            if not fut.done():
+                fut.set_result(answer)
+                return True
+            return False
+        message = json.dumps({"correlation_id": corr_id, "answer": answer})
+        # kept briefly for a waiter whose listener is reconnecting
+        await self.redis.set(self._key("reply", corr_id), message, ex=REDIS_REPLY_TTL_SECONDS)
+        return bool(await self.redis.publish(self._key("pending"), message))
+
+    # --- matchmaking ---
+    async def enqueue_waiting(self, role: str, sid: str) -> None:
+        for other in ROLES:
+            if other != role:
+                await self.redis.zrem(self._key("waiting", other), sid)
+        # nx: re-queueing keeps the original place in line
+        await self.redis.zadd(self._key("waiting", role), {sid: time.time()}, nx=True)
+
+    async def pop_pairs(self, max_pairs: int) -> List[Tuple[Waiter, Waiter]]:
+        keys = [self._key("waiting", "detective"), self._key("waiting", "murderer")]
+        flat = await self._pop_pairs(keys=keys, args=[max_pairs])
+        if not flat:
+            return []
+        # flat is [det_sid, det_score, ..., mur_sid, mur_score, ...]
+        half = len(flat) // 2
+        dets = [(flat[i], float(flat[i + 1])) for i in range(0, half, 2)]
+        murs = [(flat[i], float(flat[i + 1])) for i in range(half, len(flat), 2)]
+        return list(zip(dets, murs))
+
+    async def pop_expired(self, role: str, older_than: float) -> List[Waiter]:
+        key = self._key("waiting", role)
+        candidates = await self.redis.zrangebyscore(key, "-inf", older_than, withscores=True)
+        expired = []
+        for sid, score in candidates:
+            # only the worker whose ZREM succeeds owns the timeout for this sid
+            if await self.redis.zrem(key, sid):
+                expired.append((sid, float(score)))
+        return expired
+
+    async def remove_waiting(self, sid: str) -> None:
+        for role in ROLES:
+            await self.redis.zrem(self._key("waiting", role), sid)
+
+    async def waiting_counts(self) -> Dict[str, int]:
+        return {role: await self.redis.zcard(self._key("waiting", role)) for role in ROLES}
+
+
+def create_state_backend() -> StateBackend:
+    processes = int(os.getenv("WEB_CONCURRENCY", "1"))
+    if processes > 1 and REDIS_URL and REDIS_URL.startswith("fakeredis://"):
+        raise RuntimeError("REDIS_URL=fakeredis:// is per-process and cannot be shared by WEB_CONCURRENCY > 1")
+    if processes > 1 and not REDIS_URL:
+        log.warning("state_not_shared", reason="WEB_CONCURRENCY > 1 without REDIS_URL")
+    if REDIS_URL:
+        log.info("state_backend", backend="redis", url=REDIS_URL.split("@")[-1])
+        return RedisStateBackend(REDIS_URL)
+    return InProcessStateBackend()
+
+
+def create_client_manager():
+    """python-socketio manager so emits reach sockets held by other workers."""
+    if not REDIS_URL or REDIS_URL.startswith("fakeredis://"):
+        return None
+    import socketio
+
+    return socketio.AsyncRedisManager(REDIS_URL, channel=f"{REDIS_PREFIX}socketio")
@@ -0,0 +1,60 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("fakeredis")
+
+import db  # noqa: E402
+import state_backend  # noqa: E402
+from db import RoomClueCache  # noqa: E402
+from state_backend import RedisStateBackend  # noqa: E402
+
+
+def test_invalidation_is_seen_by_every_worker(monkeypatch):
+    monkeypatch.setattr(state_backend, "_fake_server", None)
+    rows = [{"text": "Heard a door at 9pm"}]
+    monkeypatch.setattr(db, "supabase", object())
+    monkeypatch.setattr(db, "get_clues_for_room", lambda code: (True, list(rows)))
+
+    async def run():
+        states = [RedisStateBackend("fakeredis://") for _ in range(2)]
+        a, b = (RoomClueCache(versions=state) for state in states)
+        ok, version_a, items = await a.get("ROOM1")
+        ok, version_b, items = await b.get("ROOM1")
+        assert a.etag(version_a) == b.etag(version_b)
+        assert len(items) == 1
+
+        rows.append({"text": "Saw a trenchcoat"})
+        await a.invalidate("ROOM1")
+        ok, version, items = await b.get("ROOM1")
+        assert version == version_b + 1
+        assert len(items) == 2
+        assert b.etag(version) != b.etag(version_b)
+        for state in states:
+            await state.stop()
+
+    asyncio.run(run())
+
+
+def test_queued_clues_are_not_cached_under_the_new_version(monkeypatch):
+    rows = [{"room_code": "ROOM1", "text": "Heard a door at 9pm"}]
+    queue = db.WriteBehindQueue()
+    monkeypatch.setattr(db, "write_behind", queue)
+    monkeypatch.setattr(db, "supabase", object())
+    monkeypatch.setattr(db, "get_clues_for_room", lambda code: (True, list(rows)))
+    monkeypatch.setattr(db, "_bulk_insert", lambda table, batch: rows.extend(batch))
+
+    async def run():
+        cache = RoomClueCache()
+        queue.enqueue("clues", {"room_code": "ROOM1", "text": "Saw a trenchcoat"})
+        await cache.invalidate("ROOM1")
+        ok, version, items = await cache.get("ROOM1")
+        assert len(items) == 1  # the DB does not have it yet
+        assert "ROOM1" not in cache._items
+
+        await queue.flush()
+        ok, version, items = await cache.get("ROOM1")
+        assert len(items) == 2
+        assert cache._items["ROOM1"] == (version, items)
+
+    asyncio.run(run())
@@ -0,0 +1,28 @@
+import asyncio
+
+from eventlog import _context, bind
+from logic.clue_pipeline import CluePipeline
+
+
+def test_jobs_run_in_their_submitters_log_context():
+    pipeline = CluePipeline(workers=1)
+    seen = {}
+
+    async def ask(room, corr_id):
+        # what the ask handler does before handing extraction to the pipeline
+        bind(room=room, correlation_id=corr_id)
+
+        async def job():
+            seen[room] = dict(_context.get())
+
+        pipeline.submit(room, job)
+
+    async def run():
+        # the first submit starts the workers inside ROOM1's context
+        await asyncio.create_task(ask("ROOM1", "corr-1"))
+        await asyncio.create_task(ask("ROOM2", "corr-2"))
+        await pipeline.stop()
+
+    asyncio.run(run())
+    assert seen["ROOM1"] == {"room": "ROOM1", "correlation_id": "corr-1"}
+    assert seen["ROOM2"] == {"room": "ROOM2", "correlation_id": "corr-2"}
@@ -0,0 +1,59 @@
+import json
+
+from engine import game_state
+from engine.game_state import _ClueStore, _MemoryStore
+
+
+def _memory_store(tmp_path):
+    return _MemoryStore(tmp_path / "memory.jsonl", tmp_path / "memory.json", dict)
+
+
+def test_new_log_is_seeded_from_the_json_file(tmp_path):
+    (tmp_path / "clues.json").write_text(json.dumps([{"text": "A scream"}]))
+    store = _ClueStore(tmp_path / "clues.jsonl", tmp_path / "clues.json", list)
+    store._open()
+    store.append({"op": "add", "clue": {"text": "A scream"}})
+    store.append({"op": "add", "clue": {"text": "A trenchcoat"}})
+    store.close()
+
+    reopened = _ClueStore(tmp_path / "clues.jsonl", tmp_path / "clues.json", list)
+    reopened._open()
+    assert reopened.state == [{"text": "A scream"}, {"text": "A trenchcoat"}]
+
+
+def test_torn_last_line_is_dropped_and_the_log_stays_appendable(tmp_path):
+    store = _memory_store(tmp_path)
+    store._open()
+    store.append({"op": "append", "character": "Tommy", "entry": "first"})
+    store.append({"op": "append", "character": "Tommy", "entry": "second"})
+    store._file.close()
+    # crash in the middle of writing the last record
+    text = store.log_path.read_text()
+    store.log_path.write_text(text[: len(text) - 10])
+
+    reopened = _memory_store(tmp_path)
+    reopened._open()
+    assert reopened.state == {"Tommy": ["first"]}
+    reopened.append({"op": "append", "character": "Tommy", "entry": "third"})
+    reopened._file.close()
+
+    replayed = _memory_store(tmp_path)
+    replayed._open()
+    assert replayed.state == {"Tommy": ["first", "third"]}
+
+
+def test_log_is_compacted_into_a_snapshot(tmp_path, monkeypatch):
+    monkeypatch.setattr(game_state, "GAME_STATE_COMPACT_EVERY", 5)
+    store = _memory_store(tmp_path)
+    store._open()
+    for i in range(12):
+        store.append({"op": "append", "character": "Tommy", "entry": str(i)})
+    lines = store.log_path.read_text().splitlines()
+    assert json.loads(lines[0])["op"] == "snapshot"
+    assert len(lines) <= 6
+    assert json.loads(store.json_path.read_text())["Tommy"][:5] == ["0", "1", "2", "3", "4"]
+    store.close()
+
+    replayed = _memory_store(tmp_path)
+    replayed._open()
+    assert replayed.state == {"Tommy": [str(i) for i in range(12)]}
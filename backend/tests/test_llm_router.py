@@ -0,0 +1,116 @@
+import asyncio
+import time
+
+import pytest
+
+from logic import llm_router
+from logic.llm_router import FAKE_BASE, Route, Target
+
+
+def _half_open(target):
+    breaker = target.breaker
+    breaker.state = "open"
+    breaker.opened_at = time.monotonic() - breaker.cooldown - 1
+    return breaker
+
+
+def _route(fallback=False):
+    return Route(
+        "answer",
+        primary=Target("primary", FAKE_BASE),
+        fallback=Target("fallback", FAKE_BASE) if fallback else None,
+        timeout=5,
+        deflect=lambda: "deflected",
+    )
+
+
+MESSAGES = [{"role": "user", "content": "Now reply ONLY as Mrs. Bellamy to this question: \"Where?\""}]
+
+
+def test_cancelled_probe_releases_breaker(monkeypatch):
+    monkeypatch.setattr(llm_router, "LLM_FAKE_LATENCY_MS", 200)
+    route = _route()
+    breaker = _half_open(route.primary)
+
+    async def run():
+        task = asyncio.create_task(route.complete(MESSAGES))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(run())
+    assert breaker.allow()
+    monkeypatch.setattr(llm_router, "LLM_FAKE_LATENCY_MS", 0)
+    message = asyncio.run(route.complete(MESSAGES))
+    assert message["content"] != "deflected"
+    assert breaker.state == "closed"
+
+
+def _live(qualname):
+    return [t for t in asyncio.all_tasks() if not t.done() and t.get_coro().__qualname__ == qualname]
+
+
+def test_cancelled_hedged_call_cancels_the_first_request(monkeypatch):
+    monkeypatch.setattr(llm_router, "LLM_FAKE_LATENCY_MS", 1000)
+    monkeypatch.setattr(llm_router, "LLM_HEDGE_INITIAL_DELAY_SECONDS", 0.2)
+    route = _route()
+    route.hedge = True
+
+    async def run(call, qualname):
+        task = asyncio.create_task(call())
+        await asyncio.sleep(0.05)
+        assert _live(qualname)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        await asyncio.sleep(0)
+        assert not _live(qualname)
+
+    async def first_delta():
+        async for delta in route.stream(MESSAGES):
+            return delta
+
+    asyncio.run(run(lambda: route.complete(MESSAGES), "Target.complete"))
+    asyncio.run(run(first_delta, "_first_delta"))
+    assert route.hedges == 0
+
+
+def test_abandoned_stream_probe_releases_breaker():
+    route = _route()
+    breaker = _half_open(route.primary)
+
+    async def run():
+        stream = route.stream(MESSAGES)
+        assert await stream.__anext__()
+        await stream.aclose()
+
+    asyncio.run(run())
+    assert breaker.allow()
+
+
+def test_spent_deadline_releases_probe():
+    route = _route()
+    breaker = _half_open(route.primary)
+    message = asyncio.run(route.complete(MESSAGES, deadline=time.monotonic() - 1))
+    assert message["content"] == "deflected"
+    assert breaker.allow()
+
+
+def test_unused_fallback_is_not_claimed():
+    route = _route(fallback=True)
+    breaker = _half_open(route.fallback)
+    asyncio.run(route.complete(MESSAGES))
+    assert route.fallback.calls == 0
+    assert route.fallbacks == 0
+    assert breaker.allow()
+
+
+def test_failed_primary_falls_back():
+    route = _route(fallback=True)
+    route.primary.breaker.state = "open"
+    route.primary.breaker.opened_at = time.monotonic()
+    message = asyncio.run(route.complete(MESSAGES))
+    assert message["content"] != "deflected"
+    assert route.fallbacks == 1
+    assert route.fallback.calls == 1
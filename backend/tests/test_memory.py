@@ -0,0 +1,53 @@
+from logic.memory import Memory, normalize_clue
+
+
+def test_exact_repeat_is_merged():
+    memory = Memory()
+    first = memory.add_clue("Heard a loud thud at 9am.", clue_type="FACT", source="Mrs. Bellamy")
+    again = memory.add_clue("heard a LOUD thud at 9am", clue_type="FACT", source="Tommy")
+    assert again is first
+    assert len(memory.get_clues()) == 1
+    assert first["count"] == 2
+    assert first["sources"] == ["Mrs. Bellamy", "Tommy"]
+    assert memory.clues_merged == 1
+
+
+def test_fuzzy_repeat_is_merged():
+    memory = Memory()
+    first = memory.add_clue("The gardener was seen near the greenhouse at 9pm")
+    again = memory.add_clue("The gardener was seen near the green house at 9pm")
+    assert again is first
+    assert len(memory.get_clues()) == 1
+
+
+def test_numbers_and_negation_block_a_merge():
+    memory = Memory()
+    memory.add_clue("The gardener was seen near the greenhouse at 9pm")
+    memory.add_clue("The gardener was seen near the greenhouse at 10pm")
+    memory.add_clue("The butler was in the kitchen all evening")
+    memory.add_clue("The butler was not in the kitchen all evening")
+    assert len(memory.get_clues()) == 4
+    assert memory.clues_merged == 0
+
+
+def test_merge_keeps_the_most_significant_type():
+    memory = Memory()
+    clue = memory.add_clue("She thinks the victim was grumpy", clue_type="GOSSIP")
+    memory.add_clue("She thinks the victim was grumpy", clue_type="IMPORTANT")
+    memory.add_clue("She thinks the victim was grumpy", clue_type="BACKGROUND")
+    assert clue["type"] == "IMPORTANT"
+
+
+def test_merged_clue_is_not_in_the_next_delta():
+    memory = Memory()
+    memory.add_clue("Heard a loud thud at 9am")
+    seq = memory.clue_seq
+    memory.add_clue("Heard a loud thud at 9am", source="Tommy")
+    assert memory.get_clues_since(seq) == []
+    new = memory.add_clue("Saw a trenchcoat on the stairs")
+    assert memory.get_clues_since(seq) == [new]
+    assert new["seq"] == seq + 1
+
+
+def test_normalize_clue():
+    assert normalize_clue("  She’s   SURE, it was 9:30!") == "she's sure it was 9 30"
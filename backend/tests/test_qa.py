@@ -0,0 +1,78 @@
+import asyncio
+
+from agents.profiles import create_bellamy
+from logic import llm_router, qa
+from logic.llm import LLMError
+from logic.llm_router import DEFLECTIONS, FAKE_BASE, Route, Target
+from logic.memory import Memory
+
+
+def _broken_answer_route(monkeypatch):
+    target = Target("primary", FAKE_BASE)
+
+    async def stream(task, messages, room, timeout, **params):
+        yield "Well, "
+        raise LLMError("connection reset")
+
+    monkeypatch.setattr(target, "stream", stream)
+    route = Route("answer", primary=target, timeout=5, deflect=lambda: DEFLECTIONS[0])
+    monkeypatch.setitem(llm_router.ROUTES, "answer", route)
+    return route
+
+
+def test_broken_stream_still_ends_in_one_answer(monkeypatch):
+    route = _broken_answer_route(monkeypatch)
+    memory = Memory()
+    chunks = []
+
+    async def on_token(chunk):
+        chunks.append(chunk)
+
+    agent = create_bellamy()
+    answer = asyncio.run(
+        qa.ask_character(agent, "Where were you?", memory, on_token=on_token, extract_clues=False, use_cache=False)
+    )
+    assert answer == f"Well, {DEFLECTIONS[0]}"
+    assert "".join(chunks).strip() == answer
+    assert memory.entries[-1]["content"] == answer
+    assert route.deflections == 1
+
+
+def test_broken_structured_stream_keeps_the_streamed_answer(monkeypatch):
+    _broken_answer_route(monkeypatch)
+    agent = create_bellamy()
+    memory = Memory()
+    chunks = []
+
+    async def on_token(chunk):
+        chunks.append(chunk)
+
+    async def stream(task, messages, room, timeout, **params):
+        yield '{"answer": "I was baking'
+        raise LLMError("connection reset")
+
+    monkeypatch.setattr(llm_router.ROUTES["answer"].primary, "stream", stream)
+    answer = asyncio.run(
+        qa.ask_character(
+            agent, "Where were you?", memory, on_token=on_token, extract_clues=False, use_cache=False,
+            structured=True,
+        )
+    )
+    assert answer == f"I was baking {DEFLECTIONS[0]}"
+    assert "".join(chunks) == answer
+
+
+def test_structured_answer_hands_its_clues_to_the_caller(monkeypatch):
+    route = Route("answer", primary=Target("primary", FAKE_BASE), timeout=5, deflect=lambda: DEFLECTIONS[0])
+    monkeypatch.setitem(llm_router.ROUTES, "answer", route)
+    agent = create_bellamy()
+    memory = Memory()
+
+    answer, clues = asyncio.run(
+        qa.ask_character_with_clues(agent, "Where were you?", memory, use_cache=False, structured=True)
+    )
+    assert answer and clues
+    assert memory.get_clues() == []
+
+    asyncio.run(qa.extract_clues_from_reply(agent.name, answer, memory, clues=clues))
+    assert [clue["text"] for clue in memory.get_clues()] == [clue["text"] for clue in clues]
@@ -0,0 +1,72 @@
+import asyncio
+import time
+
+import main
+from logic.memory import Memory
+from room_lifecycle import RoomLifecycle
+from state_backend import new_room_state
+
+
+def test_active_since_lists_recent_rooms_newest_first():
+    lifecycle = RoomLifecycle()
+    lifecycle.touch("OLD")
+    since = time.monotonic()
+    lifecycle.touch("A")
+    lifecycle.touch("B")
+    assert [code for code, _ in lifecycle.active_since(since)] == ["B", "A"]
+    assert all(abs(at - time.time()) < 1 for _, at in lifecycle.active_since(since))
+
+
+def test_stale_copy_only_drops_the_local_room(monkeypatch):
+    monkeypatch.setattr(main, "LIFECYCLE", RoomLifecycle(idle_ttl=60, empty_ttl=30))
+
+    async def run():
+        code = "STALE1"
+        await main.STATE.create_room(code, new_room_state())
+        # another worker holds the game: players connected, active a moment ago
+        await main.STATE.update_room(code, detective_sid="d1", murderer_sid="m1", active_at=time.time() - 5)
+        main.ROOMS[code] = {**new_room_state(), "memory": Memory()}
+        assert main.LIFECYCLE.verdict(main.ROOMS[code], 3600) == "empty"
+
+        assert await main.confirm_eviction(code, "empty") == "local"
+        await main.close_room(code, "local")
+        assert code not in main.ROOMS
+        assert await main.STATE.get_room(code) is not None
+
+        await main.STATE.update_room(code, active_at=time.time() - 120)
+        assert await main.confirm_eviction(code, "idle") == "idle"
+        await main.STATE.update_room(code, detective_sid=None, murderer_sid=None, active_at=time.time() - 40)
+        assert await main.confirm_eviction(code, "empty") == "empty"
+        await main.STATE.delete_room(code)
+        assert await main.confirm_eviction(code, "idle") == "local"
+
+    asyncio.run(run())
+
+
+def test_hydration_defers_the_summary_backfill_to_the_first_question(monkeypatch):
+    rows = [
+        {"speaker": "Detective", "character": "Mrs. Bellamy", "content": f"Q{i}", "created_at": f"2026-01-01T00:{i:02d}"}
+        for i in range(main.HYDRATE_RECENT_TURNS)
+    ]
+    pages = []
+
+    def transcript_page(code, limit=50, before=None, after=None, newest_first=False):
+        pages.append(before)
+        return True, list(reversed(rows)) if newest_first else []
+
+    monkeypatch.setattr(main, "db_get_transcript_page", transcript_page)
+    monkeypatch.setattr(main, "db_get_clues_for_room", lambda code: (True, []))
+
+    async def run():
+        code = "HYDR01"
+        room = await main.hydrate_room(code, new_room_state())
+        await asyncio.sleep(0)
+        assert pages == [None] and not main._backfills
+
+        main.start_summary_backfill(code, room)
+        main.start_summary_backfill(code, room)
+        await asyncio.gather(*main._backfills)
+        assert pages == [None, rows[0]["created_at"]]
+        await main.close_room(code, "memory")
+
+    asyncio.run(run())
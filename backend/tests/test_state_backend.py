@@ -0,0 +1,109 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("fakeredis")
+
+import state_backend  # noqa: E402
+from state_backend import InProcessStateBackend, RedisStateBackend  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def fresh_fake_server(monkeypatch):
+    monkeypatch.setattr(state_backend, "_fake_server", None)
+    monkeypatch.setattr(state_backend, "REDIS_RECONNECT_MIN_SECONDS", 0.01)
+
+
+def _workers(n=2):
+    """Backends sharing one fakeredis server, like separate processes sharing Redis."""
+    return [RedisStateBackend("fakeredis://") for _ in range(n)]
+
+
+async def _stop(*backends):
+    for backend in backends:
+        await backend.stop()
+
+
+def test_rooms_are_shared_and_codes_unique():
+    async def run():
+        a, b = _workers()
+        assert await a.create_room("ABC123", state_backend.new_room_state())
+        assert not await b.create_room("ABC123", state_backend.new_room_state())
+        await b.update_room("ABC123", murderer_sid="m1")
+        assert (await a.get_room("ABC123"))["murderer_sid"] == "m1"
+        await _stop(a, b)
+
+    asyncio.run(run())
+
+
+def test_reply_reaches_the_waiting_worker():
+    async def run():
+        a, b = _workers()
+        fut = await a.create_pending("corr-1")
+        await asyncio.sleep(0.05)  # listener subscribed
+        assert await b.resolve_pending("corr-1", "I was in the garden.")
+        assert await asyncio.wait_for(fut, 1) == "I was in the garden."
+        await _stop(a, b)
+
+    asyncio.run(run())
+
+
+def test_listener_reconnects_and_catches_up(monkeypatch):
+    async def run():
+        a, b = _workers()
+        real_pubsub = a.redis.pubsub
+        dropped = asyncio.Event()
+
+        class DroppingPubSub:
+            """Stands in for a pub/sub connection that dies once subscribed."""
+
+            def __init__(self):
+                self.inner = real_pubsub()
+
+            async def subscribe(self, channel):
+                await self.inner.subscribe(channel)
+
+            async def listen(self):
+                await dropped.wait()
+                raise ConnectionError("connection reset")
+                yield  # pragma: no cover
+
+            async def aclose(self):
+                await self.inner.aclose()
+
+        monkeypatch.setattr(a.redis, "pubsub", DroppingPubSub)
+        fut = await a.create_pending("corr-2")
+        await asyncio.sleep(0.05)
+        dropped.set()
+        # published while a's subscription is down
+        monkeypatch.setattr(a.redis, "pubsub", real_pubsub)
+        await b.resolve_pending("corr-2", "Pruning hydrangeas.")
+        assert await asyncio.wait_for(fut, 1) == "Pruning hydrangeas."
+        assert a.listener_reconnects == 1
+        await _stop(a, b)
+
+    asyncio.run(run())
+
+
+@pytest.mark.parametrize("make", [InProcessStateBackend, lambda: RedisStateBackend("fakeredis://")])
+def test_matchmaking_pairs_in_order(make):
+    async def run():
+        backend = make()
+        for sid in ("d1", "d2"):
+            await backend.enqueue_waiting("detective", sid)
+        await backend.enqueue_waiting("murderer", "m1")
+        await backend.remove_waiting("d1")
+        pairs = await backend.pop_pairs(10)
+        assert [(d[0], m[0]) for d, m in pairs] == [("d2", "m1")]
+        assert await backend.waiting_counts() == {"detective": 0, "murderer": 0}
+        if isinstance(backend, RedisStateBackend):
+            await backend.stop()
+
+    asyncio.run(run())
+
+
+def test_fakeredis_rejected_with_several_processes(monkeypatch):
+    monkeypatch.setattr(state_backend, "REDIS_URL", "fakeredis://")
+    monkeypatch.setenv("WEB_CONCURRENCY", "4")
+    with pytest.raises(RuntimeError):
+        state_backend.create_state_backend()
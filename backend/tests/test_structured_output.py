@@ -0,0 +1,52 @@
+from logic.structured_output import AnswerFieldStreamer, extract_json, parse_structured_answer, validate_clues
+
+
+def test_extract_json_tolerates_fences_prose_and_common_mistakes():
+    assert extract_json('{"a": 1}') == {"a": 1}
+    assert extract_json('```json\n{"a": 1}\n```') == {"a": 1}
+    assert extract_json('Sure! Here it is: {"a": [1, 2,],} Hope that helps.') == {"a": [1, 2]}
+    assert extract_json("{“a”: 1}") == {"a": 1}
+    assert extract_json('Clues: [{"text": "x"}]', list) == [{"text": "x"}]
+    assert extract_json('[1, 2]', dict) is None
+    assert extract_json("no json here") is None
+    assert extract_json(None) is None
+
+
+def test_validate_clues_keeps_well_formed_items():
+    clues = validate_clues(
+        [{"text": " A scream ", "type": "Important"}, "Bare string", {"text": ""}, {"type": "gossip"}, 3,
+         {"text": "Odd type", "type": "rumour"}]
+    )
+    assert clues == [
+        {"text": "A scream", "type": "IMPORTANT"},
+        {"text": "Bare string", "type": "FACT"},
+        {"text": "Odd type", "type": "FACT"},
+    ]
+    assert validate_clues({"text": "not a list"}) == []
+
+
+def test_parse_structured_answer():
+    raw = 'Here you go:\n{"answer": " I was baking. ", "clues": [{"text": "Baking at 9am", "type": "background"}]}'
+    assert parse_structured_answer(raw) == ("I was baking.", [{"text": "Baking at 9am", "type": "BACKGROUND"}])
+    assert parse_structured_answer('{"answer": "Hm."}') == ("Hm.", [])
+    assert parse_structured_answer('{"answer": ""}') is None
+    assert parse_structured_answer('{"reply": "Hm."}') is None
+    assert parse_structured_answer("I was baking.") is None
+
+
+def _stream(pieces):
+    streamer = AnswerFieldStreamer()
+    return "".join(streamer.feed(piece) for piece in pieces), streamer
+
+
+def test_answer_streamer_decodes_escapes_split_across_deltas():
+    text, streamer = _stream(['{"ans', 'wer": "She said \\', '"no\\', '" \\u00', 'e9t\\u00e9\\n', 'ok", "clues": ["x"]}'])
+    assert text == 'She said "no" été\nok'
+    assert streamer.done
+
+
+def test_answer_streamer_ignores_prose_before_the_object_and_after_the_answer():
+    text, streamer = _stream(["Sure: ", '{"answer"', ' : "Hi', ' there."', ', "clues": [{"text": "\\"x\\""}]}'])
+    assert text == "Hi there."
+    text, streamer = _stream(['{"clues": []}'])
+    assert text == "" and not streamer.started
@@ -0,0 +1,67 @@
+import asyncio
+
+import db
+from db import WriteBehindQueue
+
+
+def test_stop_keeps_a_batch_that_is_waiting_to_retry(monkeypatch):
+    inserted = []
+    calls = []
+
+    def flaky_insert(table, rows):
+        calls.append(table)
+        if len(calls) == 1:
+            raise RuntimeError("connection reset")
+        inserted.extend(rows)
+
+    monkeypatch.setattr(db, "_bulk_insert", flaky_insert)
+
+    async def run():
+        queue = WriteBehindQueue()
+        queue.start()
+        queue.enqueue("clues", {"text": "Heard a door at 9pm"})
+        queue._wake.set()
+        while queue.failed_batches == 0:
+            await asyncio.sleep(0.01)
+        await queue.stop()
+        return queue
+
+    queue = asyncio.run(run())
+    assert inserted == [{"text": "Heard a door at 9pm"}]
+    assert queue.dropped_rows == 0
+    assert queue.depth() == 0
+
+
+def test_cancelled_retry_puts_the_batch_back(monkeypatch):
+    def failing_insert(table, rows):
+        raise RuntimeError("connection reset")
+
+    monkeypatch.setattr(db, "_bulk_insert", failing_insert)
+
+    async def run():
+        queue = WriteBehindQueue()
+        queue.enqueue("clues", {"text": "a"})
+        queue.enqueue("clues", {"text": "b"})
+        task = asyncio.ensure_future(queue.flush())
+        while queue.failed_batches == 0:
+            await asyncio.sleep(0.01)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        return queue
+
+    queue = asyncio.run(run())
+    assert queue._rows["clues"] == [{"text": "a"}, {"text": "b"}]
+
+
+def test_queued_clues_keep_their_order(monkeypatch):
+    queue = WriteBehindQueue()
+    monkeypatch.setattr(db, "write_behind", queue)
+    monkeypatch.setattr(db, "supabase", object())
+    monkeypatch.setattr(WriteBehindQueue, "running", True)
+    for text in ("first", "second", "third"):
+        db.enqueue_clue("ROOM1", text=text, clue_type="FACT")
+    rows = queue._rows["clues"]
+    assert [row["text"] for row in sorted(rows, key=lambda row: row["created_at"])] == ["first", "second", "third"]
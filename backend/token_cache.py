@@ -0,0 +1,123 @@
+"""
+Cached Firebase ID token verification.
+
+`fb_auth.verify_id_token` is blocking (RSA verification, and a Google
+certificate fetch whenever the certs' HTTP cache has expired). Reconnect bursts
+after a deploy send the same tokens again, so:
+  - verified tokens are cached by SHA-256 of the token until their `exp`,
+  - verification runs in a small thread pool, off the event loop,
+  - concurrent joins with the same token share one verification,
+  - after each FIREBASE_CERT_TTL_SECONDS window the first verification runs
+    alone, so the certificate fetch happens once instead of once per thread.
+"""
+import asyncio
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+TOKEN_VERIFY_WORKERS = int(os.getenv("TOKEN_VERIFY_WORKERS", "4"))
+# Google's certs are served with max-age of several hours; re-warm well inside that
+FIREBASE_CERT_TTL_SECONDS = float(os.getenv("FIREBASE_CERT_TTL_SECONDS", "3600"))
+
+
+class IdTokenCache:
+    def __init__(
+        self,
+        verify: Callable[[str], Dict[str, Any]],
+        max_entries: int = TOKEN_CACHE_SIZE,
+        workers: int = TOKEN_VERIFY_WORKERS,
+        cert_ttl: float = FIREBASE_CERT_TTL_SECONDS,
+    ):
+        self._verify = verify
+        self.max_entries = max_entries
+        self.cert_ttl = cert_ttl
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="token-verify")
+        # token digest -> (exp epoch seconds, decoded claims)
+        self._items: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._warm_lock: Optional[asyncio.Lock] = None
+        self._certs_warm_until = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.shared = 0
+        self.failures = 0
+        self.cert_warmups = 0
+
+    @staticmethod
+    def _digest(id_token: str) -> str:
+        return hashlib.sha256(id_token.encode("utf-8")).hexdigest()
+
+    async def verify(self, id_token: str) -> Dict[str, Any]:
+        """Decoded claims for `id_token`; raises whatever the verifier raises."""
+        key = self._digest(id_token)
+        item = self._items.get(key)
+        if item is not None:
+            exp, decoded = item
+            if exp > time.time():
+                self._items.move_to_end(key)
+                self.hits += 1
+                return decoded
+            del self._items[key]
+
+        fut = self._inflight.get(key)
+        if fut is not None:
+            self.shared += 1
+            return await asyncio.shield(fut)
+
+        self.misses += 1
+        fut = asyncio.get_running_loop().create_future()
+        self._inflight[key] = fut
+        try:
+            decoded = await self._verify_off_loop(id_token)
+        except Exception as e:
+            self.failures += 1
+            fut.set_exception(e)
+            fut.exception()  # mark retrieved when nobody else was waiting
+            raise
+        finally:
+            self._inflight.pop(key, None)
+        fut.set_result(decoded)
+        self._put(key, decoded)
+        return decoded
+
+    async def _verify_off_loop(self, id_token: str) -> Dict[str, Any]:
+        loop = asyncio.get_running_loop()
+        if time.monotonic() < self._certs_warm_until:
+            return await loop.run_in_executor(self._executor, self._verify, id_token)
+        if self._warm_lock is None:
+            self._warm_lock = asyncio.Lock()
+        async with self._warm_lock:
+            # certs may be cold: let a single verification fetch them first
+            if time.monotonic() >= self._certs_warm_until:
+                result = await loop.run_in_executor(self._executor, self._verify, id_token)
+                self.cert_warmups += 1
+                self._certs_warm_until = time.monotonic() + self.cert_ttl
+                return result
+        return await loop.run_in_executor(self._executor, self._verify, id_token)
+
+    def _put(self, key: str, decoded: Dict[str, Any]) -> None:
+        exp = decoded.get("exp")
+        if not isinstance(exp, (int, float)):
+            return
+        self._items[key] = (float(exp), decoded)
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_entries:
+            self._items.popitem(last=False)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "size": len(self._items),
+            "hits": self.hits,
+            "misses": self.misses,
+            "shared": self.shared,
+            "failures": self.failures,
+            "cert_warmups": self.cert_warmups,
+            "inflight": len(self._inflight),
+        }